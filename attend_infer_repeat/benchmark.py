@@ -0,0 +1,312 @@
+import itertools
+import json
+import platform
+import time
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import tensorflow as tf
+import sonnet as snt
+from attrdict import AttrDict
+
+from mnist_model import AIRonMNIST
+from modules import ConvEncoder, Encoder, SpatialTransformer
+from prior import NumStepsDistribution, geometric_prior, tabular_kl
+from profiling import peak_memory
+
+
+BENCHMARKS = OrderedDict()
+
+BenchmarkCase = namedtuple('BenchmarkCase', 'fetches feed_dict extra')
+
+
+def make_case(fetches, feed_dict=None, **extra):
+    return BenchmarkCase(fetches, feed_dict, extra)
+
+
+def register(name, **sweep):
+    """Registers a benchmark under `name`; `sweep` maps parameter names to lists of default values.
+
+    The decorated function builds a graph for a single combination of parameters and returns a `BenchmarkCase`.
+    """
+
+    def decorator(fun):
+        BENCHMARKS[name] = (fun, OrderedDict(sorted(sweep.items())))
+        return fun
+
+    return decorator
+
+
+def time_fetches(sess, fetches, feed_dict=None, n_warmup=3, n_iter=20):
+    """Times `sess.run(fetches, feed_dict)`
+
+    :return: dict with mean, std, median and min time in milliseconds
+    """
+    for _ in xrange(n_warmup):
+        sess.run(fetches, feed_dict)
+
+    times = []
+    for _ in xrange(n_iter):
+        start = time.time()
+        sess.run(fetches, feed_dict)
+        times.append(time.time() - start)
+
+    times = 1e3 * np.asarray(times)
+    return dict(mean_ms=times.mean(), std_ms=times.std(), median_ms=np.median(times), min_ms=times.min(),
+                n_iter=n_iter)
+
+
+def measure_memory(sess, fetches, feed_dict=None):
+    """Runs `fetches` once with tracing
+
+    :return: dict of {allocator name: estimated peak MB}, see :func: profiling.peak_memory
+    """
+    run_options = tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE)
+    run_metadata = tf.RunMetadata()
+    sess.run(fetches, feed_dict, options=run_options, run_metadata=run_metadata)
+    return peak_memory(run_metadata.step_stats)
+
+
+def run_benchmark(name, params, n_warmup=3, n_iter=20, config=None, memory=False):
+    """Builds and times a single benchmark case in a fresh graph; with `memory`, also estimates peak memory"""
+    fun = BENCHMARKS[name][0]
+    with tf.Graph().as_default():
+        tf.set_random_seed(0)
+        case = fun(**params)
+        with tf.Session(config=config) as sess:
+            sess.run(tf.global_variables_initializer())
+            result = time_fetches(sess, case.fetches, case.feed_dict, n_warmup, n_iter)
+            if memory:
+                result['peak_mb'] = measure_memory(sess, case.fetches, case.feed_dict)
+
+    result.update(name=name, params=params, extra=case.extra)
+    return result
+
+
+def sweep_params(sweep, overrides=None):
+    """Iterates over all combinations of parameter values; `overrides` replace values of the parameters present"""
+    sweep = OrderedDict(sweep)
+    if overrides is not None:
+        for k, v in overrides.iteritems():
+            if k in sweep and v is not None:
+                sweep[k] = v
+
+    keys = sweep.keys()
+    for values in itertools.product(*sweep.values()):
+        yield OrderedDict(zip(keys, values))
+
+
+def run_sweep(names=None, overrides=None, n_warmup=3, n_iter=20, config=None, verbose=True, memory=False):
+    """Runs registered benchmarks over their parameter sweeps
+
+    :param names: list of benchmark names or None for all of them
+    :param overrides: dict of {param name: list of values}
+    :param memory: boolean, estimates peak memory of every case, see :func: measure_memory
+    :return: list of results
+    """
+    if names is None:
+        names = BENCHMARKS.keys()
+
+    results = []
+    for name in names:
+        for params in sweep_params(BENCHMARKS[name][1], overrides):
+            result = run_benchmark(name, params, n_warmup, n_iter, config, memory)
+            results.append(result)
+            if verbose:
+                print format_result(result)
+    return results
+
+
+def format_result(result):
+    params = ', '.join('{}={}'.format(k, v) for k, v in result['params'].iteritems())
+    line = '{:<22} {:>10.3f}ms +- {:.3f}  ({})'.format(result['name'], result['median_ms'], result['std_ms'], params)
+    if result.get('extra'):
+        line += ' ' + ', '.join('{}={}'.format(k, v) for k, v in sorted(result['extra'].iteritems()))
+    if result.get('peak_mb'):
+        line += ' peak ' + ', '.join('{}={:.1f}MB'.format(k, v) for k, v in sorted(result['peak_mb'].iteritems()))
+    return line
+
+
+def _result_key(result):
+    return result['name'], tuple(sorted(result['params'].items()))
+
+
+def save_results(path, results):
+    meta = dict(tf_version=tf.__version__, host=platform.node(), time=time.strftime('%Y-%m-%d %H:%M:%S'))
+    with open(path, 'w') as f:
+        json.dump(dict(meta=meta, results=results), f, indent=2, default=float)
+
+
+def load_results(path):
+    with open(path) as f:
+        data = json.load(f)
+    for r in data['results']:
+        r['params'] = {str(k): (tuple(v) if isinstance(v, list) else v) for k, v in r['params'].iteritems()}
+    return data['results']
+
+
+def compare(baseline, current, threshold=.1, stat='median_ms'):
+    """Compares benchmark results with a baseline
+
+    :param baseline: list of results
+    :param current: list of results
+    :param threshold: float, relative slowdown above which a case is flagged
+    :param stat: string, statistic to compare
+    :return: list of dicts; cases of the baseline missing in `current`, e.g. removed or broken benchmarks, come first
+        with `missing=True` and `current` and `ratio` set to None, followed by the remaining cases sorted by
+        relative change. New cases, which are not in the baseline, are skipped
+    """
+    current_keys = {_result_key(r) for r in current}
+    rows = []
+    for r in baseline:
+        if _result_key(r) not in current_keys:
+            rows.append(dict(name=r['name'], params=r['params'], baseline=r[stat], current=None, ratio=None,
+                             slower=False, missing=True))
+
+    baseline = {_result_key(r): r for r in baseline}
+    compared = []
+    for r in current:
+        key = _result_key(r)
+        if key not in baseline:
+            continue
+
+        base, cur = baseline[key][stat], r[stat]
+        ratio = cur / max(base, 1e-8)
+        compared.append(dict(name=r['name'], params=r['params'], baseline=base, current=cur, ratio=ratio,
+                             slower=ratio > 1. + threshold, missing=False))
+
+    compared.sort(key=lambda row: -row['ratio'])
+    return rows + compared
+
+
+def _images(batch_size, img_size):
+    return tf.Variable(tf.random_uniform((batch_size,) + tuple(img_size)), trainable=False, name='images')
+
+
+def _transform_params(batch_size):
+    scale = tf.random_uniform((batch_size, 2), .2, 1.)
+    shift = tf.random_uniform((batch_size, 2), -1., 1.)
+    sx, sy = tf.split(scale, 2, 1)
+    tx, ty = tf.split(shift, 2, 1)
+    params = tf.concat((sx, tx, sy, ty), -1)
+    return tf.Variable(params, trainable=False, name='transform_params')
+
+
+def _make_air(batch_size, max_steps, img_size, glimpse_size, **kwargs):
+    img_size = (img_size,) * 2
+    glimpse_size = (glimpse_size,) * 2
+    obs = _images(batch_size, img_size)
+    nums = tf.zeros((max_steps + 1, batch_size, 1))
+    return AIRonMNIST(obs, nums, glimpse_size=glimpse_size, max_steps=max_steps, explore_eps=1e-3, **kwargs)
+
+
+def make_train_step(air, learning_rate=1e-4, **kwargs):
+    num_steps_prior = AttrDict(anneal='exp', init=1. - 1e-15, final=1e-7, steps_div=1e4, steps=1e5, hold_init=1e3)
+    prior = AttrDict(loc=0., scale=1.)
+    train_step, global_step = air.train_step(learning_rate, 0., prior, prior, prior, num_steps_prior, **kwargs)
+    return train_step
+
+
+@register('air_cell', batch_size=[32, 64], img_size=[50, 100], glimpse_size=[20])
+def air_cell_benchmark(batch_size, img_size, glimpse_size):
+    air = _make_air(batch_size, 1, img_size, glimpse_size)
+    state = air.cell.initial_state(air.obs)
+    outputs, state = air.cell(tf.zeros((batch_size, 1)), state)
+    return make_case(outputs)
+
+
+@register('spatial_transformer', batch_size=[32, 64], img_size=[50, 100], glimpse_size=[20], inverse=[False, True],
+          with_grad=[False, True])
+def spatial_transformer_benchmark(batch_size, img_size, glimpse_size, inverse, with_grad):
+    img_size = (img_size,) * 2
+    glimpse_size = (glimpse_size,) * 2
+    constraints = snt.AffineWarpConstraints.no_shear_2d()
+    transformer = SpatialTransformer(img_size, glimpse_size, constraints, inverse=inverse)
+
+    inpt = _images(batch_size, glimpse_size if inverse else img_size)
+    params = _transform_params(batch_size)
+    output = transformer(inpt, params)
+
+    fetches = [output]
+    if with_grad:
+        fetches += tf.gradients(tf.reduce_sum(output), [inpt, params])
+    return make_case(fetches)
+
+
+@register('separable_transformer', batch_size=[32], img_size=[50, 100, 200, 400], glimpse_size=[20],
+          inverse=[False, True], separable=[False, True])
+def separable_transformer_benchmark(batch_size, img_size, glimpse_size, inverse, separable):
+    """Compares the resampler with the separable implementation of the spatial transformer, with gradients"""
+    img_size = (img_size,) * 2
+    glimpse_size = (glimpse_size,) * 2
+    constraints = snt.AffineWarpConstraints.no_shear_2d()
+    transformer = SpatialTransformer(img_size, glimpse_size, constraints, inverse=inverse, separable=separable)
+
+    inpt = _images(batch_size, glimpse_size if inverse else img_size)
+    params = _transform_params(batch_size)
+    output = transformer(inpt, params)
+    return make_case([output] + tf.gradients(tf.reduce_sum(output), [inpt, params]))
+
+
+@register('num_steps_kl', batch_size=[32, 64], max_steps=[3, 5])
+def num_steps_kl_benchmark(batch_size, max_steps):
+    probs = tf.Variable(tf.random_uniform((batch_size, max_steps)), trainable=False, name='probs')
+    posterior = NumStepsDistribution(probs).prob()
+    kl = tabular_kl(posterior, geometric_prior(.5, max_steps))
+    grad = tf.gradients(tf.reduce_sum(kl), probs)
+    return make_case([posterior, kl, grad])
+
+
+@register('train_step', batch_size=[32, 64], max_steps=[3, 5], img_size=[50, 100], glimpse_size=[20])
+def train_step_benchmark(batch_size, max_steps, img_size, glimpse_size):
+    air = _make_air(batch_size, max_steps, img_size, glimpse_size)
+    return make_case(make_train_step(air))
+
+
+@register('vimco_train_step', batch_size=[32, 64], max_steps=[3], img_size=[50], glimpse_size=[20], n_samples=[2, 4])
+def vimco_train_step_benchmark(batch_size, max_steps, img_size, glimpse_size, n_samples):
+    """`batch_size` counts samples, so that the timings are comparable with `train_step`"""
+    air = _make_air(batch_size // n_samples, max_steps, img_size, glimpse_size, n_samples=n_samples)
+    return make_case(make_train_step(air, estimator='vimco'))
+
+
+@register('presence_train_step', batch_size=[32, 64], max_steps=[3], img_size=[50], glimpse_size=[20],
+          presence=['bernoulli', 'relaxed', 'straight_through'])
+def presence_train_step_benchmark(batch_size, max_steps, img_size, glimpse_size, presence):
+    air = _make_air(batch_size, max_steps, img_size, glimpse_size, relaxed_steps=presence != 'bernoulli',
+                    straight_through=presence == 'straight_through')
+    return make_case(make_train_step(air))
+
+
+@register('memory_train_step', batch_size=[32, 64], max_steps=[3, 6], img_size=[50, 100], glimpse_size=[20],
+          swap_memory=[False, True], parallel_iterations=[1, 32])
+def memory_train_step_benchmark(batch_size, max_steps, img_size, glimpse_size, swap_memory, parallel_iterations):
+    """Run with `--memory` to see the GPU memory saved by `swap_memory` and the step time of both settings"""
+    air = _make_air(batch_size, max_steps, img_size, glimpse_size, swap_memory=swap_memory,
+                    parallel_iterations=parallel_iterations)
+    return make_case(make_train_step(air))
+
+
+@register('unroll_train_step', batch_size=[32, 64], max_steps=[1, 3, 5, 10], img_size=[50], glimpse_size=[20],
+          unroll=[False, True])
+def unroll_train_step_benchmark(batch_size, max_steps, img_size, glimpse_size, unroll):
+    """Compares the while loop of `dynamic_rnn` with the statically unrolled recurrence"""
+    air = _make_air(batch_size, max_steps, img_size, glimpse_size, unroll=unroll)
+    return make_case(make_train_step(air))
+
+
+@register('encoder', batch_size=[32], img_size=[50, 100, 200, 256], encoder=['mlp', 'conv'], with_grad=[False, True])
+def encoder_benchmark(batch_size, img_size, encoder, with_grad):
+    n_hidden = [256] * 2
+    module = Encoder(n_hidden) if encoder == 'mlp' else ConvEncoder(n_hidden)
+
+    inpt = _images(batch_size, (img_size,) * 2)
+    output = module(inpt)
+
+    fetches = [output]
+    variables = module.get_variables()
+    if with_grad:
+        fetches += tf.gradients(tf.reduce_sum(output), variables)
+
+    n_params = sum(np.prod(v.get_shape().as_list()) for v in variables)
+    return make_case(fetches, n_params=int(n_params))
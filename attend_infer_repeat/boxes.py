@@ -0,0 +1,79 @@
+import numpy as np
+
+
+def where_to_boxes(where, img_size):
+    """Converts parameters of the spatial transformer into bounding boxes, see :func: evaluation.rect_stn
+
+    :param where: np.array of shape [..., 4] with (sx, tx, sy, ty)
+    :param img_size: (height, width) of the image the transformer was applied to
+    :return: np.array of shape [..., 4] with boxes (y, x, height, width) in pixels
+    """
+    where = np.asarray(where, dtype=np.float32)
+    sx, tx, sy, ty = (where[..., i] for i in xrange(4))
+    height, width = img_size[:2]
+
+    x = width * (1. - sx + tx) / 2
+    y = height * (1. - sy + ty) / 2
+    return np.stack((y, x, height * sy, width * sx), -1)
+
+
+def box_area(boxes):
+    return np.maximum(boxes[..., 2], 0.) * np.maximum(boxes[..., 3], 0.)
+
+
+def box_iou(a, b):
+    """Computes intersection over union between all pairs of boxes
+
+    :param a: np.array of shape [..., n, 4] with boxes (y, x, height, width)
+    :param b: np.array of shape [..., m, 4]
+    :return: np.array of shape [..., n, m]
+    """
+    a = np.asarray(a, dtype=np.float32)[..., :, np.newaxis, :]
+    b = np.asarray(b, dtype=np.float32)[..., np.newaxis, :, :]
+
+    top = np.maximum(a[..., 0], b[..., 0])
+    left = np.maximum(a[..., 1], b[..., 1])
+    bottom = np.minimum(a[..., 0] + a[..., 2], b[..., 0] + b[..., 2])
+    right = np.minimum(a[..., 1] + a[..., 3], b[..., 1] + b[..., 3])
+
+    intersection = np.maximum(bottom - top, 0.) * np.maximum(right - left, 0.)
+    union = box_area(a) + box_area(b) - intersection
+    return intersection / np.maximum(union, 1e-8)
+
+
+def nms(boxes, scores, iou_threshold=.5):
+    """Greedy non-maximum suppression
+
+    IoU between all pairs of boxes is computed at once; the greedy pass then only updates a mask.
+
+    :param boxes: np.array of shape [n, 4]
+    :param scores: np.array of shape [n]
+    :param iou_threshold: float, a box is suppressed if its IoU with a higher-scoring kept box exceeds this
+    :return: np.array of indices of kept boxes, sorted by decreasing score
+    """
+    order = np.argsort(-np.asarray(scores), kind='mergesort')
+    iou = box_iou(boxes[order], boxes[order])
+
+    keep = np.ones(len(order), dtype=bool)
+    for i in xrange(len(order)):
+        if keep[i]:
+            keep[i + 1:] &= iou[i, i + 1:] <= iou_threshold
+    return order[keep]
+
+
+def batched_nms(boxes, scores, groups, iou_threshold=.5):
+    """Runs non-maximum suppression independently for every group, e.g. an image
+
+    :param boxes: np.array of shape [n, 4]
+    :param scores: np.array of shape [n]
+    :param groups: np.array of shape [n] with group indices
+    :return: np.array of indices of kept boxes
+    """
+    keep = []
+    for group in np.unique(groups):
+        idx = np.where(groups == group)[0]
+        keep.append(idx[nms(boxes[idx], scores[idx], iou_threshold)])
+
+    if not keep:
+        return np.zeros([0], dtype=np.int64)
+    return np.concatenate(keep)
@@ -1,7 +1,7 @@
 import numpy as  np
 import sonnet as snt
 import tensorflow as tf
-from tensorflow.contrib.distributions import Bernoulli, NormalWithSoftplusScale
+from tensorflow.contrib.distributions import Bernoulli, NormalWithSoftplusScale, RelaxedBernoulli
 
 from modules import SpatialTransformer, ParametrisedGaussian
 
@@ -14,7 +14,9 @@ class AIRCell(snt.RNNCore):
 
     def __init__(self, img_size, crop_size, n_appearance,
                  transition, input_encoder, glimpse_encoder, glimpse_decoder, transform_estimator, steps_predictor,
-                 discrete_steps=True, canvas_init=None, explore_eps=None, debug=False):
+                 discrete_steps=True, canvas_init=None, explore_eps=None, debug=False,
+                 relaxed_steps=False, straight_through=False, temperature=1., separable_crop=False,
+                 separable_paste=False):
         """Creates the cell
 
         :param img_size: int tuple, size of the image
@@ -33,7 +35,18 @@ class AIRCell(snt.RNNCore):
         :param explore_eps: float or None; if float, it has to be \in (0., .5); step probability is clipped between
          `explore_eps` and (1 - `explore_eps)
         :param debug: boolean, adds checks for NaNs in the inputs to distributions
+        :param relaxed_steps: boolean, steps are samples from a Concrete (relaxed Bernoulli) distribution, which
+         allows training the step probabilities with pathwise gradients; takes precedence over `discrete_steps`
+        :param straight_through: boolean, if True relaxed samples are rounded to {0, 1} in the forward pass while
+         gradients are computed with respect to the relaxed samples; requires `relaxed_steps`
+        :param temperature: float or tf.Tensor, temperature of the Concrete distribution
+        :param separable_crop: boolean, crops glimpses with products of interpolation matrices instead of
+         :func: snt.resampler, see :class: modules.SpatialTransformer
+        :param separable_paste: boolean, the same for pasting decoded glimpses into the canvas, which is usually
+         faster than the resampler, since the resampler scatters gradients for every pixel of the canvas
         """
+        if straight_through and not relaxed_steps:
+            raise ValueError('straight_through requires relaxed_steps')
 
         super(AIRCell, self).__init__(self.__class__.__name__)
         self._img_size = img_size
@@ -44,6 +57,9 @@ class AIRCell(snt.RNNCore):
         self._n_hidden = self._transition.output_size[0]
 
         self._sample_presence = discrete_steps
+        self._relaxed_steps = relaxed_steps
+        self._straight_through = straight_through
+        self._temperature = temperature
         self._explore_eps = explore_eps
         self._debug = debug
 
@@ -55,8 +71,10 @@ class AIRCell(snt.RNNCore):
 
             transform_constraints = snt.AffineWarpConstraints.no_shear_2d()
 
-            self._spatial_transformer = SpatialTransformer(img_size, crop_size, transform_constraints)
-            self._inverse_transformer = SpatialTransformer(img_size, crop_size, transform_constraints, inverse=True)
+            self._spatial_transformer = SpatialTransformer(img_size, crop_size, transform_constraints,
+                                                           separable=separable_crop)
+            self._inverse_transformer = SpatialTransformer(img_size, crop_size, transform_constraints, inverse=True,
+                                                           separable=separable_paste)
 
             self._transform_estimator = transform_estimator(self._n_transform_param)
             self._input_encoder = input_encoder()
@@ -140,7 +158,16 @@ class AIRCell(snt.RNNCore):
             if self._explore_eps is not None:
                 presence_prob = self._explore_eps / 2 + (1 - self._explore_eps) * presence_prob
 
-            if self._sample_presence:
+            if self._relaxed_steps:
+                presence_distrib = RelaxedBernoulli(self._temperature, probs=presence_prob,
+                                                    validate_args=self._debug, allow_nan_stats=not self._debug)
+
+                new_presence = presence_distrib.sample()
+                if self._straight_through:
+                    new_presence += tf.stop_gradient(tf.round(new_presence) - new_presence)
+                presence *= new_presence
+
+            elif self._sample_presence:
                 presence_distrib = Bernoulli(probs=presence_prob, dtype=tf.float32,
                                              validate_args=self._debug, allow_nan_stats=not self._debug)
 
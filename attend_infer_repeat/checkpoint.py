@@ -0,0 +1,161 @@
+import threading
+import traceback
+import Queue
+
+import tensorflow as tf
+
+
+def slot_variables(optimizers, var_list=None):
+    """Returns slot variables (e.g. momentum or mean square) that `optimizers` keep for `var_list`"""
+    if var_list is None:
+        var_list = tf.global_variables()
+
+    slots = []
+    for opt in optimizers:
+        for name in opt.get_slot_names():
+            for v in var_list:
+                slot = opt.get_slot(v, name)
+                if slot is not None:
+                    slots.append(slot)
+    return slots
+
+
+def weights_only_variables(optimizers, var_list=None):
+    """Returns variables in `var_list` that are not optimizer slots; they are enough to run the model"""
+    if var_list is None:
+        var_list = tf.global_variables()
+
+    slots = set(slot_variables(optimizers, var_list))
+    return [v for v in var_list if v not in slots]
+
+
+class AsyncCheckpointer(object):
+    """Writes checkpoints on a background thread.
+
+    `save` copies values of the variables to host memory with a single `sess.run` and returns; the values are then
+    written by a background thread, so training continues while the checkpoint is being written and the checkpoint
+    is consistent. At most `max_pending` snapshots wait to be written; if the writer can't keep up, further snapshots
+    are skipped (or `save` blocks if `block=True`). Checkpoints are written with `tf.train.Saver` and can be restored
+    as usual; `max_to_keep` bounds the number of checkpoints kept on disk.
+
+    Optionally, a slim weights-only checkpoint without optimizer slots is written alongside for inference; restore it
+    with a `tf.train.Saver` created for :func: weights_only_variables.
+    """
+
+    def __init__(self, checkpoint_name, var_list=None, max_to_keep=5, max_pending=1, block=False,
+                 weights_only_name=None, optimizers=None):
+        """
+        :param checkpoint_name: string, path prefix of checkpoints
+        :param var_list: list of tf.Variables or None for all global variables
+        :param max_to_keep: int, number of recent checkpoints kept
+        :param max_pending: int, number of snapshots held in memory while waiting to be written
+        :param block: boolean, if True `save` waits for a free slot instead of skipping the snapshot
+        :param weights_only_name: string or None, path prefix of weights-only checkpoints; requires `optimizers`
+        :param optimizers: list of tf.train.Optimizers whose slots are left out of weights-only checkpoints
+        """
+        if var_list is None:
+            var_list = tf.global_variables()
+
+        if weights_only_name is not None and optimizers is None:
+            raise ValueError('Weights-only checkpoints require the optimizers, whose slots should be left out')
+
+        self._var_list = list(var_list)
+        self._checkpoint_name = checkpoint_name
+        self._weights_only_name = weights_only_name
+        self._block = block
+        self._queue = Queue.Queue(maxsize=max_pending)
+        self._error = None
+        self.n_skipped = 0
+        self.last_checkpoint = None
+
+        weights = None
+        if weights_only_name is not None:
+            weights = set(weights_only_variables(optimizers, self._var_list))
+
+        self._build_writer(max_to_keep, weights)
+
+        self._thread = threading.Thread(target=self._run, name='AsyncCheckpointer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _build_writer(self, max_to_keep, weights):
+        """Creates a private graph with a copy of every variable, which is assigned the snapshotted values and saved
+        under the original variable name"""
+
+        self._graph = tf.Graph()
+        with self._graph.as_default():
+            self._placeholders = []
+            assigns = []
+            saved, weights_saved = {}, {}
+            for i, v in enumerate(self._var_list):
+                dtype = v.dtype.base_dtype
+                shape = v.get_shape()
+                placeholder = tf.placeholder(dtype, shape)
+                copy = tf.Variable(tf.zeros(shape, dtype), name='var_{}'.format(i))
+                assigns.append(tf.assign(copy, placeholder))
+                self._placeholders.append(placeholder)
+
+                name = v.op.name
+                saved[name] = copy
+                if weights is not None and v in weights:
+                    weights_saved[name] = copy
+
+            self._assign = tf.group(*assigns)
+            self._saver = tf.train.Saver(saved, max_to_keep=max_to_keep)
+            self._weights_saver = None
+            if weights is not None:
+                self._weights_saver = tf.train.Saver(weights_saved, max_to_keep=max_to_keep)
+
+        self._sess = tf.Session(graph=self._graph)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    break
+
+                global_step, values = item
+                self._sess.run(self._assign, dict(zip(self._placeholders, values)))
+                self.last_checkpoint = self._saver.save(self._sess, self._checkpoint_name, global_step,
+                                                        write_meta_graph=False)
+                if self._weights_saver is not None:
+                    self._weights_saver.save(self._sess, self._weights_only_name, global_step,
+                                             latest_filename='weights_checkpoint', write_meta_graph=False)
+            except Exception as err:
+                traceback.print_exc()
+                self._error = err
+            finally:
+                self._queue.task_done()
+
+    def _check(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def save(self, sess, global_step=None):
+        """Snapshots the variables and schedules writing them to disk
+
+        :return: boolean, False if the snapshot was skipped because the writer is busy
+        """
+        self._check()
+        if not self._block and self._queue.full():
+            self.n_skipped += 1
+            print 'Skipping checkpoint at step {}: {} checkpoints are waiting to be written'.format(
+                global_step, self._queue.qsize())
+            return False
+
+        values = sess.run(self._var_list)
+        self._queue.put((global_step, values))
+        return True
+
+    def flush(self):
+        """Waits until all snapshots are written"""
+        self._queue.join()
+        self._check()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._sess.close()
+        self._check()
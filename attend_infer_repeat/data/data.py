@@ -1,3 +1,4 @@
+import json
 import os
 import sys
 import numpy as np
@@ -15,6 +16,7 @@ _this_dir = os.path.dirname(__file__)
 _data_dir = os.path.abspath(os.path.join(_this_dir, '../../'), )
 _data_dir = os.path.join(_data_dir, 'data')
 _MNIST_PATH = os.path.join(_data_dir, 'MNIST_data')
+_SHARED_SOURCE = 'source.json'
 
 
 def dim_coords(proj):
@@ -48,6 +50,8 @@ def create_mnist(partition='train', canvas_size=(50, 50), obj_size=(28, 28), n_o
 
     imgs = np.zeros((n_samples,) + tuple(canvas_size), dtype=dtype)
     labels = np.zeros((n_samples, n_objects[-1]), dtype=np.uint8)
+    # bounding boxes of objects as (y, x, height, width)
+    boxes = np.zeros((n_samples, n_objects[-1], 4), dtype=np.int16)
     nums = np.random.randint(max_objects + 1, size=n_samples, dtype=np.uint8)
 
     templates = np.reshape(mnist_data.images, (-1, 28, 28))
@@ -90,63 +94,348 @@ def create_mnist(partition='train', canvas_size=(50, 50), obj_size=(28, 28), n_o
                         break
 
                 imgs[i, p[0]:p[0]+size[0], p[1]:p[1]+size[1]] = template[st[0]:st[0]+size[0], st[1]:st[1]+size[1]]
+                boxes[i, j] = p[0], p[1], size[0], size[1]
                 occupancy[p[0]:p[0]+size[0], p[1]:p[1]+size[1]] = True
 
         if not retry:
             i += 1
         else:
             imgs[i, ...] = 0.
+            boxes[i, ...] = 0
 
     print '\nfinished'
     if expand_nums:
-        expanded = np.zeros((max_objects + 1, n_samples, 1), dtype=np.uint8)
-        for i, n in enumerate(nums):
-            expanded[:n, i] = 1
-        nums = expanded
+        nums = _expand_nums(nums, max_objects)
 
-    return dict(imgs=imgs, labels=labels, nums=nums)
+    return dict(imgs=imgs, labels=labels, nums=nums, boxes=boxes)
 
 
-def load_data(path, data_path=_MNIST_PATH):
-    path = os.path.join(data_path, path)
+def _dataset_paths(path):
+    base = os.path.splitext(path)[0]
+    return base + '.imgs.npy', base + '.index.npz'
+
+
+def _expand_nums(counts, max_objects):
+    expanded = np.zeros((max_objects + 1, len(counts), 1), dtype=np.uint8)
+    for i, n in enumerate(counts):
+        expanded[:n, i] = 1
+    return expanded
+
+
+def save_data(data, path):
+    """Saves a dataset created by :func: create_mnist.
+
+    Images are written to `<path without extension>.imgs.npy` and everything else to the pickle at `path`, so that
+    images are stored only once. A columnar index with the number of objects, labels and bounding boxes of every
+    sample, in the order of the images, is written to `<path without extension>.index.npz`, which allows loading
+    subsets of the data without reading all images, see :func: load_data.
+    """
+    imgs_path, index_path = _dataset_paths(path)
+    np.save(imgs_path, data['imgs'])
+
+    with open(path, 'w') as f:
+        pickle.dump({k: v for k, v in data.iteritems() if k != 'imgs'}, f, pickle.HIGHEST_PROTOCOL)
+
+    index = dict(count=object_counts(data, axes={'nums': 1}).astype(np.uint8),
+                 labels=data['labels'])
+    if 'boxes' in data:
+        index['boxes'] = data['boxes']
+    np.savez(index_path, **index)
+
+
+def load_index(path, data_path=_MNIST_PATH):
+    """Loads the index of a dataset saved with :func: save_data as a dict of np.arrays"""
+    _, index_path = _dataset_paths(os.path.join(data_path, path))
+    with np.load(index_path) as f:
+        return {k: f[k] for k in f.files}
+
+
+def count_in(*counts):
+    """Predicate selecting samples with the given numbers of objects, see :func: load_data"""
+    return lambda index: np.in1d(index['count'], counts)
+
+
+def has_labels(*labels):
+    """Predicate selecting samples that contain at least one object of any of `labels`, see :func: load_data"""
+    def predicate(index):
+        n_slots = index['labels'].shape[1]
+        valid = np.arange(n_slots)[np.newaxis] < index['count'][:, np.newaxis]
+        return (np.in1d(index['labels'], labels).reshape(valid.shape) & valid).any(1)
+    return predicate
+
+
+def _load_from_index(path, predicates):
+    imgs_path, index_path = _dataset_paths(path)
+    with np.load(index_path) as f:
+        index = {k: f[k] for k in f.files}
+
+    mask = np.ones(len(index['count']), dtype=bool)
+    for predicate in predicates:
+        mask &= predicate(index)
+
+    # only the rows of selected samples are read from the memory-mapped file
+    imgs = np.load(imgs_path, mmap_mode='r')
+    data = {k: index[k][mask] for k in ('labels', 'boxes') if k in index}
+    data['imgs'] = np.asarray(imgs[np.flatnonzero(mask)])
+    data['nums'] = _expand_nums(index['count'][mask], index['labels'].shape[1])
+    return data
+
+
+def data_source(path, data_path=_MNIST_PATH):
+    """Identifies the file a dataset is loaded from by its absolute path and modification time
+
+    :param path: string, path of the pickle relative to `data_path` as in :func: load_data
+    :param data_path: string
+    :return: dict with `path` and `mtime`
+    """
+    path = os.path.abspath(os.path.join(data_path, path))
+    return dict(path=path, mtime=os.path.getmtime(path))
+
+
+def save_shared(data, directory, source=None):
+    """Writes a loaded dataset as one `.npy` file per key, e.g. to shared memory in `/dev/shm`.
+
+    Datasets saved this way are memory-mapped by :func: load_data, so that many processes on the same machine
+    share a single copy of the data.
+
+    :param data: dict of np.arrays
+    :param directory: string
+    :param source: dict or None, identifies the dataset, see :func: data_source; it is written next to the arrays
+        and read with :func: shared_source
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    for k, v in data.iteritems():
+        np.save(os.path.join(directory, k + '.npy'), v)
+
+    if source is not None:
+        with open(os.path.join(directory, _SHARED_SOURCE), 'w') as f:
+            json.dump(source, f)
+
+
+def shared_source(directory):
+    """Returns the source of a dataset written by :func: save_shared or None if it is unknown"""
+    path = os.path.join(directory, _SHARED_SOURCE)
+    if not os.path.exists(path):
+        return None
 
     with open(path) as f:
-        data = pickle.load(f)
+        return json.load(f)
+
+
+def _load_shared(directory):
+    data = {}
+    for filename in os.listdir(directory):
+        if filename.endswith('.npy'):
+            data[filename[:-len('.npy')]] = np.load(os.path.join(directory, filename), mmap_mode='r')
+    return data
+
+
+def load_data(path, data_path=_MNIST_PATH, predicates=None):
+    """Loads a dataset saved with :func: save_data.
+
+    :param path: string, path of the pickle relative to `data_path` or a directory written by :func: save_shared,
+        which is memory-mapped as is
+    :param data_path: string
+    :param predicates: callable, an iterable of callables or None; if given, only samples that satisfy all
+        predicates are loaded. A predicate takes the index, see :func: save_data, and returns a boolean mask of
+        selected samples, e.g. :func: count_in or :func: has_labels. Predicates are resolved against the index and
+        only the selected images are read from disk.
+    :return: dict of np.arrays
+    """
+    path = os.path.join(data_path, path)
+    if os.path.isdir(path):
+        return _load_shared(path)
+
+    if predicates is None:
+        with open(path) as f:
+            data = pickle.load(f)
+        # datasets written by older versions of :func: save_data keep images in the pickle
+        if 'imgs' not in data:
+            data['imgs'] = np.load(_dataset_paths(path)[0])
+    else:
+        if callable(predicates):
+            predicates = [predicates]
+        data = _load_from_index(path, predicates)
 
     data['imgs'] = data['imgs'].astype(np.float32) / 255.
     data['nums'] = data['nums'].astype(np.float32)
+    if 'boxes' in data:
+        data['boxes'] = data['boxes'].astype(np.float32)
     return data
 
 
-def tensors_from_data(data_dict, batch_size, axes=None, shuffle=False):
+def load_images(path, data_path=_MNIST_PATH):
+    """Memory-maps images of a dataset without loading the rest of it, e.g. for inference over large datasets.
+
+    :param path: string, relative to `data_path`; a `.npy` file, a directory written by :func: save_shared or a
+        dataset written by :func: save_data
+    :return: np.array; images of datasets written by :func: save_data are uint8
+    """
+    path = os.path.join(data_path, path)
+    if os.path.isdir(path):
+        path = os.path.join(path, 'imgs.npy')
+    elif not path.endswith('.npy'):
+        imgs_path = _dataset_paths(path)[0]
+        if not os.path.exists(imgs_path):
+            with open(path) as f:
+                return pickle.load(f)['imgs']
+        path = imgs_path
+
+    return np.load(path, mmap_mode='r')
+
+
+def minibatch_sampler(data_dict, batch_size, axes=None, shuffle=False):
+    """Creates a function that returns consecutive (or random) minibatches of `data_dict` as numpy arrays.
+
+    :param data_dict: dict of np.arrays
+    :param batch_size: int
+    :param axes: dict of ints, batch axis for every key in `data_dict`; missing keys default to 0
+    :param shuffle: boolean, samples random minibatches if True; iterates over the data in order otherwise
+    :return: callable returning a dict of np.arrays
+    """
     keys = data_dict.keys()
-    if axes is None:
-        axes = {k: 0 for k in keys}
+    axes = _batch_axes(keys, axes)
 
     key = keys[0]
-    ax = axes[key]
-    n_entries = data_dict[key].shape[ax]
+    n_entries = data_dict[key].shape[axes[key]]
 
     if shuffle:
         def idx_fun():
             return np.random.choice(n_entries, batch_size)
 
     else:
+        starts = itertools.cycle(xrange(0, n_entries, batch_size))
 
         def idx_fun():
-            start = next(itertools.cycle(xrange(0, n_entries, batch_size)))
-            end = start + batch_size
-            return np.arange(start, end)
+            start = next(starts)
+            return np.arange(start, start + batch_size) % n_entries
 
     def data_fun():
         idx = idx_fun()
-        minibatch = []
-        for k in keys:
-            item = data_dict[k]
-            minibatch_item = item.take(idx, axes[k])
-            minibatch.append(minibatch_item)
+        return {k: data_dict[k].take(idx, axes[k]) for k in keys}
+
+    return data_fun
+
+
+def object_counts(data_dict, axes=None, key='nums'):
+    """Number of objects in every sample, given `nums` expanded as in :func: create_mnist"""
+    axis = _batch_axes([key], axes)[key]
+    nums = np.moveaxis(data_dict[key], axis, 0)
+    return nums.reshape(nums.shape[0], -1).sum(1).astype(np.int32)
+
+
+def bucket_samples(counts, bucket_limits=None, max_steps=None):
+    """Groups samples into buckets by the number of objects.
+
+    A bucket with at most `n` objects needs `n + 1` steps, so that the model can still decide to stop after the last
+    object.
+
+    :param counts: np.array of ints of shape [n_samples]
+    :param bucket_limits: iterable of ints or None, the maximum number of objects in every bucket; if None, every
+        number of objects gets its own bucket
+    :param max_steps: int or None, step limits are clipped to this value
+    :return: list of np.arrays with indices of samples in non-empty buckets and a list of their step limits
+    """
+    if bucket_limits is None:
+        bucket_limits = np.unique(counts)
+
+    bucket_limits = np.sort(np.asarray(bucket_limits))
+    if counts.max() > bucket_limits[-1]:
+        raise ValueError('There are samples with {} objects, but the biggest bucket takes up to {}'
+                         .format(counts.max(), bucket_limits[-1]))
+
+    bucket_idx = np.searchsorted(bucket_limits, counts)
+    buckets, step_limits = [], []
+    for i, limit in enumerate(bucket_limits):
+        idx = np.where(bucket_idx == i)[0]
+        if len(idx) > 0:
+            buckets.append(idx)
+            step_limit = limit + 1 if max_steps is None else min(limit + 1, max_steps)
+            step_limits.append(int(step_limit))
+
+    return buckets, step_limits
+
+
+def bucketed_sampler(data_dict, batch_size, axes=None, shuffle=False, bucket_limits=None, max_steps=None,
+                     key='nums'):
+    """Creates a function that returns minibatches of samples with similar number of objects.
+
+    Every minibatch is taken from a single bucket, see :func: bucket_samples, and has an additional entry
+    `step_limit` with the number of steps needed for that bucket. Buckets are sampled with probabilities
+    proportional to their sizes if `shuffle` is True; otherwise minibatches iterate over buckets in order, which
+    covers every sample of the dataset once per cycle.
+
+    :param data_dict: dict of np.arrays
+    :param batch_size: int
+    :param axes: dict of ints, batch axis for every key in `data_dict`; missing keys default to 0
+    :param shuffle: boolean
+    :param bucket_limits: see :func: bucket_samples
+    :param max_steps: see :func: bucket_samples
+    :param key: string, key of `nums` in `data_dict`
+    :return: callable returning a dict of np.arrays
+    """
+    keys = data_dict.keys()
+    axes = _batch_axes(keys, axes)
+    counts = object_counts(data_dict, axes, key)
+    buckets, step_limits = bucket_samples(counts, bucket_limits, max_steps)
+
+    if shuffle:
+        probs = np.asarray([len(b) for b in buckets], dtype=np.float64) / len(counts)
+
+        def idx_fun():
+            i = np.random.choice(len(buckets), p=probs)
+            return i, np.random.choice(buckets[i], batch_size)
+
+    else:
+        schedule = [(i, start) for i, b in enumerate(buckets) for start in xrange(0, len(b), batch_size)]
+        schedule = itertools.cycle(schedule)
+
+        def idx_fun():
+            i, start = next(schedule)
+            bucket = buckets[i]
+            return i, bucket[np.arange(start, start + batch_size) % len(bucket)]
+
+    def data_fun():
+        i, idx = idx_fun()
+        minibatch = {k: data_dict[k].take(idx, axes[k]) for k in keys}
+        minibatch['step_limit'] = np.int32(step_limits[i])
         return minibatch
 
+    return data_fun
+
+
+def _batch_axes(keys, axes=None):
+    if axes is None:
+        axes = {}
+    return {k: axes.get(k, 0) for k in keys}
+
+
+def _batch_shape(item, batch_size, axis):
+    shape = list(item.shape)
+    shape[axis] = batch_size
+    return shape
+
+
+def placeholders_from_data(data_dict, batch_size, axes=None):
+    """Creates placeholders matching minibatches of `data_dict`; see :func: minibatch_sampler"""
+    axes = _batch_axes(data_dict.keys(), axes)
+    placeholders = {}
+    for k, v in data_dict.iteritems():
+        dtype = tf.as_dtype(v.dtype)
+        placeholders[k] = tf.placeholder(dtype, _batch_shape(v, batch_size, axes[k]), name=k)
+    return placeholders
+
+
+def tensors_from_data(data_dict, batch_size, axes=None, shuffle=False):
+    keys = data_dict.keys()
+    sample = minibatch_sampler(data_dict, batch_size, axes, shuffle)
+
+    def data_fun():
+        minibatch = sample()
+        return [minibatch[k] for k in keys]
+
     minibatch = data_fun()
     types = [getattr(tf, str(m.dtype)) for m in minibatch]
 
@@ -169,5 +458,4 @@ if __name__ == '__main__':
         filename = os.path.join(_MNIST_PATH, filename)
     
         print 'saving to "{}"'.format(filename)
-        with open(filename, 'w') as f:
-            pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+        save_data(data, filename)
@@ -0,0 +1,160 @@
+import numpy as np
+
+from boxes import box_iou, where_to_boxes
+
+
+def gt_counts(nums, axis=0):
+    """Number of objects in every image given `nums` expanded as in :func: data.create_mnist
+
+    :param nums: np.array of shape [max_objects + 1, n_samples, 1]
+    :return: np.array of ints of shape [n_samples]
+    """
+    return np.asarray(nums).sum(axis).reshape(-1).astype(np.int32)
+
+
+def gt_valid(counts, max_objects):
+    """Mask of valid ground-truth boxes of shape [n_samples, max_objects]"""
+    return np.arange(max_objects)[np.newaxis] < np.asarray(counts)[:, np.newaxis]
+
+
+def detections_from_outputs(where, presence, presence_prob, img_size):
+    """Converts outputs of AIR into detections
+
+    :param where: np.array of shape [max_steps, n_samples, 4]
+    :param presence: np.array of shape [max_steps, n_samples, 1]
+    :param presence_prob: np.array of shape [max_steps, n_samples, 1]
+    :param img_size: (height, width)
+    :return: boxes [n_samples, max_steps, 4], scores [n_samples, max_steps] and a mask of detections that are
+        present [n_samples, max_steps]; the score of a detection is the probability of taking its step
+    """
+    boxes = where_to_boxes(np.transpose(where, (1, 0, 2)), img_size)
+    scores = np.cumprod(np.transpose(presence_prob[..., 0]), axis=-1)
+    valid = np.transpose(presence[..., 0]) > .5
+    return boxes, scores, valid
+
+
+def match_detections(pred_boxes, pred_scores, pred_valid, gt_boxes, gt_valid, iou_threshold=.5):
+    """Greedily matches detections with ground-truth boxes in the order of decreasing score.
+
+    Matching is vectorized over images; the loop runs only over detection slots within an image.
+
+    :param pred_boxes: np.array of shape [n, max_steps, 4]
+    :param pred_scores: np.array of shape [n, max_steps]
+    :param pred_valid: np.array of bools of shape [n, max_steps]
+    :param gt_boxes: np.array of shape [n, max_objects, 4]
+    :param gt_valid: np.array of bools of shape [n, max_objects]
+    :param iou_threshold: float
+    :return: true positive mask [n, max_steps] and the IoU of every true positive with its match
+    """
+    n, n_slots = pred_scores.shape
+    iou = box_iou(pred_boxes, gt_boxes)
+    iou = np.where(pred_valid[..., np.newaxis] & gt_valid[:, np.newaxis], iou, -1.)
+
+    rows = np.arange(n)
+    order = np.argsort(-pred_scores, axis=1, kind='mergesort')
+    gt_taken = np.zeros(gt_valid.shape, dtype=bool)
+    tp = np.zeros((n, n_slots), dtype=bool)
+    matched_iou = np.zeros((n, n_slots), dtype=np.float32)
+
+    for k in xrange(n_slots):
+        idx = order[:, k]
+        candidates = np.where(gt_taken, -1., iou[rows, idx])
+        best = np.argmax(candidates, 1)
+        best_iou = candidates[rows, best]
+        hit = best_iou >= iou_threshold
+
+        tp[rows, idx] = hit
+        matched_iou[rows, idx] = np.where(hit, best_iou, 0.)
+        gt_taken[rows[hit], best[hit]] = True
+
+    return tp, matched_iou
+
+
+def average_precision(scores, tp, n_gt):
+    """Area under the interpolated precision-recall curve
+
+    :param scores: np.array of shape [n] with scores of all detections
+    :param tp: np.array of bools of shape [n], true if the detection is a true positive
+    :param n_gt: int, number of ground-truth objects
+    :return: float
+    """
+    if n_gt == 0:
+        return float('nan')
+
+    order = np.argsort(-scores, kind='mergesort')
+    tp = np.asarray(tp, dtype=np.float64)[order]
+    true_pos = np.cumsum(tp)
+    false_pos = np.cumsum(1. - tp)
+
+    recall = true_pos / n_gt
+    precision = true_pos / np.maximum(true_pos + false_pos, 1e-8)
+
+    recall = np.concatenate(([0.], recall, [1.]))
+    precision = np.concatenate(([0.], precision, [0.]))
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+
+    idx = np.where(recall[1:] != recall[:-1])[0]
+    return float(np.sum((recall[idx + 1] - recall[idx]) * precision[idx + 1]))
+
+
+def detection_metrics(pred_boxes, pred_scores, pred_valid, gt_boxes, counts, iou_threshold=.5):
+    """Computes detection metrics over a whole dataset at once
+
+    Precision and recall are computed for detections in `pred_valid`; average precision ranks all detection slots
+    by their scores.
+
+    :param pred_boxes: np.array of shape [n, max_steps, 4] as (y, x, height, width)
+    :param pred_scores: np.array of shape [n, max_steps]
+    :param pred_valid: np.array of bools of shape [n, max_steps]
+    :param gt_boxes: np.array of shape [n, max_objects, 4]
+    :param counts: np.array of shape [n], number of objects in every image
+    :param iou_threshold: float, minimum IoU of a true positive
+    :return: dict
+    """
+    counts = np.asarray(counts)
+    valid_gt = gt_valid(counts, gt_boxes.shape[1])
+    n_gt = int(valid_gt.sum())
+
+    tp, matched_iou = match_detections(pred_boxes, pred_scores, pred_valid, gt_boxes, valid_gt, iou_threshold)
+    n_tp = int(tp.sum())
+    n_pred = int(pred_valid.sum())
+
+    all_slots = np.ones_like(pred_valid)
+    all_tp, _ = match_detections(pred_boxes, pred_scores, all_slots, gt_boxes, valid_gt, iou_threshold)
+
+    return dict(
+        precision=n_tp / float(max(n_pred, 1)),
+        recall=n_tp / float(max(n_gt, 1)),
+        ap=average_precision(pred_scores.ravel(), all_tp.ravel(), n_gt),
+        mean_iou=float(matched_iou[tp].mean()) if n_tp > 0 else 0.,
+        count_accuracy=float(np.mean(pred_valid.sum(1) == counts)),
+        n_gt=n_gt,
+        n_pred=n_pred
+    )
+
+
+def evaluate_detections(air, sess, next_feed, n_batches, gt_boxes_key='boxes', iou_threshold=.5):
+    """Runs the model over `n_batches` minibatches and computes detection metrics for all of them at once
+
+    :param air: AIRModel
+    :param sess: tf.Session
+    :param next_feed: callable returning a pair of (feed dict, dict of np.arrays with the minibatch), where the
+        minibatch contains ground-truth `nums` and boxes
+    :param n_batches: int
+    :return: dict, see :func: detection_metrics
+    """
+    fetches = [air.where_loc, air.presence, air.presence_prob]
+    outputs = [[] for _ in fetches]
+    boxes, counts = [], []
+    for _ in xrange(n_batches):
+        feed_dict, batch = next_feed()
+        for o, v in zip(outputs, sess.run(fetches, feed_dict)):
+            # with many posterior samples per image, evaluate the first one
+            o.append(v[:, :air.batch_size // air.n_samples])
+        boxes.append(batch[gt_boxes_key])
+        counts.append(gt_counts(batch['nums']))
+
+    where, presence, presence_prob = (np.concatenate(o, 1) for o in outputs)
+    pred_boxes, scores, valid = detections_from_outputs(where, presence, presence_prob, air.img_size)
+    return detection_metrics(pred_boxes, scores, valid, np.concatenate(boxes), np.concatenate(counts),
+                             iou_threshold)
@@ -28,11 +28,12 @@ def rect_stn(ax, width, height, stn_params, c=None, line_width=3):
     rect(bbox, c, ax=ax, line_width=line_width)
 
 
-def make_fig(air, sess, checkpoint_dir=None, global_step=None, n_samples=10):
+def make_fig(air, sess, checkpoint_dir=None, global_step=None, n_samples=10, feed_dict=None):
     n_steps = air.max_steps
 
     xx, pred_canvas, pred_crop, prob, pres, w = sess.run(
-        [air.obs, air.canvas, air.glimpse, air.num_steps_distrib.prob()[..., 1:], air.presence, air.where])
+        [air.obs, air.canvas, air.glimpse, air.num_steps_distrib.prob()[..., 1:], air.presence, air.where],
+        feed_dict)
     height, width = xx.shape[1:]
 
     bs = min(n_samples, air.batch_size)
@@ -65,7 +66,13 @@ def make_fig(air, sess, checkpoint_dir=None, global_step=None, n_samples=10):
         plt.close('all')
 
 
-def make_logger(air, sess, summary_writer, train_tensor, train_batches, test_tensor, test_batches):
+def make_logger(air, sess, summary_writer, train_tensor, train_batches, test_tensor, test_batches,
+                train_feed=None, test_feed=None):
+    """Creates a function that logs the model's losses on training and test data and returns them as a dict.
+
+    If `train_feed` or `test_feed` are given, they should be callables returning feed dicts with minibatches
+    of the respective data and they take precedence over `train_tensor` and `test_tensor`.
+    """
     exprs = {
         'loss': air.loss.value,
         'rec_loss': air.rec_loss,
@@ -91,19 +98,23 @@ def make_logger(air, sess, summary_writer, train_tensor, train_batches, test_ten
     if air.l2_weight > 0:
         exprs['l2_loss'] = air.l2_loss
 
-    train_log = make_expr_logger(sess, summary_writer, train_batches / air.batch_size, exprs, name='train')
+    train_log = make_expr_logger(sess, summary_writer, train_batches / air.batch_size, exprs, name='train',
+                                 data_dict=train_feed)
 
-    data_dict = {
-        train_tensor['imgs']: test_tensor['imgs'],
-        train_tensor['nums']: test_tensor['nums']
-    }
+    if test_feed is not None:
+        data_dict = test_feed
+    else:
+        data_dict = {
+            train_tensor['imgs']: test_tensor['imgs'],
+            train_tensor['nums']: test_tensor['nums']
+        }
     test_log = make_expr_logger(sess, summary_writer, test_batches / air.batch_size, exprs, name='test',
                                 data_dict=data_dict)
 
     def log(train_itr):
-        train_log(train_itr)
-        test_log(train_itr)
+        metrics = dict(train=train_log(train_itr), test=test_log(train_itr))
         print
+        return metrics
 
     return log
 
@@ -117,7 +128,7 @@ def make_expr_logger(sess, writer, num_batches, expr_dict, name, data_dict=None,
     :param num_batches:
     :param expr:
     :param name:
-    :param data_dict:
+    :param data_dict: dict of {tensor to feed: tensor to evaluate} or a callable returning a feed dict
     :param constants_dict:
     :return:
     """
@@ -141,7 +152,11 @@ def make_expr_logger(sess, writer, num_batches, expr_dict, name, data_dict=None,
             num_batches_to_eval = num_batches
 
         for i in xrange(num_batches_to_eval):
-            if data_dict is not None:
+            if callable(data_dict):
+                feed_dict = data_dict()
+                if constants_dict:
+                    feed_dict.update(constants_dict)
+            elif data_dict is not None:
                 vals = sess.run(data_dict.values())
                 feed_dict = {k: v for k, v in zip(data_dict.keys(), vals)}
                 if constants_dict:
@@ -0,0 +1,165 @@
+"""Caches fully built graphs as MetaGraphs to skip graph construction on restarts.
+
+Building AIR together with its training op takes a while: the `dynamic_rnn`, all KL terms and gradient summaries are
+created op by op in Python. :func: export_graph writes the finished graph with a JSON file mapping the tensors used by
+the training and evaluation code to their names and :func: import_graph restores it, if it was built from the same
+configuration, the same source code and the same version of TensorFlow.
+
+The imported model is an :class: ImportedAIR, which exposes the tensors and the configuration of the original model
+under the same attribute names, but no Python-side objects like Sonnet modules or optimizers. Components for
+profiling, see :func: profiling.air_components, are stored with the graph.
+"""
+import hashlib
+import json
+import os
+from os import path as osp
+
+import tensorflow as tf
+from attrdict import AttrDict
+
+from profiling import air_components
+
+
+_TENSORS = ('obs canvas glimpse what what_scale where where_loc where_scale presence presence_prob num_step '
+            'num_step_accuracy rec_loss kl_num_steps kl_what kl_where baseline_loss reinforce_loss importance_weight '
+            'l2_loss').split()
+_LOSSES = ('loss', 'prior_loss')
+_VALUES = 'batch_size n_samples max_steps img_size glimpse_size l2_weight use_prior use_reinforce'.split()
+_OPTIONAL = 'baseline num_steps_prior what_prior'.split()
+
+
+def source_hash(directory=None):
+    """Hashes the source code of the package, so that a cached graph is rebuilt when the code changes
+
+    Python files in subdirectories, e.g. the training scripts in `scripts` and data loading in `data`, are included
+    together with their paths relative to `directory`.
+    """
+    if directory is None:
+        directory = osp.dirname(osp.abspath(__file__))
+
+    h = hashlib.sha1()
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith('.py'):
+                path = osp.join(root, name)
+                h.update(osp.relpath(path, directory))
+                with open(path) as f:
+                    h.update(f.read())
+    return h.hexdigest()
+
+
+def config_hash(config):
+    """Hashes a JSON-serialisable configuration together with the source code and the TensorFlow version"""
+    h = hashlib.sha1()
+    h.update(json.dumps(config, sort_keys=True, default=str))
+    h.update(source_hash())
+    h.update(tf.__version__)
+    return h.hexdigest()
+
+
+def _paths(prefix):
+    return prefix + '.meta', prefix + '.json'
+
+
+def _name(x):
+    return x.name
+
+
+def export_graph(prefix, air, inputs, train_step, global_step, config):
+    """Writes the default graph and handles to its tensors
+
+    :param prefix: string, path prefix of the `.meta` and `.json` files
+    :param air: AIRModel with its training op built
+    :param inputs: dict of placeholders
+    :param train_step: tf.Operation
+    :param global_step: tf.Variable
+    :param config: JSON-serialisable configuration the graph was built from
+    """
+    handles = dict(train_step=_name(train_step), global_step=_name(global_step),
+                   num_steps_prob=_name(air.num_steps_distrib.prob()),
+                   inputs={k: _name(v) for k, v in inputs.iteritems()})
+
+    for k in _TENSORS:
+        if getattr(air, k, None) is not None:
+            handles[k] = _name(getattr(air, k))
+
+    for k in _LOSSES:
+        if getattr(air, k, None) is not None:
+            handles[k] = _name(getattr(air, k).value)
+
+    values = {k: getattr(air, k) for k in _VALUES}
+    values.update({k: getattr(air, k, None) is not None for k in _OPTIONAL})
+    values['components'] = air_components(air)
+
+    meta_path, json_path = _paths(prefix)
+    if not osp.exists(osp.dirname(meta_path)):
+        os.makedirs(osp.dirname(meta_path))
+
+    tf.train.export_meta_graph(filename=meta_path, clear_devices=True)
+    with open(json_path, 'w') as f:
+        json.dump(dict(hash=config_hash(config), config=config, handles=handles, values=values), f, indent=2,
+                  default=str)
+
+
+def import_graph(prefix, config):
+    """Imports a graph written by :func: export_graph into the default graph
+
+    :return: tuple of (ImportedAIR, dict of placeholders, train_step, global_step) or None if there is no cached graph
+        for this configuration
+    """
+    meta_path, json_path = _paths(prefix)
+    if not (osp.exists(meta_path) and osp.exists(json_path)):
+        return None
+
+    with open(json_path) as f:
+        cached = json.load(f)
+
+    if cached['hash'] != config_hash(config):
+        print 'Cached graph in "{}" was built from a different configuration; rebuilding'.format(meta_path)
+        return None
+
+    tf.train.import_meta_graph(meta_path, clear_devices=True)
+    graph = tf.get_default_graph()
+    handles = cached['handles']
+
+    def get(name):
+        if ':' in name:
+            return graph.get_tensor_by_name(name)
+        return graph.get_operation_by_name(name)
+
+    inputs = {str(k): get(v) for k, v in handles.pop('inputs').iteritems()}
+    train_step = get(handles.pop('train_step'))
+    global_step = get(handles.pop('global_step'))
+    air = ImportedAIR({str(k): get(v) for k, v in handles.iteritems()}, cached['values'])
+    return air, inputs, train_step, global_step
+
+
+class ImportedAIR(object):
+    """Stands in for an AIRModel restored by :func: import_graph
+
+    Tensors and configuration values have the same names as in the original model. Optional components, e.g.
+    `baseline`, are True if the original model had them and None otherwise. There are no optimizers, so weights-only
+    checkpoints are not available.
+    """
+    optimizers = None
+
+    def __init__(self, tensors, values):
+        for k in _TENSORS + list(_LOSSES):
+            setattr(self, k, None)
+
+        num_steps_prob = tensors.pop('num_steps_prob')
+        self.num_steps_distrib = AttrDict(prob=lambda: num_steps_prob)
+
+        for k, v in tensors.iteritems():
+            if k in _LOSSES:
+                v = AttrDict(value=v)
+            setattr(self, k, v)
+
+        for k in _VALUES:
+            setattr(self, k, values[k])
+
+        for k in _OPTIONAL:
+            setattr(self, k, True if values[k] else None)
+
+        self.components = [(name, segments) for name, segments in values['components']]
@@ -0,0 +1,150 @@
+"""Exports latent variables inferred by AIR for large datasets.
+
+:class: LatentExporter streams images through the inference graph and writes every output to its own `.npy` file,
+which can be memory-mapped by downstream jobs. Arrays are image-major: an output of shape [max_steps, batch_size, n]
+is stored with shape [n_images, max_steps, n] and outputs with a single unit, like `presence`, as [n_images, max_steps].
+Progress is recorded in `progress.json` after arrays are flushed to disk, so that an interrupted export resumes from
+the last recorded batch.
+"""
+import json
+import os
+import time
+from os import path as osp
+
+import numpy as np
+
+
+LATENTS = ('what', 'where', 'presence', 'presence_prob')
+
+
+def _layout(shape):
+    """Shape of an image-major array for an output of shape [max_steps, batch_size, ...], without the batch axis"""
+    shape = [shape[0]] + list(shape[2:])
+    if shape[-1] == 1:
+        shape = shape[:-1]
+    return shape
+
+
+def _to_image_major(x):
+    x = np.swapaxes(x, 0, 1)
+    if x.shape[-1] == 1:
+        x = x[..., 0]
+    return x
+
+
+class LatentExporter(object):
+    """Writes outputs of the inference graph for every image of a dataset to memory-mapped `.npy` files"""
+
+    def __init__(self, sess, imgs, outputs, directory, dtype=np.float32, checkpoint_every=100, report_every=100,
+                 feed_dict=None):
+        """
+        :param sess: tf.Session with a restored model
+        :param imgs: tf.Tensor of shape [batch_size, height, width] fed with images, e.g. a placeholder
+        :param outputs: dict of {name: tf.Tensor of shape [max_steps, batch_size, ...]}, e.g. from :class: AIRModel
+        :param directory: string, where arrays and progress are written
+        :param dtype: np.float32 or np.float16
+        :param checkpoint_every: int, number of batches between flushing arrays and recording progress
+        :param report_every: int, number of batches between progress reports
+        :param feed_dict: dict or None, added to the feed dict of every batch
+        """
+        self._sess = sess
+        self._imgs = imgs
+        self._outputs = outputs
+        self._dtype = np.dtype(dtype)
+        self.directory = directory
+        self.checkpoint_every = checkpoint_every
+        self.report_every = report_every
+        self._feed_dict = feed_dict or {}
+
+        self.batch_size = imgs.get_shape().as_list()[0]
+        self._shapes = {k: _layout(v.get_shape().as_list()) for k, v in outputs.iteritems()}
+
+    @property
+    def progress_path(self):
+        return osp.join(self.directory, 'progress.json')
+
+    def array_path(self, name):
+        return osp.join(self.directory, name + '.npy')
+
+    def _read_progress(self, n_images):
+        if not osp.exists(self.progress_path):
+            return 0
+
+        with open(self.progress_path) as f:
+            progress = json.load(f)
+
+        expected = dict(n_images=n_images, dtype=self._dtype.name, shapes=self._shapes)
+        for k, v in expected.iteritems():
+            if progress[k] != v:
+                raise ValueError('Cannot resume an export with {} = {}; this one has {}'.format(k, progress[k], v))
+        return progress['n_done']
+
+    def _write_progress(self, n_images, n_done, arrays):
+        for a in arrays.itervalues():
+            a.flush()
+
+        progress = dict(n_images=n_images, n_done=n_done, dtype=self._dtype.name, shapes=self._shapes)
+        tmp_path = self.progress_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(progress, f)
+        os.rename(tmp_path, self.progress_path)
+
+    def _open_arrays(self, n_images, resume):
+        mode = 'r+' if resume else 'w+'
+        return {k: np.lib.format.open_memmap(self.array_path(k), mode, self._dtype, (n_images,) + tuple(shape))
+                for k, shape in self._shapes.iteritems()}
+
+    def export(self, images, verbose=True):
+        """Exports latents for all `images`, resuming a previous export into the same directory if there is one
+
+        :param images: np.array of shape [n_images, height, width]; it can be memory-mapped, since only one batch at
+            a time is read. Images of type uint8 are scaled to [0, 1]
+        :return: dict of memory-mapped arrays
+        """
+        if not osp.exists(self.directory):
+            os.makedirs(self.directory)
+
+        n_images = len(images)
+        n_done = self._read_progress(n_images)
+        arrays = self._open_arrays(n_images, resume=n_done > 0)
+        if verbose and n_done > 0:
+            print 'Resuming from image {} of {}'.format(n_done, n_images)
+
+        names = sorted(self._outputs)
+        fetches = [self._outputs[k] for k in names]
+        start, n_start, n_batches = time.time(), n_done, 0
+        while n_done < n_images:
+            batch = np.asarray(images[n_done:n_done + self.batch_size])
+            n = len(batch)
+            if batch.dtype == np.uint8:
+                batch = batch.astype(np.float32) / 255.
+            if n < self.batch_size:
+                padding = np.zeros((self.batch_size - n,) + batch.shape[1:], dtype=batch.dtype)
+                batch = np.concatenate((batch, padding))
+
+            feed_dict = dict(self._feed_dict)
+            feed_dict[self._imgs] = batch
+            for k, v in zip(names, self._sess.run(fetches, feed_dict)):
+                arrays[k][n_done:n_done + n] = _to_image_major(v)[:n]
+
+            n_done += n
+            n_batches += 1
+            if n_batches % self.checkpoint_every == 0 or n_done == n_images:
+                self._write_progress(n_images, n_done, arrays)
+
+            if verbose and (n_batches % self.report_every == 0 or n_done == n_images):
+                duration = time.time() - start
+                print 'Exported {} of {} images, {:.1f} img/s'.format(n_done, n_images,
+                                                                      (n_done - n_start) / max(duration, 1e-8))
+        return arrays
+
+
+def load_latents(directory):
+    """Memory-maps arrays written by :class: LatentExporter; fails if the export has not finished"""
+    with open(osp.join(directory, 'progress.json')) as f:
+        progress = json.load(f)
+
+    if progress['n_done'] != progress['n_images']:
+        raise ValueError('The export in "{}" is incomplete: {} of {} images'.format(directory, progress['n_done'],
+                                                                                  progress['n_images']))
+    return {str(k): np.load(osp.join(directory, k + '.npy'), mmap_mode='r') for k in progress['shapes']}
@@ -0,0 +1,214 @@
+"""Plans the batch size that fits a memory budget.
+
+Memory of a training or inference step is modelled as `a + b * batch_size`: `a` covers variables, optimizer slots
+and anything else that does not depend on the batch and `b` the activations of a single image. The coefficients are
+fitted to measurements at a few small batch sizes, either
+
+* static: the sum of sizes of all tensors a step produces, from static shapes in the built graph, together with all
+  variables. It ignores that TensorFlow frees and reuses buffers, so it overestimates the peak, but it needs no run;
+* probed: the peak memory of a traced step, see :func: profiling.peak_memory, and memory allocated by every
+  component of the model, see :class: profiling.StepProfiler.
+
+:func: max_batch_size then extrapolates to the largest batch size that fits a budget.
+"""
+import json
+from collections import OrderedDict
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.python.util import nest
+
+from profiling import StepProfiler, op_component, peak_memory
+
+
+# ops that do not allocate memory for their outputs, but forward or alias buffers of their inputs
+_NO_ALLOCATION = {'VariableV2', 'Variable', 'VarHandleOp', 'Const', 'Identity', 'Reshape', 'ExpandDims', 'Squeeze',
+                  'StopGradient', 'Enter', 'Exit', 'Switch', 'Merge', 'NextIteration', 'NoOp'}
+
+
+def _tensor_bytes(tensor, loop_iterations):
+    shape = tensor.get_shape()
+    if not shape.is_fully_defined() or tensor.dtype.base_dtype in (tf.string, tf.resource):
+        return 0
+
+    n_bytes = np.prod(shape.as_list(), dtype=np.int64) * tensor.dtype.size
+    # tensors created in a while loop, e.g. of `dynamic_rnn`, exist once per iteration
+    if tensor.op._get_control_flow_context() is not None:
+        n_bytes *= loop_iterations
+    return int(n_bytes)
+
+
+def _required_ops(fetches):
+    """Ops that `sess.run(fetches)` can execute"""
+    fetches = [f.op if isinstance(f, tf.Tensor) else f for f in nest.flatten(fetches)]
+    ops, stack = set(), list(fetches)
+    while stack:
+        op = stack.pop()
+        if op in ops:
+            continue
+        ops.add(op)
+        stack.extend(t.op for t in op.inputs)
+        stack.extend(op.control_inputs)
+    return ops
+
+
+def static_memory(fetches, components, loop_iterations=1):
+    """Estimates memory of running `fetches` from static shapes of the default graph
+
+    :param fetches: tf.Tensor, tf.Operation or a nested structure of them
+    :param components: list of (component name, list of op name segments), see :func: profiling.air_components
+    :param loop_iterations: int, number of iterations of while loops, e.g. `max_steps` of an AIRModel
+    :return: OrderedDict of {component: MB} with a `variables` component for all variables and optimizer slots
+        and `total`
+    """
+    stats = OrderedDict((c, 0) for c, _ in components)
+    stats['other'] = 0
+    for op in _required_ops(fetches):
+        if op.type in _NO_ALLOCATION:
+            continue
+        n_bytes = sum(_tensor_bytes(t, loop_iterations) for t in op.outputs)
+        if n_bytes > 0:
+            stats[op_component(op.name, components)] += n_bytes
+
+    stats['variables'] = sum(_tensor_bytes(v, 1) for v in tf.global_variables())
+    stats['total'] = sum(stats.values())
+    return OrderedDict((k, v / 2. ** 20) for k, v in stats.iteritems())
+
+
+def measure_step(sess, fetches, components, feed_dict=None):
+    """Runs `fetches` once with tracing
+
+    :return: peak MB of the allocator with the highest peak and an OrderedDict of {component: allocated MB}
+    """
+    profiler = StepProfiler(components)
+    profiler.run(sess, fetches, feed_dict)
+    peak = max(peak_memory(profiler._step_stats[0]).values() or [0.])
+    allocated = OrderedDict((r['component'], r['mbytes']) for r in profiler.aggregate())
+    return peak, allocated
+
+
+def probe(build, batch_sizes, run=True, config=None, verbose=True):
+    """Builds the model for every batch size and measures memory of every set of fetches
+
+    :param build: callable taking the batch size; builds the model in the default graph and returns a tuple of
+        (dict of {name: fetches}, e.g. `train` and `inference`, feed_dict or None, components, loop_iterations)
+    :param batch_sizes: list of ints, small enough to fit in memory
+    :param run: boolean, if False only static estimates are computed and nothing is run
+    :param config: tf.ConfigProto or None
+    :return: list of dicts with `batch_size`, `name` of the fetches, `static` estimates and, if `run`, the measured
+        `peak_mb` and `allocated` memory per component
+    """
+    results = []
+    for batch_size in batch_sizes:
+        with tf.Graph().as_default():
+            tf.set_random_seed(0)
+            fetches, feed_dict, components, loop_iterations = build(batch_size)
+            init = tf.global_variables_initializer()
+
+            sess = None
+            if run:
+                sess = tf.Session(config=config)
+                sess.run(init)
+
+            try:
+                for name in sorted(fetches):
+                    result = dict(batch_size=batch_size, name=name,
+                                  static=static_memory(fetches[name], components, loop_iterations))
+                    if run:
+                        result['peak_mb'], result['allocated'] = measure_step(sess, fetches[name], components,
+                                                                              feed_dict)
+                    results.append(result)
+                    if verbose:
+                        print format_result(result)
+            finally:
+                if sess is not None:
+                    sess.close()
+    return results
+
+
+def format_result(result):
+    line = '{:<10} batch_size={:<5} static {:>9.1f}MB'.format(result['name'], result['batch_size'],
+                                                               result['static']['total'])
+    if 'peak_mb' in result:
+        line += '  peak {:>9.1f}MB'.format(result['peak_mb'])
+    return line
+
+
+def fit_linear(batch_sizes, values):
+    """Least-squares fit of `values ~= a + b * batch_size`; `b` is clipped at zero
+
+    :return: tuple of floats (a, b)
+    """
+    batch_sizes = np.asarray(batch_sizes, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    if len(np.unique(batch_sizes)) < 2:
+        raise ValueError('Fitting needs at least two different batch sizes, but got {}'.format(batch_sizes))
+
+    b, a = np.polyfit(batch_sizes, values, 1)
+    b = max(b, 0.)
+    return float(values.mean() - b * batch_sizes.mean()), float(b)
+
+
+def fit_memory(results, name):
+    """Fits memory models to results of :func: probe for fetches called `name`
+
+    :return: dict with (a, b) of the `static` total and, if memory was measured, of the `peak`, and dicts of
+        {component: (a, b)} of `static_components` and `allocated` memory
+    """
+    results = [r for r in results if r['name'] == name]
+    batch_sizes = [r['batch_size'] for r in results]
+
+    def fit_components(key):
+        names = results[0][key].keys()
+        return OrderedDict((k, fit_linear(batch_sizes, [r[key].get(k, 0.) for r in results])) for k in names)
+
+    static = fit_components('static')
+    fit = dict(name=name, static=static.pop('total'), static_components=static)
+    if 'peak_mb' in results[0]:
+        fit['peak'] = fit_linear(batch_sizes, [r['peak_mb'] for r in results])
+        fit['allocated'] = fit_components('allocated')
+    return fit
+
+
+def max_batch_size(coeffs, budget_mb, margin=.1, multiple=1):
+    """Largest multiple of `multiple` for which `a + b * batch_size` fits `(1 - margin) * budget_mb`; 0 if none"""
+    a, b = coeffs
+    available = (1. - margin) * budget_mb - a
+    if available < b * multiple:
+        return 0
+    if b <= 0.:
+        raise ValueError('Memory does not grow with the batch size; the batch size is unbounded')
+    return int(available / b) // multiple * multiple
+
+
+def plan(fit, budget_mb, margin=.1, multiple=1):
+    """Recommends a batch size from a fit of :func: fit_memory, preferring measured peaks over static estimates
+
+    :return: dict with the recommended `batch_size`, its `predicted_mb`, the `source` of the estimate and the
+        predicted MB per component at that batch size
+    """
+    source = 'peak' if 'peak' in fit else 'static'
+    a, b = fit[source]
+    batch_size = max_batch_size(fit[source], budget_mb, margin, multiple)
+
+    components = fit['allocated'] if source == 'peak' else fit['static_components']
+    per_component = OrderedDict((k, ca + cb * batch_size) for k, (ca, cb) in components.iteritems())
+    return dict(name=fit['name'], batch_size=batch_size, predicted_mb=a + b * batch_size, budget_mb=budget_mb,
+                margin=margin, source=source, per_image_mb=b, fixed_mb=a, components=per_component)
+
+
+def format_plan(plan):
+    lines = ['{name}: batch_size={batch_size} uses {predicted_mb:.1f}MB of {budget_mb:.1f}MB '
+             '({source}: {fixed_mb:.1f}MB + {per_image_mb:.3f}MB per image)'.format(**plan)]
+    if plan['source'] == 'peak':
+        lines.append('  memory allocated during a step by component:')
+    else:
+        lines.append('  sizes of tensors by component:')
+    for k, v in sorted(plan['components'].iteritems(), key=lambda kv: -kv[1]):
+        lines.append('    {:<22} {:>10.1f}MB'.format(k, v))
+    return '\n'.join(lines)
+
+
+def save_plan(path, plans, results):
+    with open(path, 'w') as f:
+        json.dump(dict(plans=plans, results=results), f, indent=2, default=float)
@@ -4,7 +4,10 @@ import tensorflow as tf
 import sonnet as snt
 
 from model import AIRModel
-from modules import BaselineMLP, Encoder, Decoder, StochasticTransformParam, StepsPredictor
+from modules import BaselineMLP, Encoder, ConvEncoder, Decoder, StochasticTransformParam, StepsPredictor
+
+
+_ENCODERS = dict(mlp=Encoder, conv=ConvEncoder)
 
 
 class AIRonMNIST(AIRModel):
@@ -19,7 +22,11 @@ class AIRonMNIST(AIRModel):
                  baseline_hidden=[256, 128]*1,
                  transform_var_bias=-2.,
                  step_bias=0.,
+                 inpt_encoder_type='mlp',
+                 glimpse_encoder_type='mlp',
                  *args, **kwargs):
+        """Creates the model; `inpt_encoder_type` and `glimpse_encoder_type` can be 'mlp' or 'conv', where the
+        latter uses :class: modules.ConvEncoder, whose cost grows much slower with the image size."""
 
         self.transform_var_bias = tf.Variable(transform_var_bias, trainable=False, dtype=tf.float32,
                                                        name='transform_var_bias')
@@ -33,8 +40,8 @@ class AIRonMNIST(AIRModel):
             glimpse_size=glimpse_size,
             n_appearance=50,
             transition=snt.LSTM(256),
-            input_encoder=partial(Encoder, inpt_encoder_hidden),
-            glimpse_encoder=partial(Encoder, glimpse_encoder_hidden),
+            input_encoder=partial(_ENCODERS[inpt_encoder_type], inpt_encoder_hidden),
+            glimpse_encoder=partial(_ENCODERS[glimpse_encoder_type], glimpse_encoder_hidden),
             glimpse_decoder=partial(Decoder, glimpse_decoder_hidden),
             transform_estimator=partial(StochasticTransformParam, transform_estimator_hidden,
                                       scale_bias=self.transform_var_bias),
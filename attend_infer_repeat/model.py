@@ -19,7 +19,9 @@ class AIRModel(object):
                  n_appearance, transition, input_encoder, glimpse_encoder, glimpse_decoder, transform_estimator,
                  steps_predictor,
                  output_std=1., discrete_steps=True, output_multiplier=1.,
-                 explore_eps=None, debug=False, **kwargs):
+                 explore_eps=None, debug=False, n_samples=1, relaxed_steps=False, straight_through=False,
+                 temperature=1., step_limit=None, swap_memory=False, parallel_iterations=None, unroll=False,
+                 **kwargs):
         """Creates the model.
 
         :param obs: tf.Tensor, images
@@ -39,9 +41,36 @@ class AIRModel(object):
         :param output_multiplier: float, a factor that multiplies the reconstructed glimpses
         :param explore_eps: see :class: AIRCell
         :param debug: see :class: AIRCell
+        :param n_samples: int, number of posterior samples drawn for every image; `obs` and `nums` are tiled
+            `n_samples` times along the batch dimension, so that all samples are computed in one pass. The sample `k`
+            of the image `i` is at index `k * batch_size + i`.
+        :param relaxed_steps: boolean, uses the Concrete relaxation of presence trained with pathwise gradients
+            instead of REINFORCE, see :class: AIRCell
+        :param straight_through: boolean, see :class: AIRCell
+        :param temperature: float, initial temperature of the Concrete distribution; it can be annealed in
+            :meth: train_step
+        :param step_limit: int, tf.Tensor or None; if given, the model takes at most this many steps, e.g. for
+            batches of images with few objects. Outputs are padded to `max_steps`: the canvas with its last value and
+            all other outputs with zeros, except for scales of distributions, which are padded with ones.
+        :param swap_memory: boolean, swaps tensors of the recurrence kept for the backward pass from the GPU to host
+            memory, which lowers GPU memory at the cost of transfers; it has no effect on the CPU. See
+            :func: tf.nn.dynamic_rnn
+        :param parallel_iterations: int or None, number of steps of the while loop that may run concurrently. Steps
+            of AIR depend on each other, and the backward pass keeps activations of every step regardless of this
+            setting, so it does not lower memory; it only bounds how far ops that don't depend on the previous step
+            can run ahead. None uses the default of :func: tf.nn.dynamic_rnn
+        :param unroll: boolean, builds `max_steps` copies of the cell instead of a while loop, which avoids the
+            overhead of control flow and lets TF optimise across steps; useful for small `max_steps`. It creates the
+            same variables and outputs as the while loop. It does not support `step_limit`, and `swap_memory` and
+            `parallel_iterations` have no effect
         :param **kwargs: all other parameters are passed to AIRCell
         """
 
+        self.n_samples = n_samples
+        if n_samples > 1:
+            obs = tf.tile(obs, [n_samples] + [1] * (len(obs.get_shape()) - 1))
+            nums = tf.tile(nums, [1, n_samples] + [1] * (len(nums.get_shape()) - 2))
+
         self.obs = obs
         self.nums = nums
         self.max_steps = max_steps
@@ -53,6 +82,15 @@ class AIRModel(object):
         self.discrete_steps = discrete_steps
         self.explore_eps = explore_eps
         self.debug = debug
+        self.relaxed_steps = relaxed_steps
+        self.straight_through = straight_through
+        self.temperature = temperature
+        self.step_limit = step_limit
+        self.swap_memory = swap_memory
+        self.parallel_iterations = parallel_iterations
+        self.unroll = unroll
+        if unroll and step_limit is not None:
+            raise ValueError('A statically unrolled model takes a fixed number of steps; step_limit is not supported')
 
         with tf.variable_scope(self.__class__.__name__):
             self.output_multiplier = tf.Variable(output_multiplier, dtype=tf.float32, trainable=False, name='canvas_multiplier')
@@ -70,6 +108,11 @@ class AIRModel(object):
         if self.explore_eps is not None:
             self.explore_eps = tf.get_variable('explore_eps', initializer=self.explore_eps, trainable=False)
 
+        if self.relaxed_steps:
+            self.temperature = tf.get_variable('temperature', initializer=float(self.temperature), trainable=False)
+            kwargs = dict(kwargs, relaxed_steps=True, straight_through=self.straight_through,
+                          temperature=self.temperature)
+
         self.cell = AIRCell(self.img_size, self.glimpse_size, self.n_appearance, transition,
                             input_encoder, glimpse_encoder, glimpse_decoder, transform_estimator, steps_predictor,
                             canvas_init=None,
@@ -78,10 +121,23 @@ class AIRModel(object):
                             debug=self.debug,
                             **kwargs)
 
-        initial_state = self.cell.initial_state(self.obs)
+        self.initial_state = self.cell.initial_state(self.obs)
+
+        sequence_shape = (self.max_steps, self.batch_size, 1)
+        if self.step_limit is not None:
+            n_steps = tf.clip_by_value(tf.to_int32(self.step_limit), 1, self.max_steps)
+            sequence_shape = tf.stack((n_steps,) + sequence_shape[1:])
 
-        dummy_sequence = tf.zeros((self.max_steps, self.batch_size, 1), name='dummy_sequence')
-        outputs, state = tf.nn.dynamic_rnn(self.cell, dummy_sequence, initial_state=initial_state, time_major=True)
+        dummy_sequence = tf.zeros(sequence_shape, name='dummy_sequence')
+        if self.unroll:
+            outputs, state = self._unrolled_rnn(dummy_sequence)
+        else:
+            outputs, state = tf.nn.dynamic_rnn(self.cell, dummy_sequence, initial_state=self.initial_state,
+                                               time_major=True, swap_memory=self.swap_memory,
+                                               parallel_iterations=self.parallel_iterations)
+
+        if self.step_limit is not None:
+            outputs = self._pad_steps(outputs, n_steps)
 
         for name, output in zip(self.cell.output_names, outputs):
             setattr(self, name, output)
@@ -99,10 +155,40 @@ class AIRModel(object):
         posterior_step_probs = tf.transpose(tf.squeeze(self.presence_prob))
         self.num_steps_distrib = NumStepsDistribution(posterior_step_probs)
 
-        self.num_step_per_sample = tf.to_float(tf.squeeze(tf.reduce_sum(self.presence, 0)))
+        # relaxed presence is continuous, so steps are counted after rounding
+        presence = tf.round(self.presence) if self.relaxed_steps else self.presence
+        self.num_step_per_sample = tf.to_float(tf.squeeze(tf.reduce_sum(presence, 0)))
         self.num_step = tf.reduce_mean(self.num_step_per_sample)
         self.gt_num_steps = tf.squeeze(tf.reduce_sum(self.nums, 0))
 
+    def _unrolled_rnn(self, inpt):
+        """Static equivalent of :func: tf.nn.dynamic_rnn with time-major `inpt`"""
+        state = self.initial_state
+        outputs = []
+        with tf.variable_scope('rnn'):
+            for t in xrange(self.max_steps):
+                output, state = self.cell(inpt[t], state)
+                outputs.append(output)
+
+        outputs = [tf.stack(output) for output in zip(*outputs)]
+        return outputs, state
+
+    def _pad_steps(self, outputs, n_steps):
+        """Pads outputs of the cell computed for `n_steps` steps to `max_steps`"""
+        n_padding = self.max_steps - n_steps
+        padded = []
+        for name, output in zip(self.cell.output_names, outputs):
+            if name == 'canvas':
+                padding = tf.tile(output[-1:], tf.stack((n_padding, 1, 1)))
+            else:
+                value = 1. if name.endswith('scale') else 0.
+                padding = tf.fill(tf.stack((n_padding, self.batch_size, output.get_shape()[-1].value)), value)
+
+            output = tf.concat((output, padding), 0)
+            output.set_shape([self.max_steps] + output.get_shape().as_list()[1:])
+            padded.append(output)
+        return padded
+
     @staticmethod
     def _anneal_weight(init_val, final_val, anneal_type, global_step, anneal_steps, hold_for=0., steps_div=1.,
                        dtype=tf.float64):
@@ -145,8 +231,15 @@ class AIRModel(object):
                 with tf.variable_scope('num_steps'):
                     prior = geometric_prior(steps_prior_success_prob, self.max_steps)
                     num_steps_posterior_prob = self.num_steps_distrib.prob()
-                    steps_kl = tabular_kl(num_steps_posterior_prob, prior)
-                    self.kl_num_steps_per_sample = tf.squeeze(tf.reduce_sum(steps_kl, 1))
+                    if self.estimator == 'vimco':
+                        # the multi-sample bound needs log weights of the sampled number of steps, so the KL is
+                        # replaced by its single-sample estimate log q(n) - log p(n)
+                        log_prior = tf.gather(tf.log(prior), tf.to_int32(self.num_step_per_sample))
+                        log_posterior = self.num_steps_distrib.log_prob(self.num_step_per_sample)
+                        self.kl_num_steps_per_sample = log_posterior - log_prior
+                    else:
+                        steps_kl = tabular_kl(num_steps_posterior_prob, prior)
+                        self.kl_num_steps_per_sample = tf.squeeze(tf.reduce_sum(steps_kl, 1))
 
                     self.kl_num_steps = tf.reduce_mean(self.kl_num_steps_per_sample)
                     tf.summary.scalar('kl_num_steps', self.kl_num_steps)
@@ -245,11 +338,41 @@ class AIRModel(object):
         tf.summary.scalar('imp_weight_var', imp_weight_var)
 
         reinforce_loss_per_sample = tf.stop_gradient(self.importance_weight) * log_prob
+        if self.estimator == 'vimco':
+            # the bound of an image depends on all of its samples, so their learning signals are summed
+            reinforce_loss_per_sample = tf.reduce_sum(tf.reshape(reinforce_loss_per_sample, (self.n_samples, -1)), 0)
         self.reinforce_loss = tf.reduce_mean(reinforce_loss_per_sample)
         tf.summary.scalar('reinforce_loss', self.reinforce_loss)
 
         return self.reinforce_loss
 
+    def _vimco(self, loss_per_sample):
+        """Computes the multi-sample bound and VIMCO learning signals with leave-one-out baselines.
+
+        The learning signal of the k-th sample is the difference between the bound and the bound computed with the
+        k-th log weight replaced by the mean of the remaining ones. It is returned as a loss, so that it can be used
+        in place of the importance weight in :meth: _reinforce.
+
+        :param loss_per_sample: tf.Tensor of shape [n_samples * batch_size], negative log weights
+        :return: tf.Tensor of shape [], the negative bound and tf.Tensor of shape [n_samples * batch_size]
+        """
+        k = self.n_samples
+        log_weights = tf.reshape(-loss_per_sample, (k, -1))
+        log_k = np.log(k).astype(np.float32)
+
+        self.vimco_bound_per_sample = tf.reduce_logsumexp(log_weights, 0) - log_k
+        self.vimco_bound = tf.reduce_mean(self.vimco_bound_per_sample)
+        tf.summary.scalar('vimco_bound', self.vimco_bound)
+
+        mean_of_others = (tf.reduce_sum(log_weights, 0, keep_dims=True) - log_weights) / (k - 1)
+        diag = tf.eye(k)[..., tf.newaxis]
+        loo_log_weights = log_weights[tf.newaxis] * (1. - diag) + mean_of_others[:, tf.newaxis] * diag
+        loo_bound = tf.reduce_logsumexp(loo_log_weights, 1) - log_k
+
+        # negative of the learning signal, since REINFORCE minimises importance_weight * log_prob
+        imp_weight = loo_bound - self.vimco_bound_per_sample[tf.newaxis]
+        return -self.vimco_bound, tf.reshape(imp_weight, (-1,))
+
     def _make_baseline_train_step(self, opt, loss, baseline, baseline_vars):
         baseline_target = tf.stop_gradient(loss)
 
@@ -261,7 +384,8 @@ class AIRModel(object):
     def train_step(self, learning_rate, l2_weight=0., what_prior=None, where_scale_prior=None,
                    where_shift_prior=None,
                    num_steps_prior=None, use_prior=True,
-                   use_reinforce=True, baseline=None, decay_rate=None,
+                   use_reinforce=True, baseline=None, decay_rate=None, estimator='reinforce',
+                   temperature_anneal=None,
                    optimizer=tf.train.RMSPropOptimizer, opt_kwargs=dict(momentum=.9, centered=True)):
         """Creates the train step and the global_step
 
@@ -285,13 +409,35 @@ class AIRModel(object):
         that the probability of taking a single step is .9, two steps is .9**2 etc.
 
         :param use_prior: boolean, if False sets the KL-divergence loss term to 0
-        :param use_reinforce: boolean, if False doesn't compute gradients for the number of steps
+        :param use_reinforce: boolean, if False doesn't compute gradients for the number of steps; it is ignored
+            for models with `relaxed_steps`, which are trained without REINFORCE and the baseline
         :param baseline: callable or None, baseline for variance reduction of REINFORCE
         :param decay_rate: float, decay rate to use for exp-moving average for NVIL
+        :param estimator: string, 'reinforce' uses a single sample per image and the baseline for variance
+            reduction; 'vimco' optimises the multi-sample bound over `n_samples` samples per image and uses
+            leave-one-out baselines instead of a learned baseline, see :meth: _vimco. With 'vimco', the KL terms
+            are computed for the sampled number of steps and `num_steps_prior.analytic` is set to False
+        :param temperature_anneal: AttrDict or None, with `final`, `anneal` and `steps` and optionally `hold_init`
+            and `steps_div` as in `num_steps_prior`; anneals the temperature of relaxed presence from its initial
+            value. The update op is added to UPDATE_OPS.
         :return: train step and global step
         """
+        if estimator not in ('reinforce', 'vimco'):
+            raise ValueError('Unknown estimator: {}'.format(estimator))
+
+        if estimator == 'vimco':
+            if self.n_samples < 2:
+                raise ValueError('VIMCO requires n_samples >= 2, but n_samples = {}'.format(self.n_samples))
+            self.baseline = None
+
+        if self.relaxed_steps:
+            use_reinforce = False
+            self.baseline = None
 
         num_steps_prior['analytic'] = getattr(num_steps_prior, 'analytic', True)
+        if estimator == 'vimco':
+            # expectations over q(n) don't depend on the sampled number of steps, so they can't enter the log weights
+            num_steps_prior['analytic'] = False
 
         self.l2_weight = l2_weight
         self.what_prior = what_prior
@@ -308,6 +454,7 @@ class AIRModel(object):
             self.toggle_prior = self.use_prior.assign(tf.logical_not(self.use_prior))
 
         self.use_reinforce = use_reinforce
+        self.estimator = estimator
 
         with tf.variable_scope('loss'):
             global_step = tf.train.get_or_create_global_step()
@@ -316,6 +463,16 @@ class AIRModel(object):
             self.learning_rate = tf.Variable(learning_rate, name='learning_rate', trainable=False)
             make_opt = functools.partial(optimizer, **opt_kwargs)
 
+            if self.relaxed_steps and temperature_anneal is not None:
+                with tf.variable_scope('temperature'):
+                    ta = temperature_anneal
+                    init = self.temperature.initial_value
+                    temperature = self._anneal_weight(init, ta.final, ta.anneal, global_step, ta.steps,
+                                                      getattr(ta, 'hold_init', 0.), getattr(ta, 'steps_div', 1.))
+                    update = self.temperature.assign(tf.to_float(temperature))
+                    tf.add_to_collection(tf.GraphKeys.UPDATE_OPS, update)
+                tf.summary.scalar('temperature', self.temperature)
+
             # Reconstruction Loss, - \E_q [ p(x | z, n) ]
             rec_loss_per_sample = -self.output_distrib.log_prob(self.obs)
             self.rec_loss_per_sample = tf.reduce_sum(rec_loss_per_sample, axis=(1, 2))
@@ -333,13 +490,20 @@ class AIRModel(object):
 
             # REINFORCE
             opt_loss = loss.value
+            if estimator == 'vimco':
+                opt_loss, vimco_imp_weight = self._vimco(loss.per_sample)
+
             if use_reinforce:
 
-                self.reinforce_imp_weight = self.rec_loss_per_sample
-                if not num_steps_prior.analytic:
-                    self.reinforce_imp_weight += self.prior_loss.per_sample
+                if estimator == 'vimco':
+                    self.reinforce_imp_weight = vimco_imp_weight
+                else:
+                    self.reinforce_imp_weight = self.rec_loss_per_sample
+                    if not num_steps_prior.analytic:
+                        self.reinforce_imp_weight += self.prior_loss.per_sample
 
-                reinforce_loss = self._reinforce(self.reinforce_imp_weight, decay_rate)
+                with tf.name_scope('reinforce'):
+                    reinforce_loss = self._reinforce(self.reinforce_imp_weight, decay_rate)
                 opt_loss += reinforce_loss
 
             baseline_vars = getattr(self, 'baseline_vars', [])
@@ -353,6 +517,7 @@ class AIRModel(object):
                 tf.summary.scalar('l2', self.l2_loss)
 
             opt = make_opt(self.learning_rate)
+            self.optimizers = [opt]
             gvs = opt.compute_gradients(opt_loss, var_list=model_vars)
 
             update_ops = tf.get_collection(tf.GraphKeys.UPDATE_OPS)
@@ -361,6 +526,7 @@ class AIRModel(object):
 
             if self.use_reinforce and self.baseline is not None:
                 baseline_opt = make_opt(10 * learning_rate)
+                self.optimizers.append(baseline_opt)
                 self._baseline_tran_step = self._make_baseline_train_step(baseline_opt, self.reinforce_imp_weight,
                                                                           self.baseline, self.baseline_vars)
                 self._true_train_step = self._train_step
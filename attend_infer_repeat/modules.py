@@ -5,7 +5,7 @@ from tensorflow.python.util import nest
 
 import sonnet as snt
 
-from neural import MLP
+from neural import MLP, default_activation
 
 
 class ParametrisedGaussian(snt.AbstractModule):
@@ -76,6 +76,48 @@ class Encoder(snt.AbstractModule):
         return seq(inpt)
 
 
+class ConvEncoder(snt.AbstractModule):
+    """Strided convolutional encoder with the same interface as :class: Encoder.
+
+    Every convolutional layer downsamples its input by a factor of 2 until the spatial size is at most
+    `max_flat_size`; the result is flattened and passed through an MLP. The number of layers grows logarithmically
+    with the size of the input and the size of the flattened feature map is bounded, so the number of parameters
+    grows only logarithmically with the image area (as opposed to linearly for :class: Encoder).
+    """
+
+    def __init__(self, n_hidden, n_channels=16, max_channels=64, kernel_shape=3, max_flat_size=8):
+        """
+        :param n_hidden: int or an iterable of ints, number of hidden units of the MLP
+        :param n_channels: int, number of channels of the first convolutional layer; it doubles in every layer
+        :param max_channels: int, maximum number of channels
+        :param kernel_shape: int, size of the convolutional kernels
+        :param max_flat_size: int, the input is downsampled until both of its spatial dimensions are at most this
+        """
+        super(ConvEncoder, self).__init__(self.__class__.__name__)
+        self._n_hidden = n_hidden
+        self._n_channels = n_channels
+        self._max_channels = max_channels
+        self._kernel_shape = kernel_shape
+        self._max_flat_size = max_flat_size
+
+    def _build(self, inpt):
+        if len(inpt.get_shape()) == 3:
+            inpt = inpt[..., tf.newaxis]
+
+        size = max(inpt.get_shape().as_list()[1:3])
+        n_channels = self._n_channels
+        layers = []
+        while size > self._max_flat_size:
+            conv = snt.Conv2D(n_channels, self._kernel_shape, stride=2)
+            layers.extend([conv, default_activation])
+            size = int(np.ceil(size / 2.))
+            n_channels = min(2 * n_channels, self._max_channels)
+
+        layers.extend([snt.BatchFlatten(), MLP(self._n_hidden)])
+        seq = snt.Sequential(layers)
+        return seq(inpt)
+
+
 class Decoder(snt.AbstractModule):
 
     def __init__(self, n_hidden, output_size):
@@ -91,10 +133,44 @@ class Decoder(snt.AbstractModule):
         return seq(inpt)
 
 
+def interpolation_matrix(coords, size):
+    """Builds matrices of bilinear interpolation weights along one axis, see :func: numpy_air.interpolation_matrix
+
+    Pixels outside of the image are treated as zeros, as in :func: snt.resampler.
+
+    :param coords: tf.Tensor of shape [batch_size, n] with coordinates in pixels
+    :param size: int, size of the sampled axis
+    :return: tf.Tensor of shape [batch_size, n, size]
+    """
+    lower = tf.stop_gradient(tf.floor(coords))
+    frac = (coords - lower)[..., tf.newaxis]
+    lower = tf.to_int32(lower)
+    # one_hot gives rows of zeros for indices outside of [0, size)
+    return tf.one_hot(lower, size) * (1. - frac) + tf.one_hot(lower + 1, size) * frac
+
+
 class SpatialTransformer(snt.AbstractModule):
 
-    def __init__(self, img_size, crop_size, constraints=None, inverse=False):
+    def __init__(self, img_size, crop_size, constraints=None, inverse=False, separable=False):
+        """
+        :param img_size: int tuple, size of the image
+        :param crop_size: int tuple, size of the glimpse
+        :param constraints: snt.AffineWarpConstraints or None
+        :param inverse: boolean, pastes glimpses into images instead of cropping them
+        :param separable: boolean, without shear bilinear sampling is separable and the output is computed as
+            `R_y * img * R_x^T` with interpolation matrices along the y and x axes, instead of a per-pixel sampling
+            grid and :func: snt.resampler. It computes the same values and gradients with dense matrix products
+            instead of gathers and scatters. It requires `snt.AffineWarpConstraints.no_shear_2d()`
+        """
         super(SpatialTransformer, self).__init__(self.__class__.__name__)
+        self._separable = separable
+        self._inverse = inverse
+        self._input_size, self._output_size = (crop_size, img_size) if inverse else (img_size, crop_size)
+
+        if separable:
+            no_shear = snt.AffineWarpConstraints.no_shear_2d().constraints
+            if constraints is None or constraints.constraints != no_shear:
+                raise ValueError('The separable transformer requires no_shear_2d constraints')
 
         with self._enter_variable_scope():
             self._warper = snt.AffineGridWarper(img_size, crop_size, constraints)
@@ -105,9 +181,46 @@ class SpatialTransformer(snt.AbstractModule):
         if len(img.get_shape()) == 3:
             img = img[..., tf.newaxis]
 
+        if self._separable:
+            return self._separable_resample(img, transform_params)
+
         grid_coords = self._warper(transform_params)
         return snt.resampler(img, grid_coords)
 
+    def _separable_resample(self, img, transform_params):
+        """Same as the grid warper followed by the resampler for transforms (sx, tx, sy, ty) without shear"""
+        sx, tx, sy, ty = (transform_params[:, i:i + 1] for i in xrange(4))
+        in_height, in_width = self._input_size
+        out_height, out_width = self._output_size
+        grid_y = tf.linspace(-1., 1., out_height)[tf.newaxis]
+        grid_x = tf.linspace(-1., 1., out_width)[tf.newaxis]
+
+        if self._inverse:
+            ys = ((grid_y - ty) / sy + 1.) * (in_height - 1) / 2
+            xs = ((grid_x - tx) / sx + 1.) * (in_width - 1) / 2
+        else:
+            ys = (sy * grid_y + ty + 1.) * (in_height - 1) / 2
+            xs = (sx * grid_x + tx + 1.) * (in_width - 1) / 2
+
+        ry = interpolation_matrix(ys, in_height)
+        rx = interpolation_matrix(xs, in_width)
+
+        # channels are moved to the batch dimension, since tf.matmul does not broadcast
+        n_channels = int(img.get_shape()[-1])
+        if n_channels > 1:
+            img = tf.reshape(tf.transpose(img, (0, 3, 1, 2)), (-1, in_height, in_width))
+            ry = tf.reshape(tf.tile(ry[:, tf.newaxis], (1, n_channels, 1, 1)), (-1, out_height, in_height))
+            rx = tf.reshape(tf.tile(rx[:, tf.newaxis], (1, n_channels, 1, 1)), (-1, out_width, in_width))
+        else:
+            img = img[..., 0]
+
+        output = tf.matmul(tf.matmul(ry, img), rx, transpose_b=True)
+        if n_channels > 1:
+            output = tf.transpose(tf.reshape(output, (-1, n_channels, out_height, out_width)), (0, 2, 3, 1))
+        else:
+            output = output[..., tf.newaxis]
+        return output
+
 
 class StepsPredictor(snt.AbstractModule):
 
@@ -0,0 +1,168 @@
+"""Nearest-neighbour search over appearance codes of objects found by AIR.
+
+:class: IVFIndex is an inverted-file index: codes are partitioned by k-means and a query only scans the lists of
+the `n_probe` centroids closest to it, which makes search sub-linear in the number of codes. Every code is stored
+with the image and the step (slot) of the object it describes.
+
+Codes usually come from :func: object_codes applied to latents exported with :class: latents.LatentExporter.
+"""
+import numpy as np
+
+
+def object_codes(latents, key='what_loc', min_presence=.5):
+    """Selects codes of present objects from exported latents
+
+    :param latents: dict of arrays of shape [n_images, max_steps, ...], see :func: latents.load_latents; it needs
+        `key` and `presence`
+    :param key: string, output used as the code
+    :param min_presence: float, objects with smaller presence are skipped
+    :return: codes of shape [n_objects, n_code], image ids and slots of shape [n_objects]
+    """
+    image_ids, slots = np.nonzero(np.asarray(latents['presence']) > min_presence)
+    codes = np.asarray(latents[key][image_ids, slots], dtype=np.float32)
+    return codes, image_ids, slots
+
+
+def squared_distances(x, y):
+    """Pairwise squared euclidean distances between the rows of `x` and `y`"""
+    d = (x ** 2).sum(1)[:, np.newaxis] - 2. * np.dot(x, y.T) + (y ** 2).sum(1)[np.newaxis]
+    return np.maximum(d, 0.)
+
+
+def kmeans(x, n_clusters, n_iter=20, rng=None):
+    """Lloyd's algorithm initialised with random points; empty clusters are moved to the worst-fit points
+
+    :return: centroids of shape [n_clusters, n_features]
+    """
+    rng = rng or np.random.RandomState(0)
+    x = np.asarray(x, dtype=np.float32)
+    centroids = x[rng.choice(len(x), n_clusters, replace=False)].copy()
+
+    for _ in xrange(n_iter):
+        distances = squared_distances(x, centroids)
+        assignment = distances.argmin(1)
+        counts = np.bincount(assignment, minlength=n_clusters)
+
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, x)
+        nonempty = counts > 0
+        centroids[nonempty] = sums[nonempty] / counts[nonempty, np.newaxis]
+
+        empty = np.nonzero(~nonempty)[0]
+        if len(empty) > 0:
+            worst = distances[np.arange(len(x)), assignment].argsort()[::-1][:len(empty)]
+            centroids[empty] = x[worst]
+
+    return centroids
+
+
+class IVFIndex(object):
+    """Inverted-file index with k-means partitions, batched queries and incremental additions"""
+
+    def __init__(self, n_lists=256, n_probe=8):
+        """
+        :param n_lists: int, number of k-means partitions; around the square root of the number of codes works well
+        :param n_probe: int, number of partitions scanned by a query; more is slower and more accurate
+        """
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.centroids = None
+        self._lists = [[] for _ in xrange(n_lists)]
+        self._compacted = [None] * n_lists
+
+    def __len__(self):
+        return sum(len(self._list(i)[0]) for i in xrange(self.n_lists))
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def train(self, codes, n_iter=20, max_samples=100000, rng=None):
+        """Fits the partitions to a sample of `codes`; codes are not added to the index"""
+        rng = rng or np.random.RandomState(0)
+        if len(codes) < self.n_lists:
+            raise ValueError('Training needs at least n_lists = {} codes, but got {}'.format(self.n_lists, len(codes)))
+
+        if len(codes) > max_samples:
+            codes = codes[np.sort(rng.choice(len(codes), max_samples, replace=False))]
+        self.centroids = kmeans(codes, self.n_lists, n_iter, rng)
+
+    def add(self, codes, image_ids, slots):
+        """Adds codes with the images and slots they come from; can be called many times"""
+        if not self.is_trained:
+            raise ValueError('The index has to be trained before adding codes')
+
+        codes = np.asarray(codes, dtype=np.float32)
+        image_ids = np.asarray(image_ids, dtype=np.int64)
+        slots = np.asarray(slots, dtype=np.int16)
+
+        assignment = squared_distances(codes, self.centroids).argmin(1)
+        for i in np.unique(assignment):
+            mask = assignment == i
+            self._lists[i].append((codes[mask], image_ids[mask], slots[mask]))
+            self._compacted[i] = None
+
+    def _list(self, i):
+        if self._compacted[i] is None:
+            if self._lists[i]:
+                self._compacted[i] = tuple(np.concatenate(a) for a in zip(*self._lists[i]))
+            else:
+                n_code = self.centroids.shape[1]
+                self._compacted[i] = (np.zeros((0, n_code), np.float32), np.zeros(0, np.int64), np.zeros(0, np.int16))
+            self._lists[i] = [self._compacted[i]]
+        return self._compacted[i]
+
+    def search(self, queries, k=10, n_probe=None):
+        """Finds approximate nearest neighbours of a batch of queries
+
+        :param queries: np.array of shape [n_queries, n_code]
+        :param k: int, number of neighbours
+        :param n_probe: int or None, overrides the number of scanned partitions
+        :return: squared distances, image ids and slots of shape [n_queries, k], sorted by distance; missing
+            neighbours have infinite distance and ids of -1
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        n_queries = len(queries)
+
+        best = np.full((n_queries, k), np.inf, dtype=np.float32)
+        best_ids = np.full((n_queries, k), -1, dtype=np.int64)
+        best_slots = np.full((n_queries, k), -1, dtype=np.int16)
+
+        probes = squared_distances(queries, self.centroids).argsort(1)[:, :n_probe]
+        for i in np.unique(probes):
+            codes, image_ids, slots = self._list(i)
+            if len(codes) == 0:
+                continue
+
+            q = np.nonzero((probes == i).any(1))[0]
+            distances = np.concatenate((best[q], squared_distances(queries[q], codes)), 1)
+            ids = np.concatenate((best_ids[q], np.tile(image_ids, (len(q), 1))), 1)
+            all_slots = np.concatenate((best_slots[q], np.tile(slots, (len(q), 1))), 1)
+
+            # candidates are the current best k and all codes in the list
+            top = np.argpartition(distances, k - 1, 1)[:, :k]
+            rows = np.arange(len(q))[:, np.newaxis]
+            best[q], best_ids[q], best_slots[q] = distances[rows, top], ids[rows, top], all_slots[rows, top]
+
+        order = best.argsort(1)
+        rows = np.arange(n_queries)[:, np.newaxis]
+        return best[rows, order], best_ids[rows, order], best_slots[rows, order]
+
+    def save(self, path):
+        """Writes the index to a `.npz` file"""
+        arrays = dict(centroids=self.centroids, n_probe=np.int32(self.n_probe))
+        for i in xrange(self.n_lists):
+            arrays['codes/{}'.format(i)], arrays['image_ids/{}'.format(i)], arrays['slots/{}'.format(i)] = \
+                self._list(i)
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            centroids = f['centroids']
+            index = cls(len(centroids), int(f['n_probe']))
+            index.centroids = centroids
+            for i in xrange(index.n_lists):
+                index._lists[i] = [tuple(f['{}/{}'.format(k, i)] for k in ('codes', 'image_ids', 'slots'))]
+        return index
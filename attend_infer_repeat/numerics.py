@@ -0,0 +1,119 @@
+"""Sampled monitoring of numerical health of tensors during training.
+
+Running a model with `debug=True` validates the arguments of every distribution, which adds assert ops to every step
+of the recurrence and makes training too slow to run at scale. :class: NumericsMonitor instead checks a random
+fraction of training steps: on a checked step it reduces every monitored tensor to its minimum, maximum and the
+numbers of NaNs and infs and accumulates them in a small variable. Unchecked steps cost a single random draw. The
+buffer is read from Python, e.g. whenever the training loop logs, and turned into alerts.
+"""
+import numpy as np
+import tensorflow as tf
+
+
+STATS = ('min', 'max', 'nan', 'inf')
+
+# valid ranges of outputs of :class: AIRModel
+DEFAULT_BOUNDS = dict(presence_prob=(0., 1.), where_scale=(0., np.inf), what_scale=(0., np.inf))
+
+
+def numerics_tensors(air):
+    """Tensors of a model worth monitoring: probabilities of presence, scales of posteriors and importance weights
+
+    :param air: AIRModel, with its train step built to include the importance weights of REINFORCE
+    :return: dict of {name: tf.Tensor}
+    """
+    names = ('presence_prob', 'where_scale', 'what_scale', 'importance_weight')
+    return {k: getattr(air, k) for k in names if getattr(air, k, None) is not None}
+
+
+def _empty_buffer(n):
+    return np.tile(np.asarray([[np.inf, -np.inf, 0., 0.]], dtype=np.float32), (n, 1))
+
+
+def _tensor_stats(x):
+    x = tf.to_float(x)
+    finite = tf.is_finite(x)
+    inf = tf.fill(tf.shape(x), np.inf)
+    return tf.stack([
+        tf.reduce_min(tf.where(finite, x, inf)),
+        tf.reduce_max(tf.where(finite, x, -inf)),
+        tf.reduce_sum(tf.to_float(tf.is_nan(x))),
+        tf.reduce_sum(tf.to_float(tf.is_inf(x))),
+    ])
+
+
+class NumericsMonitor(object):
+    """Records min, max and counts of NaNs and infs of tensors on a random fraction of steps"""
+
+    def __init__(self, tensors, check_fraction=.01, bounds=None, name='numerics_monitor'):
+        """
+        :param tensors: dict of {name: tf.Tensor}, e.g. from :func: numerics_tensors
+        :param check_fraction: float in [0, 1], probability that :attr: update checks the tensors
+        :param bounds: dict of {name: (min, max)} or None; finite values outside of these bounds raise alerts.
+            Defaults to :data: DEFAULT_BOUNDS
+        :param name: string, name of the variable scope
+        """
+        self.names = sorted(tensors)
+        self.check_fraction = check_fraction
+        self.bounds = DEFAULT_BOUNDS if bounds is None else bounds
+
+        with tf.variable_scope(name):
+            empty = _empty_buffer(len(self.names))
+            self.buffer = tf.Variable(empty, trainable=False, name='buffer')
+            self.n_checks = tf.Variable(0, trainable=False, name='n_checks')
+
+            def check():
+                # the reductions are built inside the branch, so that they only run on checked steps
+                stats = tf.stack([_tensor_stats(tensors[k]) for k in self.names])
+                new = tf.stack([
+                    tf.minimum(self.buffer[:, 0], stats[:, 0]),
+                    tf.maximum(self.buffer[:, 1], stats[:, 1]),
+                    self.buffer[:, 2] + stats[:, 2],
+                    self.buffer[:, 3] + stats[:, 3],
+                ], 1)
+                with tf.control_dependencies([self.buffer.assign(new), self.n_checks.assign_add(1)]):
+                    return tf.constant(True)
+
+            self.update = tf.cond(tf.random_uniform([]) < check_fraction, check, lambda: tf.constant(False))
+            self.reset = tf.group(self.buffer.assign(empty), self.n_checks.assign(0))
+
+    def read(self, sess):
+        """Returns the number of checks and a dict of {name: {stat: value}} accumulated since the last reset"""
+        buffer, n_checks = sess.run([self.buffer, self.n_checks])
+        stats = {k: dict(zip(STATS, map(float, v))) for k, v in zip(self.names, buffer)}
+        return int(n_checks), stats
+
+    def alerts(self, stats):
+        """Lists problems found in stats returned by :meth: read"""
+        alerts = []
+        for k in self.names:
+            s = stats[k]
+            if s['nan'] > 0:
+                alerts.append('{}: {:d} NaNs'.format(k, int(s['nan'])))
+            if s['inf'] > 0:
+                alerts.append('{}: {:d} infs'.format(k, int(s['inf'])))
+
+            lower, upper = self.bounds.get(k, (-np.inf, np.inf))
+            if s['min'] < lower:
+                alerts.append('{}: min = {} is below {}'.format(k, s['min'], lower))
+            if s['max'] > upper:
+                alerts.append('{}: max = {} is above {}'.format(k, s['max'], upper))
+        return alerts
+
+    def check(self, sess, reset=True, raise_on_alert=False):
+        """Reads the buffer, prints alerts and optionally resets the buffer
+
+        :param raise_on_alert: boolean, raises FloatingPointError if there are any alerts
+        :return: number of checks, dict of stats as in :meth: read and a list of alerts
+        """
+        n_checks, stats = self.read(sess)
+        alerts = self.alerts(stats)
+        if reset:
+            sess.run(self.reset)
+
+        for alert in alerts:
+            print 'Numerics alert in {} checked steps: {}'.format(n_checks, alert)
+
+        if alerts and raise_on_alert:
+            raise FloatingPointError('; '.join(alerts))
+        return n_checks, stats, alerts
@@ -0,0 +1,413 @@
+"""Inference with trained AIR models in pure NumPy.
+
+:func: export_weights dumps weights of an :class: AIRCell to a single `.npz` file and :class: NumpyAIR runs the
+forward pass of the cell without TensorFlow and Sonnet, which makes it cheap to start for command-line tools and
+batch jobs. Inference is deterministic: latent variables are set to the means of their posteriors and a step is
+taken if the probability of presence is bigger than .5 and all previous steps were taken.
+
+Only models with MLP encoders and an LSTM transition are supported.
+
+Weight matrices can be quantized to int8 with a scale per layer or stored as float16, see :func: quantize_weights;
+:class: NumpyAIR dequantizes them when it loads the weights and :func: compare_outputs measures how much quantization
+changes the results.
+"""
+import time
+
+import numpy as np
+
+from boxes import box_iou, where_to_boxes
+
+
+_MLPS = 'input_encoder glimpse_encoder glimpse_decoder transform_estimator steps_predictor'.split()
+
+# shapes of outputs of a single step without the batch dimension, used for padding
+_OUTPUT_SHAPES = dict(
+    canvas=lambda air: (int(np.prod(air.img_size)),),
+    glimpse=lambda air: air.glimpse_size,
+    decoded=lambda air: air.glimpse_size,
+    what=lambda air: (air.n_appearance,),
+    where=lambda air: (4,),
+    presence_prob=lambda air: (1,),
+    presence=lambda air: (1,),
+)
+
+
+def _layers(module):
+    """Returns (w, b) pairs of linear layers of a module in the order of creation"""
+    variables = {v.op.name: v for v in module.get_variables()}
+    layers = []
+    for v in module.get_variables():
+        name = v.op.name
+        if name.endswith('/w'):
+            layers.append((v, variables[name[:-1] + 'b']))
+    return layers
+
+
+def _value(sess, x):
+    if hasattr(x, 'graph'):
+        x = sess.run(x)
+    return np.asarray(x, dtype=np.float32)
+
+
+def export_weights(air, sess, path, quantize=None):
+    """Writes weights and the configuration of an AIR model to a `.npz` file
+
+    :param air: AIRModel
+    :param sess: tf.Session with initialised or restored variables
+    :param path: string, path of the `.npz` file
+    :param quantize: None, 'int8' or 'float16', see :func: quantize_weights
+    """
+    cell = air.cell
+    modules = dict(
+        input_encoder=cell._input_encoder,
+        glimpse_encoder=cell._glimpse_encoder,
+        glimpse_decoder=cell._glimpse_decoder,
+        transform_estimator=cell._transform_estimator,
+        steps_predictor=cell._steps_predictor,
+        what_distrib=cell._what_distrib
+    )
+
+    tensors = {}
+    for name, module in modules.iteritems():
+        if name == 'input_encoder' or name == 'glimpse_encoder':
+            if module.__class__.__name__ != 'Encoder':
+                raise ValueError('Only MLP encoders are supported, but {} is {}'.format(name, module))
+
+        for i, (w, b) in enumerate(_layers(module)):
+            tensors['{}/{}/w'.format(name, i)] = w
+            tensors['{}/{}/b'.format(name, i)] = b
+
+    transition = cell._transition
+    for v in transition.get_variables():
+        for name in ('w_gates', 'b_gates'):
+            if v.op.name.endswith('/' + name):
+                tensors['transition/' + name] = v
+
+    if 'transition/w_gates' not in tensors:
+        raise ValueError('Only LSTM transitions are supported, but got {}'.format(transition))
+
+    hidden, cell_state = air.initial_state[4]
+    tensors['transition/init_hidden'] = hidden[0]
+    tensors['transition/init_cell'] = cell_state[0]
+
+    arrays = {k: v.astype(np.float32) for k, v in sess.run(tensors).iteritems()}
+
+    explore_eps = air.explore_eps if air.explore_eps is not None else 0.
+    arrays.update({
+        'config/img_size': np.asarray(air.img_size, dtype=np.int32),
+        'config/glimpse_size': np.asarray(air.glimpse_size, dtype=np.int32),
+        'config/max_steps': np.int32(air.max_steps),
+        'config/n_appearance': np.int32(air.n_appearance),
+        'config/output_multiplier': _value(sess, air.output_multiplier),
+        'config/explore_eps': _value(sess, explore_eps),
+        'config/steps_bias': _value(sess, cell._steps_predictor._steps_bias),
+        'config/max_crop_size': _value(sess, cell._transform_estimator._max_crop_size),
+        'config/forget_bias': _value(sess, transition._forget_bias),
+    })
+
+    if quantize is not None:
+        arrays = quantize_weights(arrays, quantize)
+    np.savez(path, **arrays)
+
+
+QUANTIZATIONS = ('int8', 'float16')
+
+
+def _is_matrix(name):
+    return name.endswith('/w') or name == 'transition/w_gates'
+
+
+def quantize_weights(weights, dtype):
+    """Quantizes weight matrices of MLPs and of the LSTM; biases, initial states and the configuration are unchanged
+
+    With 'int8', every matrix is stored with a symmetric scale of its own, `w ~= scale * q`, with `q` in [-127, 127]
+    and `scale` under the name of the matrix followed by `_scale`.
+
+    :param weights: dict of np.arrays as written by :func: export_weights
+    :param dtype: 'int8' or 'float16'
+    :return: dict of np.arrays
+    """
+    if dtype not in QUANTIZATIONS:
+        raise ValueError('Unknown quantization: {}; expected one of {}'.format(dtype, QUANTIZATIONS))
+
+    quantized = {}
+    for k, v in weights.iteritems():
+        if not _is_matrix(k):
+            quantized[k] = v
+        elif dtype == 'float16':
+            quantized[k] = v.astype(np.float16)
+        else:
+            scale = max(np.abs(v).max() / 127., 1e-12)
+            quantized[k] = np.clip(np.round(v / scale), -127, 127).astype(np.int8)
+            quantized[k + '_scale'] = np.float32(scale)
+
+    quantized['config/quantization'] = np.asarray(dtype)
+    return quantized
+
+
+def dequantize_weights(weights):
+    """Inverse of :func: quantize_weights; float32 weights are returned unchanged"""
+    if 'config/quantization' not in weights:
+        return weights
+
+    dequantized = {}
+    for k, v in weights.iteritems():
+        if k.endswith('_scale') or k == 'config/quantization':
+            continue
+        if _is_matrix(k):
+            v = v.astype(np.float32)
+            if k + '_scale' in weights:
+                v *= weights[k + '_scale']
+        dequantized[k] = v
+    return dequantized
+
+
+def _elu(x):
+    return np.where(x > 0., x, np.expm1(np.minimum(x, 0.)))
+
+
+def _sigmoid(x):
+    return .5 * (1. + np.tanh(.5 * x))
+
+
+def lstm(inpt, hidden, cell, w_gates, b_gates, forget_bias=1.):
+    """A step of :class: snt.LSTM without peepholes
+
+    :return: the next hidden state, which is also the output, and the next cell state
+    """
+    gates = np.dot(np.concatenate((inpt, hidden), -1), w_gates) + b_gates
+    i, j, f, o = np.split(gates, 4, -1)
+    cell = _sigmoid(f + forget_bias) * cell + _sigmoid(i) * np.tanh(j)
+    hidden = np.tanh(cell) * _sigmoid(o)
+    return hidden, cell
+
+
+def interpolation_matrix(coords, size):
+    """Builds matrices of bilinear interpolation weights along one axis.
+
+    Pixels outside of the image are treated as zeros, as in :func: snt.resampler.
+
+    :param coords: np.array of shape [batch_size, n] with coordinates in pixels
+    :param size: int, size of the sampled axis
+    :return: np.array of shape [batch_size, n, size]
+    """
+    batch_size, n = coords.shape
+    lower = np.floor(coords)
+    frac = (coords - lower).astype(np.float32)
+    lower = lower.astype(np.int64)
+
+    matrix = np.zeros((batch_size, n, size), dtype=np.float32)
+    rows, cols = np.meshgrid(np.arange(batch_size), np.arange(n), indexing='ij')
+    for offset, weight in ((0, 1. - frac), (1, frac)):
+        idx = lower + offset
+        valid = (idx >= 0) & (idx < size)
+        matrix[rows[valid], cols[valid], idx[valid]] += weight[valid]
+    return matrix
+
+
+def _grid(size):
+    return np.linspace(-1, 1, size, dtype=np.float32)
+
+
+def crop(imgs, where, crop_size):
+    """Extracts glimpses with a no-shear affine transform, see :class: modules.SpatialTransformer
+
+    Without shear, bilinear sampling is separable and a glimpse is the product of interpolation matrices along the
+    y and x axes with the image.
+
+    :param imgs: np.array of shape [batch_size, height, width]
+    :param where: np.array of shape [batch_size, 4] with (sx, tx, sy, ty)
+    :param crop_size: (height, width) of glimpses
+    :return: np.array of shape [batch_size] + crop_size
+    """
+    height, width = imgs.shape[1:3]
+    sx, tx, sy, ty = (where[:, i:i + 1] for i in xrange(4))
+    ys = (sy * _grid(crop_size[0]) + ty + 1.) * (height - 1) / 2
+    xs = (sx * _grid(crop_size[1]) + tx + 1.) * (width - 1) / 2
+    return _resample(imgs, ys, xs)
+
+
+def paste(glimpses, where, img_size):
+    """Inverse of :func: crop; places glimpses in an image of size `img_size`"""
+    height, width = glimpses.shape[1:3]
+    sx, tx, sy, ty = (where[:, i:i + 1] for i in xrange(4))
+    ys = ((_grid(img_size[0]) - ty) / sy + 1.) * (height - 1) / 2
+    xs = ((_grid(img_size[1]) - tx) / sx + 1.) * (width - 1) / 2
+    return _resample(glimpses, ys, xs)
+
+
+def _resample(imgs, ys, xs):
+    ry = interpolation_matrix(ys, imgs.shape[1])
+    rx = interpolation_matrix(xs, imgs.shape[2])
+    return np.matmul(np.matmul(ry, imgs), rx.transpose(0, 2, 1))
+
+
+class NumpyAIR(object):
+    """Deterministic forward pass of AIR in NumPy, see :func: export_weights"""
+
+    def __init__(self, weights):
+        """
+        :param weights: dict of np.arrays or a path to a `.npz` file written by :func: export_weights
+        """
+        if not isinstance(weights, dict):
+            with np.load(weights) as f:
+                weights = {k: f[k] for k in f.files}
+
+        weights = dequantize_weights(weights)
+        self._weights = weights
+        self.img_size = tuple(weights['config/img_size'])
+        self.glimpse_size = tuple(weights['config/glimpse_size'])
+        self.max_steps = int(weights['config/max_steps'])
+        self.n_appearance = int(weights['config/n_appearance'])
+        self._output_multiplier = weights['config/output_multiplier']
+        self._explore_eps = weights['config/explore_eps']
+        self._steps_bias = weights['config/steps_bias']
+        self._max_crop_size = weights['config/max_crop_size']
+        self._forget_bias = weights['config/forget_bias']
+
+        self._mlps = {}
+        for name in _MLPS + ['what_distrib']:
+            layers, i = [], 0
+            while '{}/{}/w'.format(name, i) in weights:
+                layers.append((weights['{}/{}/w'.format(name, i)], weights['{}/{}/b'.format(name, i)]))
+                i += 1
+            self._mlps[name] = layers
+
+    def _mlp(self, name, inpt, activate_output=False):
+        layers = self._mlps[name]
+        for i, (w, b) in enumerate(layers):
+            inpt = np.dot(inpt, w) + b
+            if activate_output or i < len(layers) - 1:
+                inpt = _elu(inpt)
+        return inpt
+
+    def _where(self, hidden):
+        params = self._mlp('transform_estimator', hidden)
+        sx, tx, sy, ty = np.split(params[:, :4], 4, 1)
+        sx, sy = (self._max_crop_size * _sigmoid(s) for s in (sx, sy))
+        tx, ty = np.tanh(tx), np.tanh(ty)
+        return np.concatenate((sx, tx, sy, ty), -1)
+
+    def initial_state(self, batch_size):
+        """Learned initial (hidden, cell) state of the transition, tiled `batch_size` times"""
+        hidden = np.tile(self._weights['transition/init_hidden'], (batch_size, 1))
+        cell = np.tile(self._weights['transition/init_cell'], (batch_size, 1))
+        return hidden, cell
+
+    def __call__(self, imgs):
+        """Decomposes images into objects
+
+        :param imgs: np.array of shape [batch_size, height, width]
+        :return: dict of np.arrays of shape [max_steps, batch_size, ...], as the outputs of :class: AIRModel: `canvas`,
+            `glimpse`, `what`, `where`, `presence_prob` and `presence`
+        """
+        imgs = np.asarray(imgs, dtype=np.float32).reshape((-1,) + self.img_size)
+        outputs = self.run(imgs, self.initial_state(len(imgs)))[0]
+        return outputs
+
+    def run(self, imgs, state, step_limit=None, early_stop=False):
+        """Runs the recurrence from a given state
+
+        :param imgs: np.array of shape [batch_size, height, width]
+        :param state: tuple of (hidden, cell) states of the transition, see :meth: initial_state
+        :param step_limit: np.array of ints of shape [batch_size] or None; no objects are found in an image after
+            this many steps
+        :param early_stop: boolean, stops as soon as no image has an object left; steps that are not taken are
+            padded with the last canvas and zeros
+        :return: dict of outputs as in :meth: __call__, np.array of decoded glimpses of shape
+            [max_steps, batch_size, glimpse height, glimpse width] before the output multiplier, the final state and
+            the number of steps taken
+        """
+        batch_size = imgs.shape[0]
+        n_pix = np.prod(self.img_size)
+
+        hidden, cell = state
+        canvas = np.zeros((batch_size, n_pix), dtype=np.float32)
+        presence = np.ones((batch_size, 1), dtype=np.float32)
+        if step_limit is None:
+            step_limit = np.full(batch_size, self.max_steps)
+
+        # the input of the transition is the same at every step
+        inpt_encoding = self._mlp('input_encoder', imgs.reshape(batch_size, -1), activate_output=True)
+
+        outputs = {k: [] for k in 'canvas glimpse what where presence_prob presence decoded'.split()}
+        for t in xrange(self.max_steps):
+            presence = presence * (t < step_limit)[:, np.newaxis]
+            if early_stop and not presence.any():
+                break
+
+            hidden, cell = lstm(inpt_encoding, hidden, cell, self._weights['transition/w_gates'],
+                                self._weights['transition/b_gates'], self._forget_bias)
+            where = self._where(hidden)
+            cropped = crop(imgs, where, self.glimpse_size)
+
+            presence_prob = _sigmoid(self._mlp('steps_predictor', hidden) + self._steps_bias)
+            presence_prob = self._explore_eps / 2 + (1 - self._explore_eps) * presence_prob
+            presence = presence * (presence_prob > .5)
+
+            what_params = self._mlp('glimpse_encoder', cropped.reshape(batch_size, -1), activate_output=True)
+            what = self._mlp('what_distrib', what_params)[:, :self.n_appearance]
+
+            decoded = self._mlp('glimpse_decoder', what).reshape((batch_size,) + self.glimpse_size)
+            canvas = canvas + presence * paste(decoded, where, self.img_size).reshape(batch_size, n_pix)
+
+            glimpse = presence[..., np.newaxis] * _sigmoid(decoded)
+            step = dict(canvas=canvas, glimpse=glimpse, what=what, where=where, presence_prob=presence_prob,
+                        presence=presence, decoded=decoded)
+            for k, v in step.iteritems():
+                outputs[k].append(v)
+
+        n_steps = len(outputs['canvas'])
+        for k, v in outputs.iteritems():
+            shape = (batch_size,) + _OUTPUT_SHAPES[k](self)
+            padding = canvas if k == 'canvas' else np.zeros(shape, dtype=np.float32)
+            v.extend([padding] * (self.max_steps - n_steps))
+
+        outputs = {k: np.stack(v) for k, v in outputs.iteritems()}
+        outputs['canvas'] = self._output_multiplier * outputs['canvas'].reshape(
+            (self.max_steps, batch_size) + self.img_size)
+        decoded = outputs.pop('decoded')
+        return outputs, decoded, (hidden, cell), n_steps
+
+
+def _final_outputs(outputs):
+    presence = outputs['presence'][..., 0] > .5
+    return presence.sum(0), outputs['canvas'][-1], presence, outputs['where']
+
+
+def compare_outputs(reference, outputs, imgs):
+    """Compares outputs of a model, e.g. with quantized weights, to outputs of a reference model on the same images
+
+    :param reference: dict of outputs of :meth: NumpyAIR.__call__
+    :param outputs: dict of outputs of :meth: NumpyAIR.__call__
+    :param imgs: np.array of shape [batch_size, height, width], the images both models were applied to
+    :return: dict with `count_accuracy`, the fraction of images with the same number of objects, mean squared
+        reconstruction errors of both models, `canvas_error`, the mean squared difference of their reconstructions,
+        and `box_iou`, the mean IoU of boxes of objects present in the same steps in both outputs
+    """
+    ref_counts, ref_canvas, ref_presence, ref_where = _final_outputs(reference)
+    counts, canvas, presence, where = _final_outputs(outputs)
+    img_size = canvas.shape[1:]
+
+    both = ref_presence & presence
+    ious = box_iou(where_to_boxes(ref_where, img_size)[..., np.newaxis, :],
+                   where_to_boxes(where, img_size)[..., np.newaxis, :])[..., 0, 0]
+
+    return dict(
+        count_accuracy=float((ref_counts == counts).mean()),
+        reference_rec_error=float(((ref_canvas - imgs) ** 2).mean()),
+        rec_error=float(((canvas - imgs) ** 2).mean()),
+        canvas_error=float(((ref_canvas - canvas) ** 2).mean()),
+        box_iou=float(ious[both].mean()) if both.any() else float('nan'),
+    )
+
+
+def images_per_second(air, imgs, batch_size=256, n_repeats=3):
+    """Measures throughput of :class: NumpyAIR as the best of `n_repeats` passes over `imgs`"""
+    best = np.inf
+    for _ in xrange(n_repeats):
+        start = time.time()
+        for i in xrange(0, len(imgs), batch_size):
+            air(imgs[i:i + batch_size])
+        best = min(best, time.time() - start)
+    return len(imgs) / max(best, 1e-8)
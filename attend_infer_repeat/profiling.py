@@ -0,0 +1,207 @@
+import re
+from collections import OrderedDict, defaultdict
+
+import tensorflow as tf
+from tensorflow.core.framework import step_stats_pb2
+from tensorflow.python.client import timeline
+
+
+_OP_TYPE_RE = re.compile(r'= (\w+)\(')
+
+
+def module_segment(module):
+    """Returns the name segment that a Sonnet module contributes to names of its ops"""
+    name = getattr(module, 'module_name', None)
+    if name is None:
+        name = module.variable_scope.name
+    return name.split('/')[-1]
+
+
+def air_components(air):
+    """Lists components of an AIR model together with name segments of their ops.
+
+    Components are matched in the given order; an op belongs to the first component whose segment appears in its
+    name, so that e.g. ops of a Sonnet module nested in the AIRCell are not attributed to the cell itself.
+
+    :param air: AIRModel or graph_cache.ImportedAIR, which carries the components of the model it was exported from
+    :return: list of (component name, list of name segments)
+    """
+    if getattr(air, 'components', None) is not None:
+        return air.components
+
+    cell = air.cell
+    components = []
+    baseline = getattr(air, 'baseline_module', None)
+    if baseline is not None:
+        components.append(('baseline', [module_segment(baseline)]))
+
+    components += [
+        ('kl', ['KL_divergence']),
+        ('reinforce', ['reinforce']),
+        ('input_encoder', [module_segment(cell._input_encoder)]),
+        ('transition', [module_segment(cell._transition), 'rnn_inpt']),
+        ('transform_estimator', [module_segment(cell._transform_estimator)]),
+        ('spatial_transformer', [module_segment(cell._spatial_transformer)]),
+        ('inverse_transformer', [module_segment(cell._inverse_transformer)]),
+        ('glimpse_encoder', [module_segment(cell._glimpse_encoder)]),
+        ('what_distrib', [module_segment(cell._what_distrib)]),
+        ('glimpse_decoder', [module_segment(cell._glimpse_decoder)]),
+        ('steps_predictor', [module_segment(cell._steps_predictor), 'presence']),
+        ('cell_other', [module_segment(cell)]),
+        ('summaries', ['grad_summary']),
+        ('loss_other', ['loss']),
+        ('model_other', [air.__class__.__name__]),
+    ]
+    return components
+
+
+def op_component(node_name, components):
+    """Returns the name of the first component with a name segment in `node_name` or 'other'"""
+    segments = set(node_name.split('/'))
+    for component, component_segments in components:
+        if any(s in segments for s in component_segments):
+            return component
+    return 'other'
+
+
+def _op_type(node_stats):
+    match = _OP_TYPE_RE.search(node_stats.timeline_label)
+    if match is not None:
+        return match.group(1)
+    return ''
+
+
+def _allocated_bytes(node_stats):
+    return sum(o.tensor_description.allocation_description.allocated_bytes for o in node_stats.output)
+
+
+def _profiled_devices(step_stats):
+    """Skips per-stream GPU stats and, if kernel times are available, the GPU devices that only record launches"""
+    devices = [d.device for d in step_stats.dev_stats]
+    has_streams = any(d.endswith('stream:all') for d in devices)
+
+    for dev_stats in step_stats.dev_stats:
+        device = dev_stats.device
+        if 'stream:' in device and not device.endswith('stream:all'):
+            continue
+        if has_streams and 'gpu' in device.lower() and 'stream:' not in device:
+            continue
+        yield dev_stats
+
+
+def peak_memory(step_stats):
+    """Estimates peak memory of a traced step for every allocator from lifetimes of tensors.
+
+    Allocation and deallocation records of all ops are replayed in the order of their timestamps; allocations at
+    the same time as deallocations are counted first.
+
+    :return: dict of {allocator name: peak MB}
+    """
+    records = defaultdict(list)
+    for dev_stats in step_stats.dev_stats:
+        for node_stats in dev_stats.node_stats:
+            for memory in node_stats.memory:
+                records[str(memory.allocator_name)].extend((r.alloc_micros, -r.alloc_bytes)
+                                                           for r in memory.allocation_records)
+
+    peaks = {}
+    for allocator, allocator_records in records.iteritems():
+        current = peak = 0
+        for _, negative_bytes in sorted(allocator_records):
+            current -= negative_bytes
+            peak = max(peak, current)
+        peaks[allocator] = peak / 2. ** 20
+    return peaks
+
+
+class StepProfiler(object):
+    """Opt-in profiler that traces session runs and aggregates op time and memory by model components.
+
+    Every call to `run` executes `sess.run` with full tracing and keeps the resulting step stats. Ops are assigned
+    to components by name segments (see :func: air_components); ops whose names contain `gradients` are accounted
+    as the backward pass of the component of the corresponding forward op.
+    """
+
+    def __init__(self, components):
+        """
+        :param components: list of (component name, list of op name segments)
+        """
+        self._components = components
+        self._step_stats = []
+        self._cache = {}
+
+    @property
+    def n_steps(self):
+        return len(self._step_stats)
+
+    def run(self, sess, fetches, feed_dict=None):
+        run_options = tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE)
+        run_metadata = tf.RunMetadata()
+        result = sess.run(fetches, feed_dict, options=run_options, run_metadata=run_metadata)
+        self._step_stats.append(run_metadata.step_stats)
+        return result
+
+    def component(self, node_name):
+        if node_name not in self._cache:
+            self._cache[node_name] = op_component(node_name, self._components)
+        return self._cache[node_name]
+
+    def aggregate(self):
+        """Aggregates op time and allocated memory per component, averaged over profiled steps.
+
+        :return: list of dicts ranked by total time
+        """
+        stats = defaultdict(lambda: dict(forward_ms=0., backward_ms=0., bytes=0, n_ops=0))
+        for step_stats in self._step_stats:
+            for dev_stats in _profiled_devices(step_stats):
+                for node_stats in dev_stats.node_stats:
+                    name = node_stats.node_name.split(':')[0]
+                    if name.startswith('_'):
+                        component = 'runtime'
+                    elif _op_type(node_stats).startswith(('Apply', 'ResourceApply')):
+                        component = 'optimizer'
+                    else:
+                        component = self.component(name)
+
+                    direction = 'backward_ms' if 'gradients' in name.split('/') else 'forward_ms'
+                    s = stats[component]
+                    s[direction] += node_stats.all_end_rel_micros / 1e3
+                    s['bytes'] += _allocated_bytes(node_stats)
+                    s['n_ops'] += 1
+
+        n_steps = max(self.n_steps, 1)
+        total_ms = sum(s['forward_ms'] + s['backward_ms'] for s in stats.itervalues())
+        rows = []
+        for component, s in stats.iteritems():
+            row = OrderedDict(component=component)
+            row['total_ms'] = (s['forward_ms'] + s['backward_ms']) / n_steps
+            row['forward_ms'] = s['forward_ms'] / n_steps
+            row['backward_ms'] = s['backward_ms'] / n_steps
+            row['share'] = (s['forward_ms'] + s['backward_ms']) / max(total_ms, 1e-8)
+            row['mbytes'] = s['bytes'] / n_steps / 2. ** 20
+            row['n_ops'] = s['n_ops'] // n_steps
+            rows.append(row)
+
+        rows.sort(key=lambda r: -r['total_ms'])
+        return rows
+
+    def table(self):
+        rows = self.aggregate()
+        header = '{:<22} {:>10} {:>10} {:>10} {:>7} {:>10} {:>7}'.format(
+            'component', 'total ms', 'fwd ms', 'bwd ms', 'share', 'alloc MB', 'ops')
+        lines = ['Profiled {} steps'.format(self.n_steps), header, '-' * len(header)]
+        for r in rows:
+            lines.append('{:<22} {:>10.2f} {:>10.2f} {:>10.2f} {:>6.1f}% {:>10.2f} {:>7d}'.format(
+                r['component'], r['total_ms'], r['forward_ms'], r['backward_ms'], 100 * r['share'],
+                r['mbytes'], r['n_ops']))
+        return '\n'.join(lines)
+
+    def write_trace(self, path):
+        """Writes all profiled steps into a single trace file in the Chrome trace format (chrome://tracing)"""
+        merged = step_stats_pb2.StepStats()
+        for step_stats in self._step_stats:
+            merged.dev_stats.extend(step_stats.dev_stats)
+
+        trace = timeline.Timeline(merged).generate_chrome_trace_format(show_memory=True)
+        with open(path, 'w') as f:
+            f.write(trace)
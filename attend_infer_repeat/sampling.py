@@ -0,0 +1,121 @@
+"""Generates scenes from the prior of a trained AIR model.
+
+:class: PriorSampler draws the number of objects from the geometric prior over steps and appearance and
+transformation codes from their Normal priors, then decodes and pastes the glimpses of all slots of a batch in one
+pass through the model's `glimpse_decoder` and inverse spatial transformer. :func: sample_to_disk streams batches
+of samples to memory-mapped `.npy` files.
+"""
+import json
+import os
+import time
+from os import path as osp
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.contrib.distributions import Categorical, Normal
+
+from prior import geometric_prior
+
+
+class PriorSampler(object):
+    """Samples scenes from the prior of an :class: AIRModel, reusing its decoder"""
+
+    def __init__(self, air, batch_size, success_prob, what_prior, where_scale_prior, where_shift_prior):
+        """
+        :param air: AIRModel
+        :param batch_size: int, number of scenes sampled by a single run
+        :param success_prob: float, parameter of the geometric prior over the number of objects, as the final value of
+            `num_steps_prior` in :meth: AIRModel.train_step
+        :param what_prior: AttrDict with `loc` and `scale` of the prior over appearance codes
+        :param where_scale_prior: AttrDict with `loc` and `scale` of the prior over scales of the transformation
+        :param where_shift_prior: AttrDict with `loc` and `scale` of the prior over shifts of the transformation
+        """
+        self.batch_size = batch_size
+        self.max_steps = air.max_steps
+        self.img_size = tuple(air.img_size)
+        cell = air.cell
+
+        with tf.variable_scope('prior_sampler'):
+            num_steps_probs = geometric_prior(success_prob, self.max_steps)
+            # the prior is truncated at `max_steps`, so it is normalised through logits
+            self.num_steps = Categorical(logits=tf.log(num_steps_probs)).sample(batch_size)
+
+            # [max_steps, batch_size]; presence is one for the first `num_steps` slots
+            steps = tf.range(self.max_steps)[:, tf.newaxis]
+            self.presence = tf.to_float(steps < self.num_steps[tf.newaxis])
+
+            n_slots = self.max_steps * batch_size
+            self.what = Normal(what_prior.loc, what_prior.scale).sample((n_slots, air.n_appearance))
+
+            scale = Normal(where_scale_prior.loc, where_scale_prior.scale).sample((n_slots, 2))
+            shift = Normal(where_shift_prior.loc, where_shift_prior.scale).sample((n_slots, 2))
+            self.where = tf.stack((scale[:, 0], shift[:, 0], scale[:, 1], shift[:, 1]), -1)
+
+            # all slots of all scenes are decoded and pasted at once
+            decoded = cell._glimpse_decoder(self.what)
+            pasted = cell._inverse_transformer(decoded, self.where)
+            pasted = tf.reshape(pasted, (self.max_steps, batch_size) + self.img_size)
+
+            presence = self.presence[..., tf.newaxis, tf.newaxis]
+            canvas = cell._canvas[tf.newaxis] + tf.reduce_sum(presence * pasted, 0)
+            self.canvas = air.output_multiplier * canvas
+
+        self.outputs = dict(
+            imgs=self.canvas,
+            num_steps=self.num_steps,
+            presence=tf.transpose(self.presence),
+            what=tf.transpose(tf.reshape(self.what, (self.max_steps, batch_size, -1)), (1, 0, 2)),
+            where=tf.transpose(tf.reshape(self.where, (self.max_steps, batch_size, 4)), (1, 0, 2)),
+        )
+
+    def sample(self, sess):
+        """Returns a dict of np.arrays with `batch_size` scenes; all arrays are image-major"""
+        return sess.run(self.outputs)
+
+
+def _to_uint8(imgs):
+    return np.round(255. * np.clip(imgs, 0., 1.)).astype(np.uint8)
+
+
+def sample_to_disk(sess, sampler, directory, n_samples, dtype=np.float32, report_every=100, verbose=True):
+    """Samples scenes in batches and writes them to memory-mapped `.npy` files, one per output
+
+    Images are clipped to [0, 1] and stored as uint8; latent variables are stored with `dtype`.
+
+    :param sess: tf.Session with a restored model
+    :param sampler: PriorSampler
+    :param directory: string
+    :param n_samples: int, number of scenes
+    :param dtype: np.float32 or np.float16
+    :return: dict of memory-mapped arrays
+    """
+    if not osp.exists(directory):
+        os.makedirs(directory)
+
+    shapes = {k: tuple(v.get_shape().as_list()[1:]) for k, v in sampler.outputs.iteritems()}
+    dtypes = dict((k, np.dtype(dtype)) for k in shapes)
+    dtypes.update(imgs=np.dtype(np.uint8), num_steps=np.dtype(np.uint8))
+
+    arrays = {k: np.lib.format.open_memmap(osp.join(directory, k + '.npy'), 'w+', dtypes[k], (n_samples,) + shape)
+              for k, shape in shapes.iteritems()}
+
+    start, n_done, n_batches = time.time(), 0, 0
+    while n_done < n_samples:
+        n = min(sampler.batch_size, n_samples - n_done)
+        for k, v in sampler.sample(sess).iteritems():
+            if k == 'imgs':
+                v = _to_uint8(v)
+            arrays[k][n_done:n_done + n] = v[:n]
+
+        n_done += n
+        n_batches += 1
+        if verbose and (n_batches % report_every == 0 or n_done == n_samples):
+            print 'Sampled {} of {} scenes, {:.1f} img/s'.format(n_done, n_samples,
+                                                                n_done / max(time.time() - start, 1e-8))
+
+    for a in arrays.itervalues():
+        a.flush()
+
+    with open(osp.join(directory, 'samples.json'), 'w') as f:
+        json.dump(dict(n_samples=n_samples, dtypes={k: v.name for k, v in dtypes.iteritems()}), f)
+    return arrays
@@ -0,0 +1,94 @@
+import argparse
+import sys
+from os import path as osp
+
+sys.path.insert(0, osp.abspath(osp.join(osp.dirname(__file__), '..')))
+
+import tensorflow as tf
+
+import benchmark
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Microbenchmarks of the AIR compute kernels')
+    subparsers = parser.add_subparsers(dest='command')
+
+    run = subparsers.add_parser('run', help='runs benchmarks and stores the results as JSON')
+    run.add_argument('--out', required=True, help='path of the JSON file with results')
+    run.add_argument('--only', nargs='+', choices=benchmark.BENCHMARKS.keys(), help='benchmarks to run')
+    run.add_argument('--n_warmup', type=int, default=3)
+    run.add_argument('--n_iter', type=int, default=20)
+    run.add_argument('--intra_op_threads', type=int, default=0)
+    run.add_argument('--inter_op_threads', type=int, default=0)
+    run.add_argument('--memory', action='store_true', help='estimate peak memory of every case from a traced step')
+
+    sweep_params = set()
+    for _, sweep in benchmark.BENCHMARKS.itervalues():
+        sweep_params.update(sweep.keys())
+
+    for param in sorted(sweep_params):
+        run.add_argument('--' + param, nargs='+', type=_parse_value,
+                         help='values of `{}` to sweep over; overrides the defaults'.format(param))
+
+    compare = subparsers.add_parser('compare', help='compares results with a baseline and flags slowdowns')
+    compare.add_argument('baseline', help='JSON file with baseline results')
+    compare.add_argument('current', help='JSON file with current results')
+    compare.add_argument('--threshold', type=float, default=.1, help='relative slowdown that is flagged')
+    compare.add_argument('--stat', default='median_ms', choices=['median_ms', 'mean_ms', 'min_ms'])
+
+    return parser.parse_args(argv)
+
+
+def _parse_value(value):
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+
+    if value in ('True', 'False'):
+        return value == 'True'
+    return value
+
+
+def run(args):
+    overrides = {k: v for k, v in vars(args).iteritems() if v is not None}
+    config = tf.ConfigProto(intra_op_parallelism_threads=args.intra_op_threads,
+                            inter_op_parallelism_threads=args.inter_op_threads)
+
+    results = benchmark.run_sweep(args.only, overrides, args.n_warmup, args.n_iter, config, memory=args.memory)
+    benchmark.save_results(args.out, results)
+    print 'Saved {} results to "{}"'.format(len(results), args.out)
+    return 0
+
+
+def compare(args):
+    baseline = benchmark.load_results(args.baseline)
+    current = benchmark.load_results(args.current)
+    rows = benchmark.compare(baseline, current, args.threshold, args.stat)
+
+    n_slower, n_missing = 0, 0
+    for row in rows:
+        params = ', '.join('{}={}'.format(k, v) for k, v in sorted(row['params'].iteritems()))
+        if row['missing']:
+            print '{:<22} {:>10.3f}ms -> {:>12} {:>8} {:<7} ({})'.format(
+                row['name'], row['baseline'], 'missing', '', 'MISSING', params)
+            n_missing += 1
+            continue
+
+        flag = 'SLOWER' if row['slower'] else ''
+        print '{:<22} {:>10.3f}ms -> {:>10.3f}ms {:>7.2f}x {:<7} ({})'.format(
+            row['name'], row['baseline'], row['current'], row['ratio'], flag, params)
+        n_slower += row['slower']
+
+    n_compared = len(rows) - n_missing
+    print '{} of {} cases slower by more than {:.0f}%'.format(n_slower, n_compared, 100 * args.threshold)
+    if n_missing > 0:
+        print '{} cases of the baseline are missing in the current results'.format(n_missing)
+    return int(n_slower > 0 or n_missing > 0)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    commands = dict(run=run, compare=compare)
+    sys.exit(commands[args.command](args))
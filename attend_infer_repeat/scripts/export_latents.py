@@ -0,0 +1,61 @@
+"""Exports latent variables of a trained model for every image of a dataset to memory-mapped `.npy` files.
+
+Arguments not recognised here are passed to `multi_mnist.py` to configure the model, which has to match the one in
+the checkpoint, e.g.
+
+    python attend_infer_repeat/scripts/export_latents.py ../results/multi_mnist/model.ckpt-300000 latents \
+        --images mnist_train.pickle --float16 --n_steps 3
+
+Running the same command again after an interruption resumes the export.
+"""
+import argparse
+import sys
+from os import path as osp
+
+sys.path.insert(0, osp.abspath(osp.join(osp.dirname(__file__), '..')))
+
+import numpy as np
+import tensorflow as tf
+
+from data.data import load_images
+from latents import LATENTS, LatentExporter
+from multi_mnist import make_air, parse_args as parse_train_args
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Exports latent variables inferred by AIR')
+    parser.add_argument('checkpoint', help='model checkpoint')
+    parser.add_argument('out', help='directory for the arrays')
+    parser.add_argument('--images', default='mnist_train.pickle',
+                        help='`.npy` file, shared-memory directory or dataset, relative to the MNIST data directory')
+    parser.add_argument('--keys', nargs='+', default=list(LATENTS), help='outputs of the model to export')
+    parser.add_argument('--export_batch_size', type=int, default=1024)
+    parser.add_argument('--float16', action='store_true', help='store arrays as float16')
+    parser.add_argument('--progress_every', type=int, default=100, help='batches between recording progress')
+
+    args, train_argv = parser.parse_known_args(argv)
+    return args, parse_train_args(train_argv)
+
+
+def main(argv=None):
+    args, train_args = parse_args(argv)
+    # one posterior sample per image
+    train_args.n_samples = 1
+    images = load_images(args.images)
+    batch_size = args.export_batch_size
+
+    imgs = tf.placeholder(tf.float32, (batch_size,) + images.shape[1:], name='imgs')
+    nums = tf.zeros((train_args.n_steps + 1, batch_size, 1))
+    air = make_air(train_args, dict(imgs=imgs, nums=nums))
+
+    sess = tf.Session()
+    tf.train.Saver().restore(sess, args.checkpoint)
+
+    outputs = {k: getattr(air, k) for k in args.keys}
+    dtype = np.float16 if args.float16 else np.float32
+    exporter = LatentExporter(sess, imgs, outputs, args.out, dtype, args.progress_every)
+    exporter.export(images)
+
+
+if __name__ == '__main__':
+    main()
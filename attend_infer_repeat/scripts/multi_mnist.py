@@ -1,147 +1,342 @@
+import argparse
+import json
+import os
+import sys
+import time
+from functools import partial
+from os import path as osp
 
-# coding: utf-8
-
-# In[1]:
+sys.path.insert(0, osp.abspath(osp.join(osp.dirname(__file__), '..')))
 
-from os import path as osp
-import numpy as np
 import tensorflow as tf
-import sonnet as snt
 from attrdict import AttrDict
 
-from evaluation import make_fig, make_logger
-
-from data import load_data, tensors_from_data
+from detection import evaluate_detections
+from evaluation import log_values, make_fig, make_logger
+from graph_cache import export_graph, import_graph
+from checkpoint import AsyncCheckpointer
+from data.data import bucket_samples, bucketed_sampler, load_data, minibatch_sampler, object_counts, \
+    placeholders_from_data
 from mnist_model import AIRonMNIST
-
-import matplotlib.pyplot as plt
-import seaborn as sns
-import pandas as pd
-
-
-# In[2]:
-
-learning_rate = 1e-4
-n_steps = 3
-
-results_dir = '../results'
-run_name = 'multi_mnist'
-
-logdir = osp.join(results_dir, run_name)
-checkpoint_name = osp.join(logdir, 'model.ckpt')
-axes = {'imgs': 0, 'labels': 0, 'nums': 1}
-
-
-# In[3]:
-
-batch_size = 64
-use_prior = True
-
-num_steps_prior = AttrDict(
-    anneal='exp',
-    init=1. - 1e-15,
-    final=1e-7,
-    steps_div=1e4,
-    steps=1e5,
-    hold_init=1e3,
-)
-
-appearance_prior = AttrDict(loc=0., scale=1.)
-where_scale_prior = AttrDict(loc=0., scale=1.)
-where_shift_prior = AttrDict(loc=0., scale=1.)
-
-use_reinforce = True
-sample_presence = True
-step_bias = .75
-transform_var_bias = .5
-output_multiplier = .5
-
-init_explore_eps = 1e-3
-
-l2_weight = 0.
-
-
-# In[4]:
-
-valid_data = load_data('mnist_validation.pickle')
-train_data = load_data('mnist_train.pickle')
-
-
-# In[5]:
-
-tf.reset_default_graph()
-train_tensors = tensors_from_data(train_data, batch_size, axes, shuffle=True)
-valid_tensors = tensors_from_data(valid_data, batch_size, axes, shuffle=False)
-x, valid_x = train_tensors['imgs'], valid_tensors['imgs']
-y, test_y = train_tensors['nums'], valid_tensors['nums']
-    
-n_hidden = 32 * 8
-n_layers = 2
-n_hiddens = [n_hidden] * n_layers
-    
-air = AIRonMNIST(x, y,
-                max_steps=n_steps, 
-                explore_eps=init_explore_eps,
-                inpt_encoder_hidden=n_hiddens,
-                glimpse_encoder_hidden=n_hiddens,
-                glimpse_decoder_hidden=n_hiddens,
-                transform_estimator_hidden=n_hiddens,
-                steps_pred_hidden=[128, 64],
-                baseline_hidden=[256, 128],
-                transform_var_bias=transform_var_bias,
-                step_bias=step_bias,
-                output_multiplier=output_multiplier
-)
-
-
-# In[6]:
-
-train_step, global_step = air.train_step(learning_rate, l2_weight, appearance_prior, where_scale_prior,
-                            where_shift_prior, num_steps_prior)
-
-
-# In[7]:
-
-config = tf.ConfigProto()
-config.gpu_options.allow_growth = True
-    
-sess = tf.Session(config=config)
-sess.run(tf.global_variables_initializer())
-all_summaries = tf.summary.merge_all()
-
-
-# In[8]:
-
-summary_writer = tf.summary.FileWriter(logdir, sess.graph)
-saver = tf.train.Saver()
-
-
-# In[9]:
-
-train_batches = train_data['imgs'].shape[0] // batch_size
-valid_batches = valid_data['imgs'].shape[0] // batch_size
-log = make_logger(air, sess, summary_writer, train_tensors, train_batches, valid_tensors, valid_batches)
-
-
-# In[ ]:
-
-train_itr = sess.run(global_step)
-print 'Starting training at iter = {}'.format(train_itr)
-
-if train_itr == 0:
-    log(0)
-
-while train_itr < 3 * 1e5:
-        
-    train_itr, _ = sess.run([global_step, train_step])
-    
-    if train_itr % 1000 == 0:
-        summaries = sess.run(all_summaries)
-        summary_writer.add_summary(summaries, train_itr)
-        
-    if train_itr % 10000 == 0:
-        log(train_itr)
-        
-    if train_itr % 5000 == 0:
-        saver.save(sess, checkpoint_name, global_step=train_itr)
-        make_fig(air, sess, logdir, train_itr)    
+from numerics import NumericsMonitor, numerics_tensors
+from profiling import StepProfiler, air_components
+from training import Prefetcher, train
+from tuning import apply_tuning, load_tuning
+
+
+AXES = {'imgs': 0, 'labels': 0, 'nums': 1}
+
+# arguments that do not change the graph built by `make_air` and `make_train_step`
+_RUNTIME_ARGS = {'results_dir', 'run_name', 'train_data', 'valid_data', 'bucket_limits', 'max_iter', 'summary_every',
+                 'log_every', 'checkpoint_every', 'fig_every', 'report_every', 'eval_detection', 'n_workers',
+                 'prefetch', 'weights_only_checkpoint', 'keep_checkpoints', 'intra_op_threads',
+                 'inter_op_threads', 'tuning_config', 'graph_cache', 'profile_steps', 'profile_start',
+                 'numerics_fraction', 'halt_on_numerics_alert'}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Trains AIR on multi-digit MNIST')
+
+    parser.add_argument('--results_dir', default='../results')
+    parser.add_argument('--run_name', default='multi_mnist')
+    parser.add_argument('--train_data', default='mnist_train.pickle')
+    parser.add_argument('--valid_data', default='mnist_validation.pickle')
+
+    # model
+    parser.add_argument('--n_steps', type=int, default=3, help='maximum number of objects')
+    parser.add_argument('--batch_size', type=int, default=64)
+    parser.add_argument('--n_hidden', type=int, default=32 * 8)
+    parser.add_argument('--n_layers', type=int, default=2)
+    parser.add_argument('--step_bias', type=float, default=.75)
+    parser.add_argument('--transform_var_bias', type=float, default=.5)
+    parser.add_argument('--output_multiplier', type=float, default=.5)
+    parser.add_argument('--explore_eps', type=float, default=1e-3)
+    parser.add_argument('--presence', default='bernoulli', choices=['bernoulli', 'relaxed', 'straight_through'],
+                        help='relaxed presence is trained with pathwise gradients instead of REINFORCE')
+    parser.add_argument('--swap_memory', action='store_true',
+                        help='swap activations of the recurrence to host memory; lowers GPU memory at larger canvases')
+    parser.add_argument('--parallel_iterations', type=int, help='steps of the while loop that may run concurrently; does not lower memory')
+    parser.add_argument('--unroll', action='store_true',
+                        help='unroll the recurrence statically instead of using a while loop; faster for few steps')
+    parser.add_argument('--separable_crop', action='store_true',
+                        help='crops glimpses with interpolation matrices instead of the resampler')
+    parser.add_argument('--separable_paste', action='store_true',
+                        help='pastes glimpses with interpolation matrices instead of the resampler')
+    parser.add_argument('--temperature', type=float, default=1., help='initial temperature of relaxed presence')
+    parser.add_argument('--temperature_final', type=float, default=.1)
+    parser.add_argument('--temperature_steps', type=float, default=1e5)
+
+    # training
+    parser.add_argument('--learning_rate', type=float, default=1e-4)
+    parser.add_argument('--l2_weight', type=float, default=0.)
+    parser.add_argument('--estimator', default='reinforce', choices=['reinforce', 'vimco'],
+                        help='gradient estimator for the number of steps')
+    parser.add_argument('--n_samples', type=int, default=1,
+                        help='posterior samples per image; vimco requires at least 2')
+    parser.add_argument('--bucket', action='store_true',
+                        help='batch images with similar numbers of objects and limit the number of steps per batch')
+    parser.add_argument('--bucket_limits', type=int, nargs='+',
+                        help='maximum number of objects in every bucket; one bucket per number of objects by default')
+    parser.add_argument('--steps_prior_anneal', default='exp')
+    parser.add_argument('--steps_prior_init', type=float, default=1. - 1e-15)
+    parser.add_argument('--steps_prior_final', type=float, default=1e-7)
+    parser.add_argument('--steps_prior_steps_div', type=float, default=1e4)
+    parser.add_argument('--steps_prior_steps', type=float, default=1e5)
+    parser.add_argument('--steps_prior_hold_init', type=float, default=1e3)
+    parser.add_argument('--max_iter', type=int, default=int(3e5))
+
+    # cadences
+    parser.add_argument('--summary_every', type=int, default=1000)
+    parser.add_argument('--log_every', type=int, default=10000)
+    parser.add_argument('--checkpoint_every', type=int, default=5000)
+    parser.add_argument('--fig_every', type=int, default=5000)
+    parser.add_argument('--report_every', type=int, default=100)
+    parser.add_argument('--eval_detection', action='store_true',
+                        help='compute precision, recall and AP on the whole validation set when logging')
+
+    # runtime
+    parser.add_argument('--n_workers', type=int, default=2, help='threads for figures and checkpoints')
+    parser.add_argument('--prefetch', type=int, default=8, help='number of minibatches prefetched')
+    parser.add_argument('--weights_only_checkpoint', action='store_true',
+                        help='also write checkpoints without optimizer slots')
+    parser.add_argument('--keep_checkpoints', type=int, default=5)
+    parser.add_argument('--intra_op_threads', type=int, default=0)
+    parser.add_argument('--inter_op_threads', type=int, default=0)
+    parser.add_argument('--graph_cache', help='directory where the built graph is exported and, if it was built '
+                                              'with the same configuration, imported from on restarts')
+    parser.add_argument('--tuning_config', help='JSON file written by `scripts/tune.py`; its batch size and thread '
+                                                'counts replace the values given on the command line')
+
+    # profiling
+    parser.add_argument('--profile_steps', type=int, default=0, help='number of traced steps; 0 disables profiling')
+    parser.add_argument('--profile_start', type=int, default=100, help='iteration at which profiling starts')
+    parser.add_argument('--numerics_fraction', type=float, default=0.,
+                        help='fraction of training steps on which numerics of key tensors are checked; 0 disables it')
+    parser.add_argument('--halt_on_numerics_alert', action='store_true',
+                        help='stops training when a numerics check finds NaNs, infs or values out of range')
+
+    return parser.parse_args(argv)
+
+
+def make_air(args, inputs, step_limit=None):
+    """Builds the model configured by command-line arguments on top of `inputs`"""
+    n_hiddens = [args.n_hidden] * args.n_layers
+    return AIRonMNIST(inputs['imgs'], inputs['nums'],
+                      max_steps=args.n_steps,
+                      explore_eps=args.explore_eps,
+                      inpt_encoder_hidden=n_hiddens,
+                      glimpse_encoder_hidden=n_hiddens,
+                      glimpse_decoder_hidden=n_hiddens,
+                      transform_estimator_hidden=n_hiddens,
+                      steps_pred_hidden=[128, 64],
+                      baseline_hidden=[256, 128],
+                      transform_var_bias=args.transform_var_bias,
+                      step_bias=args.step_bias,
+                      output_multiplier=args.output_multiplier,
+                      n_samples=args.n_samples,
+                      step_limit=step_limit,
+                      relaxed_steps=args.presence != 'bernoulli',
+                      straight_through=args.presence == 'straight_through',
+                      temperature=args.temperature,
+                      swap_memory=args.swap_memory,
+                      parallel_iterations=args.parallel_iterations,
+                      unroll=args.unroll,
+                      separable_crop=args.separable_crop,
+                      separable_paste=args.separable_paste)
+
+
+def make_train_step(args, air):
+    """Creates the training op configured by command-line arguments
+
+    :return: train_step, global_step
+    """
+    num_steps_prior = AttrDict(
+        anneal=args.steps_prior_anneal,
+        init=args.steps_prior_init,
+        final=args.steps_prior_final,
+        steps_div=args.steps_prior_steps_div,
+        steps=args.steps_prior_steps,
+        hold_init=args.steps_prior_hold_init,
+    )
+
+    appearance_prior = AttrDict(loc=0., scale=1.)
+    where_scale_prior = AttrDict(loc=0., scale=1.)
+    where_shift_prior = AttrDict(loc=0., scale=1.)
+
+    temperature_anneal = AttrDict(anneal='exp', final=args.temperature_final, steps=args.temperature_steps,
+                                  steps_div=1e3)
+
+    return air.train_step(args.learning_rate, args.l2_weight, appearance_prior, where_scale_prior,
+                          where_shift_prior, num_steps_prior, estimator=args.estimator,
+                          temperature_anneal=temperature_anneal)
+
+
+def graph_config(args, data, axes):
+    """Returns the arguments and data shapes that determine the graph, see :func: graph_cache.export_graph"""
+    config = {k: v for k, v in vars(args).iteritems() if k not in _RUNTIME_ARGS}
+    config['data'] = {k: [str(v.dtype)] + [d for i, d in enumerate(v.shape) if i != axes[k]]
+                      for k, v in data.iteritems()}
+    return config
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.tuning_config is not None:
+        apply_tuning(args, load_tuning(args.tuning_config))
+
+    logdir = osp.join(args.results_dir, args.run_name)
+    if not osp.exists(logdir):
+        os.makedirs(logdir)
+    checkpoint_name = osp.join(logdir, 'model.ckpt')
+    axes = AXES
+
+    valid_data = load_data(args.valid_data)
+    train_data = load_data(args.train_data)
+
+    tf.reset_default_graph()
+    if args.bucket:
+        buckets, step_limits = bucket_samples(object_counts(train_data, axes), args.bucket_limits, args.n_steps)
+        mean_steps = sum(len(b) * l for b, l in zip(buckets, step_limits)) / float(sum(len(b) for b in buckets))
+        print 'Bucketing reduces the average number of steps per batch from {} to {:.2f}'.format(args.n_steps,
+                                                                                               mean_steps)
+
+    cached, graph_prefix = None, None
+    if args.graph_cache is not None:
+        graph_prefix = osp.join(args.graph_cache, 'graph')
+        cached = import_graph(graph_prefix, graph_config(args, train_data, axes))
+
+    if cached is not None:
+        print 'Imported the graph from "{}"'.format(args.graph_cache)
+        air, inputs, train_step, global_step = cached
+    else:
+        inputs = placeholders_from_data(train_data, args.batch_size, axes)
+        step_limit = None
+        if args.bucket:
+            step_limit = tf.placeholder_with_default(args.n_steps, [], name='step_limit')
+            inputs['step_limit'] = step_limit
+
+        air = make_air(args, inputs, step_limit)
+        train_step, global_step = make_train_step(args, air)
+        if graph_prefix is not None:
+            export_graph(graph_prefix, air, inputs, train_step, global_step, graph_config(args, train_data, axes))
+
+    monitor = None
+    if args.numerics_fraction > 0.:
+        monitor = NumericsMonitor(numerics_tensors(air), args.numerics_fraction)
+        train_step = tf.group(train_step, monitor.update)
+
+    config = tf.ConfigProto(intra_op_parallelism_threads=args.intra_op_threads,
+                            inter_op_parallelism_threads=args.inter_op_threads)
+    config.gpu_options.allow_growth = True
+
+    sess = tf.Session(config=config)
+    sess.run(tf.global_variables_initializer())
+    all_summaries = tf.summary.merge_all()
+
+    summary_writer = tf.summary.FileWriter(logdir, sess.graph)
+    weights_only_name = None
+    if args.weights_only_checkpoint:
+        weights_only_name = osp.join(logdir, 'weights.ckpt')
+    checkpointer = AsyncCheckpointer(checkpoint_name, max_to_keep=args.keep_checkpoints,
+                                     weights_only_name=weights_only_name, optimizers=air.optimizers)
+
+    def make_feed(sample):
+        def feed():
+            batch = sample()
+            return {inputs[k]: v for k, v in batch.iteritems()}
+        return feed
+
+    if args.bucket:
+        sampler = partial(bucketed_sampler, bucket_limits=args.bucket_limits, max_steps=args.n_steps)
+    else:
+        sampler = minibatch_sampler
+
+    train_feed = make_feed(sampler(train_data, args.batch_size, axes, shuffle=True))
+    # models are evaluated without buckets: a step limit computed from the true number of objects would not let the
+    # model find more objects than there are and inflate the count accuracy
+    train_log_feed = make_feed(minibatch_sampler(train_data, args.batch_size, axes, shuffle=True))
+    valid_feed = make_feed(minibatch_sampler(valid_data, args.batch_size, axes, shuffle=False))
+    fig_feed = make_feed(minibatch_sampler(valid_data, args.batch_size, axes, shuffle=True))
+
+    train_batches = train_data['imgs'].shape[0] // args.batch_size
+    valid_batches = valid_data['imgs'].shape[0] // args.batch_size
+    log = make_logger(air, sess, summary_writer, inputs, train_batches, inputs, valid_batches,
+                      train_feed=train_log_feed, test_feed=valid_feed)
+
+    if args.eval_detection and 'boxes' in valid_data:
+        loss_log = log
+
+        def log(itr):
+            logged = loss_log(itr)
+            valid_sample = minibatch_sampler(valid_data, args.batch_size, axes, shuffle=False)
+
+            def detection_feed():
+                batch = valid_sample()
+                return {inputs[k]: v for k, v in batch.iteritems()}, batch
+
+            metrics = evaluate_detections(air, sess, detection_feed, valid_batches)
+            metrics = {k: metrics[k] for k in ('precision', 'recall', 'ap', 'mean_iou')}
+            print 'Step {}, detection: {}'.format(itr, ', '.join('{} = {:.4f}'.format(k, v)
+                                                                  for k, v in sorted(metrics.iteritems())))
+            log_values(summary_writer, itr, dict={'detection/' + k: v for k, v in metrics.iteritems()})
+            logged['detection'] = metrics
+            return logged
+
+    check_numerics = None
+    if monitor is not None:
+        numerics_totals = dict(n_checks=0, n_alerts=0)
+
+        # runs on the cadence of throughput reports, since logging is too rare to catch a diverging run early
+        def check_numerics(itr):
+            n_checks, stats, alerts = monitor.check(sess, raise_on_alert=args.halt_on_numerics_alert)
+            if n_checks > 0:
+                values = {'numerics/{}_{}'.format(k, stat): v for k, tensor_stats in stats.iteritems()
+                          for stat, v in tensor_stats.iteritems()}
+                log_values(summary_writer, itr, dict=values)
+            numerics_totals['n_checks'] += n_checks
+            numerics_totals['n_alerts'] += len(alerts)
+
+        monitored_log = log
+
+        def log(itr):
+            logged = monitored_log(itr)
+            logged['numerics'] = dict(numerics_totals)
+            return logged
+
+    # only the snapshot is taken in the training loop, so that checkpoints hold variables of a single step; they are
+    # written in the background
+    def save(itr):
+        checkpointer.save(sess, itr)
+
+    def make_figure(itr):
+        make_fig(air, sess, logdir, itr, feed_dict=fig_feed())
+
+    profiler = None
+    if args.profile_steps > 0:
+        profiler = StepProfiler(air_components(air))
+
+    prefetcher = Prefetcher(train_feed, args.prefetch)
+    start = time.time()
+    try:
+        train(sess, train_step, global_step, prefetcher.get, args.batch_size, args.max_iter,
+              summary_writer, all_summaries, args.summary_every,
+              log, args.log_every,
+              save, args.checkpoint_every, False,
+              make_figure, args.fig_every,
+              args.report_every, check_numerics, args.n_workers,
+              profiler, args.profile_start, args.profile_steps, logdir)
+
+        train_time = time.time() - start
+        itr = sess.run(global_step)
+        metrics = log(itr)
+        metrics.update(iter=int(itr), train_time=train_time, imgs_per_sec=itr * args.batch_size / train_time)
+        with open(osp.join(logdir, 'final_metrics.json'), 'w') as f:
+            json.dump(metrics, f, indent=2, default=float)
+    finally:
+        prefetcher.close()
+        checkpointer.close()
+        summary_writer.close()
+
+
+if __name__ == '__main__':
+    main()
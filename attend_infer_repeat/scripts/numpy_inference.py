@@ -0,0 +1,128 @@
+"""Exports weights of a trained model and counts and localises objects with them in NumPy.
+
+    python attend_infer_repeat/scripts/numpy_inference.py export ../results/multi_mnist/model.ckpt-300000 air.npz
+    python attend_infer_repeat/scripts/numpy_inference.py run air.npz images.npy --out outputs.npz
+
+`export` restores a checkpoint with TensorFlow and writes its weights with :func: numpy_air.export_weights; arguments
+not recognised there are passed to `multi_mnist.py` to configure the model, which has to match the one in the
+checkpoint. `run` uses only NumPy, so that it starts quickly; images are read from a `.npy` file or from a dataset
+pickle written by :func: data.create_mnist. With `--sequence`, images are consecutive frames of a single stream and
+every frame starts from the objects found in the previous one, see :class: sequence.SequenceAIR.
+"""
+import argparse
+import cPickle as pickle
+import sys
+import time
+from os import path as osp
+
+sys.path.insert(0, osp.abspath(osp.join(osp.dirname(__file__), '..')))
+
+import numpy as np
+
+from numpy_air import QUANTIZATIONS, NumpyAIR, export_weights
+from sequence import SequenceAIR
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Runs AIR inference in NumPy')
+    subparsers = parser.add_subparsers(dest='command')
+
+    export = subparsers.add_parser('export', help='writes weights of a checkpoint for the NumPy inference engine')
+    export.add_argument('checkpoint', help='model checkpoint')
+    export.add_argument('weights', help='`.npz` file for the weights')
+    export.add_argument('--img_size', type=int, nargs=2, default=[50, 50])
+    export.add_argument('--quantize', choices=QUANTIZATIONS)
+
+    run = subparsers.add_parser('run', help='counts and localises objects in images')
+    run.add_argument('weights', help='`.npz` file written by numpy_air.export_weights')
+    run.add_argument('images', help='`.npy` file with images or a dataset pickle')
+    run.add_argument('--out', help='`.npz` file for the outputs')
+    run.add_argument('--batch_size', type=int, default=256)
+    run.add_argument('--sequence', action='store_true', help='treat images as consecutive frames of a stream')
+    run.add_argument('--confirm_threshold', type=float, default=.01,
+                     help='reconstruction error below which an object of the previous frame is kept')
+    run.add_argument('--carry_state', action='store_true',
+                     help='start the recurrence on a frame from its final state on the previous frame')
+
+    args, train_argv = parser.parse_known_args(argv)
+    if args.command == 'run' and train_argv:
+        parser.error('unrecognized arguments: {}'.format(' '.join(train_argv)))
+    return args, train_argv
+
+
+def load_images(path):
+    if path.endswith('.npy'):
+        imgs = np.load(path)
+    elif osp.exists(osp.splitext(path)[0] + '.imgs.npy'):
+        # data.save_data writes images of a dataset next to its pickle
+        imgs = np.load(osp.splitext(path)[0] + '.imgs.npy')
+    else:
+        with open(path) as f:
+            imgs = pickle.load(f)['imgs']
+
+    if imgs.dtype == np.uint8:
+        imgs = imgs.astype(np.float32) / 255.
+    return imgs
+
+
+def export(args, train_argv):
+    # TensorFlow is only needed to restore the checkpoint, so that `run` starts without it
+    import tensorflow as tf
+    from multi_mnist import make_air, parse_args as parse_train_args
+
+    train_args = parse_train_args(train_argv)
+    train_args.n_samples = 1
+
+    # the model is only built to create the variables restored from the checkpoint
+    imgs = tf.placeholder(tf.float32, [1] + args.img_size, name='imgs')
+    nums = tf.zeros((train_args.n_steps + 1, 1, 1))
+    air = make_air(train_args, dict(imgs=imgs, nums=nums))
+
+    sess = tf.Session()
+    tf.train.Saver().restore(sess, args.checkpoint)
+    export_weights(air, sess, args.weights, args.quantize)
+    print 'Wrote weights of "{}" to "{}"'.format(args.checkpoint, args.weights)
+
+
+def run(args):
+    start = time.time()
+    air = NumpyAIR(args.weights)
+    imgs = load_images(args.images)
+    print 'Loaded model and {} images in {:.3f}s'.format(len(imgs), time.time() - start)
+
+    start = time.time()
+    outputs = []
+    if args.sequence:
+        sequence = SequenceAIR(air, args.confirm_threshold, args.carry_state)
+        for frame in imgs:
+            outputs.append(sequence(frame[np.newaxis]))
+    else:
+        for i in xrange(0, len(imgs), args.batch_size):
+            outputs.append(air(imgs[i:i + args.batch_size]))
+
+    outputs = {k: np.concatenate([o[k] for o in outputs], 1) for k in outputs[0]}
+    duration = time.time() - start
+    print 'Processed {} images in {:.3f}s ({:.1f} img/s)'.format(len(imgs), duration, len(imgs) / duration)
+    if args.sequence:
+        print '{:.2f}ms and {:.2f} steps per frame, {} of {} objects confirmed from previous frames'.format(
+            1e3 * duration / len(imgs), sequence.average_steps(), sequence.stats['n_confirmed'],
+            sequence.stats['n_objects'])
+
+    counts = outputs['presence'][..., 0].sum(0).astype(np.int32)
+    for n, c in enumerate(np.bincount(counts, minlength=air.max_steps + 1)):
+        print '{} objects: {} images'.format(n, c)
+
+    if args.out is not None:
+        np.savez(args.out, counts=counts, **outputs)
+
+
+def main(argv=None):
+    args, train_argv = parse_args(argv)
+    if args.command == 'export':
+        export(args, train_argv)
+    else:
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Recommends the largest batch size for which training and inference fit a memory budget.
+
+Arguments not recognised here are passed to `multi_mnist.py` to configure the model, e.g.
+
+    python attend_infer_repeat/scripts/plan_memory.py --budget_mb 4000 --n_steps 3
+    python attend_infer_repeat/scripts/plan_memory.py --budget_mb 4000 --static_only --out plan.json
+
+Memory is measured with traced steps at a few small batch sizes (or only estimated from static shapes with
+`--static_only`) and extrapolated linearly in the batch size, see :mod: memory_planner.
+"""
+import argparse
+import sys
+from os import path as osp
+
+sys.path.insert(0, osp.abspath(osp.join(osp.dirname(__file__), '..')))
+
+from data.data import load_data, minibatch_sampler, placeholders_from_data
+from memory_planner import fit_memory, format_plan, plan, probe, save_plan
+from multi_mnist import AXES, make_air, make_train_step, parse_args as parse_train_args
+from profiling import air_components
+from tuning import session_config
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Plans the batch size that fits a memory budget')
+    parser.add_argument('--budget_mb', type=float, required=True, help='memory available to the process in MB')
+    parser.add_argument('--probe_batch_sizes', type=int, nargs='+', default=[8, 16, 32],
+                        help='small batch sizes at which memory is measured')
+    parser.add_argument('--margin', type=float, default=.1, help='fraction of the budget kept free')
+    parser.add_argument('--multiple', type=int, default=8, help='the batch size is rounded down to a multiple of it')
+    parser.add_argument('--static_only', action='store_true', help='estimates memory from the graph without running')
+    parser.add_argument('--out', help='JSON file with the plans and all measurements')
+
+    args, train_argv = parser.parse_known_args(argv)
+    return args, parse_train_args(train_argv)
+
+
+def main(argv=None):
+    args, train_args = parse_args(argv)
+    train_data = load_data(train_args.train_data)
+
+    def build(batch_size):
+        inputs = placeholders_from_data(train_data, batch_size, AXES)
+        air = make_air(train_args, inputs)
+        train_step, _ = make_train_step(train_args, air)
+        inference = [air.canvas, air.what, air.where, air.presence]
+
+        batch = minibatch_sampler(train_data, batch_size, AXES, shuffle=True)()
+        feed_dict = {inputs[k]: v for k, v in batch.iteritems()}
+        return dict(train=train_step, inference=inference), feed_dict, air_components(air), train_args.n_steps
+
+    config = session_config(train_args.intra_op_threads, train_args.inter_op_threads)
+    results = probe(build, args.probe_batch_sizes, not args.static_only, config)
+
+    plans = []
+    for name in ('train', 'inference'):
+        plans.append(plan(fit_memory(results, name), args.budget_mb, args.margin, args.multiple))
+        print format_plan(plans[-1])
+
+    if args.out is not None:
+        save_plan(args.out, plans, results)
+        print 'Saved the plans to "{}"'.format(args.out)
+
+
+if __name__ == '__main__':
+    main()
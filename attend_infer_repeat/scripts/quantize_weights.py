@@ -0,0 +1,55 @@
+"""Quantizes weights exported by :func: numpy_air.export_weights and reports how it changes the results.
+
+    python attend_infer_repeat/scripts/quantize_weights.py air.npz air_int8.npz --dtype int8 --images images.npy
+
+Counts, reconstructions and boxes of the quantized model are compared to the float32 one on the given images, together
+with the throughput of both.
+"""
+import argparse
+import os
+import sys
+from os import path as osp
+
+sys.path.insert(0, osp.abspath(osp.join(osp.dirname(__file__), '..')))
+
+import numpy as np
+
+from numpy_air import QUANTIZATIONS, NumpyAIR, compare_outputs, images_per_second, quantize_weights
+from numpy_inference import load_images
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Quantizes weights of the NumPy inference engine')
+    parser.add_argument('weights', help='`.npz` file written by numpy_air.export_weights')
+    parser.add_argument('out', help='`.npz` file for the quantized weights')
+    parser.add_argument('--dtype', default='int8', choices=QUANTIZATIONS)
+    parser.add_argument('--images', help='`.npy` file with images or a dataset pickle used for the report')
+    parser.add_argument('--n_images', type=int, default=1000)
+    parser.add_argument('--batch_size', type=int, default=256)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with np.load(args.weights) as f:
+        weights = {k: f[k] for k in f.files}
+
+    np.savez(args.out, **quantize_weights(weights, args.dtype))
+    print 'Wrote {} weights to "{}": {:.1f}kB instead of {:.1f}kB'.format(
+        args.dtype, args.out, os.path.getsize(args.out) / 1024., os.path.getsize(args.weights) / 1024.)
+
+    if args.images is None:
+        return
+
+    imgs = load_images(args.images)[:args.n_images]
+    reference, quantized = NumpyAIR(weights), NumpyAIR(args.out)
+    report = compare_outputs(reference(imgs), quantized(imgs), imgs)
+    for k in sorted(report):
+        print '{}: {:.6f}'.format(k, report[k])
+
+    for name, air in (('float32', reference), (args.dtype, quantized)):
+        print '{} throughput: {:.1f} img/s'.format(name, images_per_second(air, imgs, args.batch_size))
+
+
+if __name__ == '__main__':
+    main()
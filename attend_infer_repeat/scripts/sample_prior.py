@@ -0,0 +1,64 @@
+"""Generates synthetic scenes from the prior of a trained model and writes them to memory-mapped `.npy` files.
+
+Arguments not recognised here are passed to `multi_mnist.py` to configure the model, which has to match the one in
+the checkpoint, e.g.
+
+    python attend_infer_repeat/scripts/sample_prior.py ../results/multi_mnist/model.ckpt-300000 samples \
+        --n_samples 1000000 --success_prob .5 --n_steps 3
+"""
+import argparse
+import sys
+from os import path as osp
+
+sys.path.insert(0, osp.abspath(osp.join(osp.dirname(__file__), '..')))
+
+import numpy as np
+import tensorflow as tf
+from attrdict import AttrDict
+
+from multi_mnist import make_air, parse_args as parse_train_args
+from sampling import PriorSampler, sample_to_disk
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Samples scenes from the prior of AIR')
+    parser.add_argument('checkpoint', help='model checkpoint')
+    parser.add_argument('out', help='directory for the arrays')
+    parser.add_argument('--n_samples', type=int, default=10000)
+    parser.add_argument('--sample_batch_size', type=int, default=1024)
+    parser.add_argument('--img_size', type=int, nargs=2, default=[50, 50])
+    parser.add_argument('--success_prob', type=float, default=.5,
+                        help='parameter of the geometric prior over the number of objects; bigger means more objects')
+    parser.add_argument('--what_scale', type=float, default=1.)
+    parser.add_argument('--where_scale_loc', type=float, default=0.)
+    parser.add_argument('--where_scale_scale', type=float, default=1.)
+    parser.add_argument('--where_shift_scale', type=float, default=1.)
+    parser.add_argument('--float16', action='store_true', help='store latent variables as float16')
+
+    args, train_argv = parser.parse_known_args(argv)
+    return args, parse_train_args(train_argv)
+
+
+def main(argv=None):
+    args, train_args = parse_args(argv)
+    train_args.n_samples = 1
+
+    # the model is only built to create the variables restored from the checkpoint
+    imgs = tf.placeholder(tf.float32, [1] + args.img_size, name='imgs')
+    nums = tf.zeros((train_args.n_steps + 1, 1, 1))
+    air = make_air(train_args, dict(imgs=imgs, nums=nums))
+
+    sampler = PriorSampler(air, args.sample_batch_size, args.success_prob,
+                           what_prior=AttrDict(loc=0., scale=args.what_scale),
+                           where_scale_prior=AttrDict(loc=args.where_scale_loc, scale=args.where_scale_scale),
+                           where_shift_prior=AttrDict(loc=0., scale=args.where_shift_scale))
+
+    sess = tf.Session()
+    tf.train.Saver().restore(sess, args.checkpoint)
+
+    dtype = np.float16 if args.float16 else np.float32
+    sample_to_disk(sess, sampler, args.out, args.n_samples, dtype)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Builds a nearest-neighbour index over exported appearance codes and finds objects similar to a given one.
+
+    python attend_infer_repeat/scripts/export_latents.py model.ckpt latents --keys what_loc presence --n_steps 3
+    python attend_infer_repeat/scripts/similar_objects.py build latents index.npz
+    python attend_infer_repeat/scripts/similar_objects.py query latents index.npz --image 12 --slot 0 -k 20
+"""
+import argparse
+import sys
+import time
+from os import path as osp
+
+sys.path.insert(0, osp.abspath(osp.join(osp.dirname(__file__), '..')))
+
+from latents import load_latents
+from neighbours import IVFIndex, object_codes
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Nearest-neighbour search over objects found by AIR')
+    subparsers = parser.add_subparsers(dest='command')
+
+    build = subparsers.add_parser('build', help='builds an index over all present objects')
+    build.add_argument('latents', help='directory written by export_latents.py')
+    build.add_argument('index', help='`.npz` file for the index')
+    build.add_argument('--key', default='what_loc', help='exported output used as the code')
+    build.add_argument('--n_lists', type=int, help='number of partitions; the square root of the number of objects '
+                                                   'by default')
+    build.add_argument('--n_probe', type=int, default=8)
+    build.add_argument('--add_batch_size', type=int, default=100000)
+
+    query = subparsers.add_parser('query', help='lists objects similar to an object of an image')
+    query.add_argument('latents', help='directory written by export_latents.py')
+    query.add_argument('index', help='`.npz` file with the index')
+    query.add_argument('--key', default='what_loc')
+    query.add_argument('--image', type=int, required=True)
+    query.add_argument('--slot', type=int, default=0)
+    query.add_argument('-k', type=int, default=10)
+    query.add_argument('--n_probe', type=int)
+
+    return parser.parse_args(argv)
+
+
+def build(args):
+    codes, image_ids, slots = object_codes(load_latents(args.latents), args.key)
+    n_lists = args.n_lists or max(1, int(len(codes) ** .5))
+    print 'Indexing {} objects in {} lists'.format(len(codes), n_lists)
+
+    start = time.time()
+    index = IVFIndex(n_lists, args.n_probe)
+    index.train(codes)
+    for i in xrange(0, len(codes), args.add_batch_size):
+        j = i + args.add_batch_size
+        index.add(codes[i:j], image_ids[i:j], slots[i:j])
+
+    index.save(args.index)
+    print 'Built the index in {:.1f}s and saved it to "{}"'.format(time.time() - start, args.index)
+
+
+def query(args):
+    latents = load_latents(args.latents)
+    index = IVFIndex.load(args.index)
+    code = latents[args.key][args.image, args.slot][None]
+
+    start = time.time()
+    distances, image_ids, slots = index.search(code, args.k, args.n_probe)
+    print 'Searched {} objects in {:.2f}ms'.format(len(index), 1e3 * (time.time() - start))
+    for d, i, s in zip(distances[0], image_ids[0], slots[0]):
+        if i >= 0:
+            print 'image {:>9d} slot {} distance {:.4f}'.format(i, s, d)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    commands = dict(build=build, query=query)
+    commands[args.command](args)
@@ -0,0 +1,120 @@
+"""Compares estimators of the number of steps by how fast they reach a given count accuracy.
+
+Every variant is trained from scratch with the same hyperparameters and seed; the count accuracy is evaluated on
+the validation set every `--eval_every` iterations. For every variant, the script reports the iteration and the
+wall-clock time at which the accuracy first reached `--target_accuracy` together with the mean step time.
+"""
+import argparse
+import json
+import sys
+import time
+from os import path as osp
+
+sys.path.insert(0, osp.abspath(osp.join(osp.dirname(__file__), '..')))
+
+import numpy as np
+import tensorflow as tf
+from attrdict import AttrDict
+
+from data.data import load_data, minibatch_sampler, placeholders_from_data
+from mnist_model import AIRonMNIST
+
+
+VARIANTS = dict(
+    reinforce=dict(),
+    vimco=dict(n_samples=2, estimator='vimco'),
+    relaxed=dict(relaxed_steps=True),
+    straight_through=dict(relaxed_steps=True, straight_through=True),
+)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Measures steps and time needed to reach a count accuracy')
+    parser.add_argument('--train_data', default='mnist_train.pickle')
+    parser.add_argument('--valid_data', default='mnist_validation.pickle')
+    parser.add_argument('--variants', nargs='+', choices=sorted(VARIANTS.keys()), default=sorted(VARIANTS.keys()))
+    parser.add_argument('--target_accuracy', type=float, default=.9)
+    parser.add_argument('--max_iter', type=int, default=int(1e5))
+    parser.add_argument('--eval_every', type=int, default=1000)
+    parser.add_argument('--eval_batches', type=int, default=20)
+    parser.add_argument('--batch_size', type=int, default=64)
+    parser.add_argument('--learning_rate', type=float, default=1e-4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='path of the JSON file with results')
+    return parser.parse_args(argv)
+
+
+def run_variant(name, args, train_data, valid_data, axes):
+    tf.reset_default_graph()
+    tf.set_random_seed(args.seed)
+    np.random.seed(args.seed)
+
+    kwargs = dict(VARIANTS[name])
+    estimator = kwargs.pop('estimator', 'reinforce')
+
+    inputs = placeholders_from_data(train_data, args.batch_size, axes)
+    air = AIRonMNIST(inputs['imgs'], inputs['nums'], max_steps=3, explore_eps=1e-3,
+                     steps_pred_hidden=[128, 64], transform_var_bias=.5, step_bias=.75, output_multiplier=.5,
+                     **kwargs)
+
+    num_steps_prior = AttrDict(anneal='exp', init=1. - 1e-7, final=1e-5, steps_div=1e4, steps=1e5, hold_init=0.)
+    prior = AttrDict(loc=0., scale=1.)
+    temperature_anneal = AttrDict(anneal='exp', final=.1, steps=args.max_iter, steps_div=1e3)
+    train_step, global_step = air.train_step(args.learning_rate, 0., prior, prior, prior, num_steps_prior,
+                                             estimator=estimator, temperature_anneal=temperature_anneal)
+
+    def make_feed(sample):
+        def feed():
+            return {inputs[k]: v for k, v in sample().iteritems()}
+        return feed
+
+    train_feed = make_feed(minibatch_sampler(train_data, args.batch_size, axes, shuffle=True))
+
+    sess = tf.Session()
+    sess.run(tf.global_variables_initializer())
+
+    result = dict(name=name, target_accuracy=args.target_accuracy, steps=None, seconds=None, accuracy=[])
+    train_time = 0.
+    for itr in xrange(1, args.max_iter + 1):
+        feed_dict = train_feed()
+        start = time.time()
+        sess.run(train_step, feed_dict)
+        train_time += time.time() - start
+
+        if itr % args.eval_every == 0:
+            valid_feed = make_feed(minibatch_sampler(valid_data, args.batch_size, axes, shuffle=False))
+            acc = np.mean([sess.run(air.num_step_accuracy, valid_feed()) for _ in xrange(args.eval_batches)])
+            result['accuracy'].append((itr, float(acc)))
+            print '{}: step {}, accuracy = {:.4f}, time = {:.1f}s'.format(name, itr, acc, train_time)
+
+            if acc >= args.target_accuracy:
+                result['steps'], result['seconds'] = itr, train_time
+                break
+
+    result['ms_per_step'] = 1e3 * train_time / itr
+    sess.close()
+    return result
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    axes = {'imgs': 0, 'labels': 0, 'nums': 1}
+    train_data = load_data(args.train_data)
+    valid_data = load_data(args.valid_data)
+
+    results = [run_variant(name, args, train_data, valid_data, axes) for name in args.variants]
+
+    print
+    print '{:<20} {:>10} {:>10} {:>12}'.format('variant', 'steps', 'seconds', 'ms/step')
+    for r in results:
+        steps = r['steps'] if r['steps'] is not None else '-'
+        seconds = '{:.1f}'.format(r['seconds']) if r['seconds'] is not None else '-'
+        print '{:<20} {:>10} {:>10} {:>12.2f}'.format(r['name'], steps, seconds, r['ms_per_step'])
+
+    if args.out is not None:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Hyperparameter sweep over `multi_mnist.py` configurations on a single machine.
+
+Example:
+
+    python attend_infer_repeat/scripts/sweep.py --param step_bias=.5,.75,1. --param transform_var_bias=-2,.5 \
+        --cores_per_run 4 -- --max_iter 50000 --log_every 10000
+
+Arguments after `--` are passed to every run.
+"""
+import argparse
+import json
+import shutil
+import sys
+from os import path as osp
+
+sys.path.insert(0, osp.abspath(osp.join(osp.dirname(__file__), '..')))
+
+from data.data import data_source, load_data, save_shared, shared_source
+from sweep import SweepRunner, format_table, parse_grid
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Runs a grid of training configurations in parallel')
+    parser.add_argument('--param', action='append', default=[], help='name=value1,value2,...; can be repeated')
+    parser.add_argument('--cores_per_run', type=int, default=1)
+    parser.add_argument('--cores', type=int, nargs='+', help='cores to use; all by default')
+    parser.add_argument('--train_data', default='mnist_train.pickle')
+    parser.add_argument('--valid_data', default='mnist_validation.pickle')
+    parser.add_argument('--shm_dir', default='/dev/shm/air_sweep', help='where datasets are placed for all runs')
+    parser.add_argument('--keep_shm', action='store_true', help='do not remove datasets from shared memory')
+    parser.add_argument('--results_dir', default='../results/sweep')
+    parser.add_argument('extra_args', nargs=argparse.REMAINDER, help='arguments passed to every run after --')
+
+    args = parser.parse_args(argv)
+    if args.extra_args and args.extra_args[0] == '--':
+        args.extra_args = args.extra_args[1:]
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configs = parse_grid(args.param)
+    print 'Sweeping over {} configurations'.format(len(configs))
+
+    paths = {}
+    for name, path in (('train', args.train_data), ('valid', args.valid_data)):
+        paths[name] = osp.join(args.shm_dir, name)
+        # a dataset left from another sweep is reused only if it was placed from the same, unmodified file
+        source = data_source(path)
+        if shared_source(paths[name]) != source:
+            print 'Placing "{}" in "{}"'.format(path, paths[name])
+            shutil.rmtree(paths[name], ignore_errors=True)
+            save_shared(load_data(path), paths[name], source)
+
+    try:
+        runner = SweepRunner(configs, args.cores_per_run, paths['train'], paths['valid'], args.results_dir,
+                             args.extra_args, args.cores)
+        rows = runner.run()
+    finally:
+        if not args.keep_shm:
+            shutil.rmtree(args.shm_dir, ignore_errors=True)
+
+    params = sorted({k for c in configs for k in c})
+    print
+    print format_table(rows, params)
+
+    with open(osp.join(args.results_dir, 'results.json'), 'w') as f:
+        json.dump(rows, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
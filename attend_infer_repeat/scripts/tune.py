@@ -0,0 +1,52 @@
+"""Finds the batch size and TensorFlow thread counts with the highest training throughput.
+
+Arguments not recognised here are passed to `multi_mnist.py` to configure the model, e.g.
+
+    python attend_infer_repeat/scripts/tune.py --out tuning.json --batch_sizes 32 64 128 --n_steps 3
+    python attend_infer_repeat/scripts/multi_mnist.py --tuning_config tuning.json --n_steps 3
+"""
+import argparse
+import sys
+from os import path as osp
+
+sys.path.insert(0, osp.abspath(osp.join(osp.dirname(__file__), '..')))
+
+from data.data import load_data, minibatch_sampler, placeholders_from_data
+from multi_mnist import AXES, make_air, make_train_step, parse_args as parse_train_args
+from tuning import default_threads, save_tuning, tune
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks the training step over batch sizes and thread counts')
+    parser.add_argument('--out', default='tuning.json', help='JSON file with the best settings')
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[32, 64, 128])
+    parser.add_argument('--intra_op_threads', type=int, nargs='+', help='powers of two up to all cores by default')
+    parser.add_argument('--inter_op_threads', type=int, nargs='+', default=[1, 2])
+    parser.add_argument('--n_warmup', type=int, default=3)
+    parser.add_argument('--n_iter', type=int, default=20)
+
+    args, train_argv = parser.parse_known_args(argv)
+    return args, parse_train_args(train_argv)
+
+
+def main(argv=None):
+    args, train_args = parse_args(argv)
+    intra_op_threads = args.intra_op_threads or default_threads()
+    train_data = load_data(train_args.train_data)
+
+    def build(batch_size):
+        inputs = placeholders_from_data(train_data, batch_size, AXES)
+        air = make_air(train_args, inputs)
+        train_step, _ = make_train_step(train_args, air)
+
+        batch = minibatch_sampler(train_data, batch_size, AXES, shuffle=True)()
+        return train_step, {inputs[k]: v for k, v in batch.iteritems()}
+
+    results = tune(build, args.batch_sizes, intra_op_threads, args.inter_op_threads, args.n_warmup, args.n_iter)
+    tuning = save_tuning(args.out, results)
+    print 'Best: batch_size={batch_size}, intra_op_threads={intra_op_threads}, inter_op_threads={inter_op_threads}' \
+          ' with {imgs_per_sec:.1f} img/s; saved to "{out}"'.format(out=args.out, **tuning)
+
+
+if __name__ == '__main__':
+    main()
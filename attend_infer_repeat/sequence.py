@@ -0,0 +1,130 @@
+"""Streaming inference on image sequences, e.g. consecutive frames of a video, with :class: numpy_air.NumpyAIR.
+
+Decomposing every frame from scratch takes a step per object. :class: SequenceAIR keeps the objects found in the
+previous frame and first confirms them cheaply: an object is kept if its reconstruction matches a glimpse cropped
+from the new frame at its previous location. Confirmed objects are removed from the frame and the full recurrence
+runs only on the residual, with as many steps as there are slots left, and stops as soon as no more objects are
+found. On mostly static streams this reduces the number of recurrent steps, and so the latency, per frame.
+"""
+import numpy as np
+
+from numpy_air import crop, paste, _sigmoid
+
+
+class SequenceAIR(object):
+    """Warm-started inference on a batch of streams of frames"""
+
+    def __init__(self, air, confirm_threshold=.01, carry_state=False):
+        """
+        :param air: NumpyAIR
+        :param confirm_threshold: float, an object from the previous frame is kept if the mean squared error between
+            its reconstruction and the glimpse at its previous location in the new frame is smaller than this; use a
+            negative value to decompose every frame from scratch
+        :param carry_state: boolean, if True the recurrence on a frame starts from the final state of the transition
+            on the previous frame instead of from the learned initial state
+        """
+        self.air = air
+        self.confirm_threshold = confirm_threshold
+        self.carry_state = carry_state
+        self.reset()
+
+    def reset(self):
+        """Forgets the previous frame and clears statistics, e.g. at a scene cut"""
+        self._previous = None
+        self._state = None
+        self.stats = dict(n_frames=0, n_steps=0, n_objects=0, n_confirmed=0)
+
+    def _confirm(self, frames):
+        """Returns a boolean array of shape [max_steps, batch_size] of previous objects present in `frames`"""
+        where, decoded, presence = (self._previous[k] for k in ('where', 'decoded', 'presence'))
+        confirmed = np.zeros(presence.shape, dtype=bool)
+        for t in np.nonzero(presence.any(1))[0]:
+            cropped = crop(frames, where[t], self.air.glimpse_size)
+            reconstruction = self.air._output_multiplier * decoded[t]
+            error = ((cropped - reconstruction) ** 2).mean((1, 2))
+            confirmed[t] = presence[t] & (error < self.confirm_threshold)
+        return confirmed
+
+    def __call__(self, frames):
+        """Decomposes the next frame of every stream
+
+        :param frames: np.array of shape [batch_size, height, width]; the i-th frame continues the i-th stream
+        :return: dict of outputs as in :meth: NumpyAIR.__call__ with an additional `confirmed` output of shape
+            [max_steps, batch_size, 1]; confirmed objects come first
+        """
+        air = self.air
+        frames = np.asarray(frames, dtype=np.float32).reshape((-1,) + air.img_size)
+        batch_size = len(frames)
+        if self._previous is not None and self._previous['presence'].shape[1] != batch_size:
+            raise ValueError('Expected frames of {} streams, but got {}; call reset() to start new streams'.format(
+                self._previous['presence'].shape[1], batch_size))
+
+        if self._previous is None:
+            confirmed = np.zeros((air.max_steps, batch_size), dtype=bool)
+        else:
+            confirmed = self._confirm(frames)
+
+        # move confirmed objects to the first slots, keeping their order
+        order = np.argsort(~confirmed, axis=0, kind='mergesort')
+        cols = np.arange(batch_size)[np.newaxis]
+        n_confirmed = confirmed.sum(0)
+        confirmed = confirmed[order, cols]
+
+        kept = {}
+        if self._previous is not None:
+            kept = {k: v[order, cols] for k, v in self._previous.iteritems()}
+            kept['presence'] = confirmed.astype(np.float32)[..., np.newaxis]
+
+        # cumulative canvas of confirmed objects, [max_steps, batch_size, height, width]
+        kept_canvas = np.zeros((air.max_steps, batch_size) + air.img_size, dtype=np.float32)
+        for t in xrange(int(n_confirmed.max())):
+            pasted = paste(kept['decoded'][t], kept['where'][t], air.img_size)
+            kept_canvas[t] = confirmed[t, :, np.newaxis, np.newaxis] * pasted
+        kept_canvas = air._output_multiplier * np.cumsum(kept_canvas, 0)
+
+        residual = np.clip(frames - kept_canvas[-1], 0., 1.)
+        if self.carry_state and self._state is not None:
+            state = self._state
+        else:
+            state = air.initial_state(batch_size)
+
+        outputs, decoded, state, n_steps = air.run(residual, state, air.max_steps - n_confirmed, early_stop=True)
+        outputs['decoded'] = decoded
+
+        # new objects follow the confirmed ones: slot t of an image holds its (t - n_confirmed)-th new object
+        src = np.arange(air.max_steps)[:, np.newaxis] - n_confirmed[np.newaxis]
+        is_new = src >= 0
+        src = np.maximum(src, 0)
+        merged = {}
+        for k, v in outputs.iteritems():
+            if k == 'glimpse':
+                continue
+
+            new = v[src, cols]
+            if k == 'canvas':
+                merged[k] = kept_canvas[-1] + new
+                merged[k][~is_new] = kept_canvas[~is_new]
+            elif kept:
+                mask = is_new.reshape(is_new.shape + (1,) * (v.ndim - 2))
+                merged[k] = np.where(mask, new, kept[k])
+            else:
+                merged[k] = new
+
+        merged['confirmed'] = confirmed.astype(np.float32)[..., np.newaxis]
+        merged['glimpse'] = merged['presence'][..., np.newaxis] * _sigmoid(merged['decoded'])
+
+        self._previous = {k: merged[k] for k in ('what', 'where', 'presence_prob', 'decoded')}
+        self._previous['presence'] = merged['presence'][..., 0] > .5
+        self._state = state
+
+        self.stats['n_frames'] += 1
+        self.stats['n_steps'] += n_steps
+        self.stats['n_objects'] += int(merged['presence'].sum())
+        self.stats['n_confirmed'] += int(n_confirmed.sum())
+
+        del merged['decoded']
+        return merged
+
+    def average_steps(self):
+        """Average number of recurrent steps per frame since the last :meth: reset"""
+        return self.stats['n_steps'] / float(max(self.stats['n_frames'], 1))
@@ -0,0 +1,168 @@
+"""Runs many training configurations side by side on one machine.
+
+Every run is a separate process of `scripts/multi_mnist.py` pinned with `taskset` to its own set of cores, with
+TensorFlow thread pools sized to match. Datasets are expected in shared memory, see :func: data.save_shared, so
+that all runs memory-map a single copy.
+"""
+import itertools
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from distutils.spawn import find_executable
+from os import path as osp
+
+
+_SCRIPT = osp.join(osp.dirname(osp.abspath(__file__)), 'scripts', 'multi_mnist.py')
+
+
+def parse_grid(params):
+    """Parses parameters of a sweep
+
+    :param params: iterable of strings formatted as `name=value1,value2,...`
+    :return: list of dicts, one for every combination of values, in a fixed order
+    """
+    names, values = [], []
+    for param in params:
+        name, _, vals = param.partition('=')
+        if not vals:
+            raise ValueError('Parameters should be formatted as name=value1,value2,... but got "{}"'.format(param))
+        names.append(name)
+        values.append(vals.split(','))
+
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+
+def core_sets(cores, cores_per_run):
+    """Splits cores into disjoint sets of `cores_per_run` cores; left-over cores are unused"""
+    cores = list(cores)
+    n_sets = len(cores) // cores_per_run
+    if n_sets == 0:
+        raise ValueError('Every run needs {} cores, but only {} are available'.format(cores_per_run, len(cores)))
+    return [cores[i * cores_per_run:(i + 1) * cores_per_run] for i in xrange(n_sets)]
+
+
+def run_name(params):
+    return '_'.join('{}={}'.format(k, v) for k, v in sorted(params.iteritems())) or 'default'
+
+
+def make_command(params, cores, train_data, valid_data, results_dir, name, extra_args=(), pin=True):
+    """Builds the command line of a single run
+
+    :param params: dict of command-line arguments of `multi_mnist.py`
+    :param cores: list of ints, cores the run is pinned to
+    :return: list of strings
+    """
+    command = [sys.executable, _SCRIPT,
+               '--train_data', train_data, '--valid_data', valid_data,
+               '--results_dir', results_dir, '--run_name', name,
+               '--intra_op_threads', str(len(cores)), '--inter_op_threads', '1', '--n_workers', '1']
+
+    for k, v in sorted(params.iteritems()):
+        command += ['--' + k, v]
+    command += list(extra_args)
+
+    if pin:
+        command = ['taskset', '-c', ','.join(str(c) for c in cores)] + command
+    return command
+
+
+class SweepRunner(object):
+    """Runs configurations in parallel, starting a new run as soon as a set of cores becomes free"""
+
+    def __init__(self, configs, cores_per_run, train_data, valid_data, results_dir, extra_args=(), cores=None,
+                 poll_interval=1.):
+        """
+        :param configs: list of dicts, see :func: parse_grid
+        :param cores_per_run: int
+        :param train_data: string, training data, e.g. a directory written by :func: data.save_shared
+        :param valid_data: string, validation data
+        :param results_dir: string, every run writes to a subdirectory named after its parameters
+        :param extra_args: list of strings, arguments passed to every run
+        :param cores: list of ints or None, cores to use; all cores by default
+        :param poll_interval: float, seconds between checks for finished runs
+        """
+        if cores is None:
+            cores = range(multiprocessing.cpu_count())
+
+        self.configs = configs
+        self.core_sets = core_sets(cores, cores_per_run)
+        self.train_data = train_data
+        self.valid_data = valid_data
+        self.results_dir = results_dir
+        self.extra_args = extra_args
+        self.poll_interval = poll_interval
+
+        self.pin = find_executable('taskset') is not None
+        if not self.pin:
+            print 'taskset not found; runs will not be pinned to cores'
+
+    def _start(self, params, cores):
+        name = run_name(params)
+        run_dir = osp.join(self.results_dir, name)
+        if not osp.exists(run_dir):
+            os.makedirs(run_dir)
+
+        command = make_command(params, cores, self.train_data, self.valid_data, self.results_dir, name,
+                               self.extra_args, self.pin)
+        log_file = open(osp.join(run_dir, 'stdout.log'), 'w')
+        process = subprocess.Popen(command, stdout=log_file, stderr=subprocess.STDOUT)
+        print 'Started {} on cores {}'.format(name, cores)
+        return dict(process=process, params=params, name=name, cores=cores, log_file=log_file, start=time.time())
+
+    def _finish(self, run):
+        run['log_file'].close()
+        row = dict(run['params'], name=run['name'], returncode=run['process'].returncode,
+                   wall_time=time.time() - run['start'])
+
+        metrics_file = osp.join(self.results_dir, run['name'], 'final_metrics.json')
+        if osp.exists(metrics_file):
+            with open(metrics_file) as f:
+                metrics = json.load(f)
+            row.update({k: v for k, v in metrics.get('test', {}).iteritems()})
+            for k in ('iter', 'imgs_per_sec'):
+                row[k] = metrics.get(k)
+
+        print 'Finished {} with code {} in {:.0f}s'.format(run['name'], row['returncode'], row['wall_time'])
+        return row
+
+    def run(self):
+        """Runs all configurations and returns a list of dicts with their parameters and final test metrics"""
+        pending = list(self.configs)
+        free = list(self.core_sets)
+        running, rows = [], []
+        try:
+            while pending or running:
+                while pending and free:
+                    running.append(self._start(pending.pop(0), free.pop(0)))
+
+                time.sleep(self.poll_interval)
+                for run in list(running):
+                    if run['process'].poll() is not None:
+                        running.remove(run)
+                        free.append(run['cores'])
+                        rows.append(self._finish(run))
+        finally:
+            for run in running:
+                run['process'].terminate()
+                run['log_file'].close()
+
+        return rows
+
+
+def format_table(rows, params, metrics=('num_step_acc', 'loss', 'rec_loss', 'imgs_per_sec')):
+    """Formats results of a sweep as a table sorted by the first metric"""
+    columns = list(params) + list(metrics)
+    rows = sorted(rows, key=lambda r: -r.get(metrics[0], float('-inf')))
+
+    def fmt(v):
+        if isinstance(v, float):
+            return '{:.4f}'.format(v)
+        return '-' if v is None else str(v)
+
+    cells = [columns] + [[fmt(r.get(c)) for c in columns] for r in rows]
+    widths = [max(len(row[i]) for row in cells) for i in xrange(len(columns))]
+    lines = ['  '.join(c.rjust(w) for c, w in zip(row, widths)) for row in cells]
+    return '\n'.join(lines)
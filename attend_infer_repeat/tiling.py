@@ -0,0 +1,158 @@
+import numpy as np
+import tensorflow as tf
+
+from boxes import batched_nms, where_to_boxes
+
+
+def _axis_offsets(size, tile_size, stride):
+    if size <= tile_size:
+        return [0]
+
+    offsets = range(0, size - tile_size, stride)
+    offsets.append(size - tile_size)
+    return offsets
+
+
+def tile_offsets(img_size, tile_size, overlap):
+    """Computes top-left corners of overlapping tiles that cover the whole image
+
+    Tiles are spaced by `tile_size - overlap`; the last tile in every row and column is aligned with the border of the
+    image, so it can overlap its neighbour more than the others.
+
+    :param img_size: (height, width) of the image
+    :param tile_size: (height, width) of a tile
+    :param overlap: (height, width) or int, minimum overlap between neighbouring tiles in pixels
+    :return: np.array of shape [n_tiles, 2] with (y, x) offsets
+    """
+    overlap = np.broadcast_to(overlap, (2,))
+    axes = []
+    for size, tile, o in zip(img_size, tile_size, overlap):
+        if not 0 <= o < tile:
+            raise ValueError('Overlap has to be in [0, tile size), but is {} for tiles of size {}'.format(o, tile))
+        axes.append(_axis_offsets(size, tile, tile - o))
+
+    ys, xs = np.meshgrid(*axes, indexing='ij')
+    return np.stack((ys.ravel(), xs.ravel()), -1).astype(np.int32)
+
+
+def extract_tiles(imgs, tile_size, offsets):
+    """Cuts images into tiles
+
+    Images smaller than a tile are padded with zeros at the bottom and on the right.
+
+    :param imgs: tf.Tensor of shape [batch_size, height, width] with a static shape
+    :param tile_size: (height, width) of a tile
+    :param offsets: np.array of shape [n_tiles, 2], see :func: tile_offsets
+    :return: tf.Tensor of shape [batch_size * n_tiles, tile height, tile width]; tiles of an image are consecutive
+    """
+    th, tw = tile_size
+    padding = [max(t - s, 0) for s, t in zip(imgs.get_shape().as_list()[1:3], tile_size)]
+    if any(padding):
+        imgs = tf.pad(imgs, [[0, 0], [0, padding[0]], [0, padding[1]]])
+
+    tiles = [imgs[:, y:y + th, x:x + tw] for y, x in offsets]
+    tiles = tf.stack(tiles, 1)
+    return tf.reshape(tiles, [-1, th, tw])
+
+
+class TiledAIR(object):
+    """Decomposes scenes bigger than the canvas of a trained model.
+
+    Images are cut into overlapping tiles of the size of the canvas and all tiles of all images are processed by the
+    AIR model as a single batch. Detections are mapped back to the coordinates of the images and duplicates, e.g.
+    objects found in two overlapping tiles, are removed with non-maximum suppression. The cost grows linearly with
+    the image area, and every tile can contain up to `max_steps` objects.
+
+    Since the model is built on tiles, it should be built in a fresh graph and restored from a checkpoint of a model
+    trained on canvases of size `tile_size`. Images smaller than a tile are padded to a single tile.
+    """
+
+    def __init__(self, imgs, tile_size, overlap, make_model):
+        """
+        :param imgs: tf.Tensor of shape [batch_size, height, width] with a static shape
+        :param tile_size: (height, width), canvas size of the model
+        :param overlap: (height, width) or int, overlap between tiles; should be about the size of an object
+        :param make_model: callable, builds an AIRModel given a tf.Tensor with tiles
+        """
+        self.imgs = imgs
+        self.batch_size = imgs.get_shape().as_list()[0]
+        self.img_size = imgs.get_shape().as_list()[1:3]
+        self.tile_size = tuple(tile_size)
+        self.offsets = tile_offsets(self.img_size, self.tile_size, overlap)
+        self.n_tiles = len(self.offsets)
+
+        self.tiles = extract_tiles(imgs, self.tile_size, self.offsets)
+        self.air = make_model(self.tiles)
+
+    def _per_tile(self, expr):
+        """Reshapes [max_steps, batch_size * n_tiles, ...] into [batch_size, n_tiles, max_steps, ...]"""
+        expr = tf.convert_to_tensor(expr)
+        shape = expr.get_shape().as_list()
+        n_steps = shape[0]
+        expr = tf.reshape(expr, [n_steps, self.batch_size, self.n_tiles] + shape[2:])
+        perm = [1, 2, 0] + range(3, len(shape) + 1)
+        return tf.transpose(expr, perm)
+
+    @property
+    def outputs(self):
+        air = self.air
+        return dict(where=self._per_tile(air.where_loc), what=self._per_tile(air.what_loc),
+                    presence_prob=self._per_tile(air.presence_prob))
+
+    def detect(self, sess, feed_dict=None, min_score=.5, iou_threshold=.5, border_margin=1.):
+        """Runs the model and merges detections from all tiles
+
+        :param sess: tf.Session
+        :param feed_dict: dict or None
+        :param min_score: float, detections with the probability of being present below this are discarded
+        :param iou_threshold: float, threshold for non-maximum suppression
+        :param border_margin: float or None, boxes that touch the border of a tile that is not at the border of the
+            image are discarded, since a bigger part of the object is visible in a neighbouring tile
+        :return: list of dicts, one per image, with `boxes` [n, 4] as (y, x, height, width) in image coordinates,
+            `scores`, `what` codes and `tile` and `slot` of every detection
+        """
+        outputs = sess.run(self.outputs, feed_dict)
+        return merge_detections(outputs['where'], outputs['presence_prob'], outputs['what'], self.offsets,
+                                self.tile_size, self.img_size, min_score, iou_threshold, border_margin)
+
+
+def merge_detections(where, presence_prob, what, offsets, tile_size, img_size, min_score=.5, iou_threshold=.5,
+                     border_margin=1.):
+    """Merges per-tile detections into per-image ones, see :meth: TiledAIR.detect
+
+    :param where: np.array of shape [batch_size, n_tiles, max_steps, 4]
+    :param presence_prob: np.array of shape [batch_size, n_tiles, max_steps, 1]
+    :param what: np.array of shape [batch_size, n_tiles, max_steps, n_appearance]
+    """
+    batch_size, n_tiles, n_steps = where.shape[:3]
+
+    # a step is taken only if all previous steps were taken
+    scores = np.cumprod(presence_prob[..., 0], axis=-1)
+    boxes = where_to_boxes(where, tile_size)
+    boxes[..., :2] += offsets[np.newaxis, :, np.newaxis, :]
+
+    valid = scores > min_score
+    if border_margin is not None:
+        valid &= ~_touches_inner_border(boxes, offsets, tile_size, img_size, border_margin)
+
+    image, tile, slot = np.where(valid)
+    boxes, scores, what = boxes[valid], scores[valid], what[valid]
+    keep = batched_nms(boxes, scores, image, iou_threshold)
+
+    detections = []
+    for i in xrange(batch_size):
+        idx = keep[image[keep] == i]
+        detections.append(dict(boxes=boxes[idx], scores=scores[idx], what=what[idx], tile=tile[idx], slot=slot[idx]))
+    return detections
+
+
+def _touches_inner_border(boxes, offsets, tile_size, img_size, margin):
+    """Checks if boxes touch a border of their tile that is not a border of the image"""
+    offsets = offsets[np.newaxis, :, np.newaxis, :]
+    tile_size = np.asarray(tile_size)
+    tile_end = offsets + tile_size
+
+    start, end = boxes[..., :2], boxes[..., :2] + boxes[..., 2:]
+    at_start = (start <= offsets + margin) & (offsets > 0)
+    at_end = (end >= tile_end - margin) & (tile_end < np.asarray(img_size[:2]))
+    return (at_start | at_end).any(-1)
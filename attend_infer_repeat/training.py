@@ -0,0 +1,287 @@
+import sys
+import time
+import threading
+import traceback
+import os.path as osp
+import Queue
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from functools import partial
+from multiprocessing.pool import ThreadPool
+
+from evaluation import log_values
+
+
+class Prefetcher(object):
+    """Produces minibatches on a background thread, so that the training loop doesn't wait for the data"""
+
+    def __init__(self, sample_fun, capacity=8):
+        """Starts the prefetching thread
+
+        :param sample_fun: callable, returns a minibatch
+        :param capacity: int, maximum number of minibatches buffered ahead of the training loop
+        """
+        self._sample_fun = sample_fun
+        self._queue = Queue.Queue(maxsize=capacity)
+        self._stop = threading.Event()
+        self._error = None
+
+        self._thread = threading.Thread(target=self._run, name='Prefetcher')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                batch = self._sample_fun()
+                while not self._stop.is_set():
+                    try:
+                        self._queue.put(batch, timeout=.1)
+                        break
+                    except Queue.Full:
+                        pass
+        except Exception as err:
+            traceback.print_exc()
+            self._error = err
+            self._stop.set()
+
+    def get(self):
+        while True:
+            try:
+                return self._queue.get(timeout=.1)
+            except Queue.Empty:
+                if self._error is not None:
+                    raise self._error
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+
+class StepTimer(object):
+    """Accumulates wall-clock time spent in named sections of the training loop"""
+
+    def __init__(self, sections):
+        self._sections = list(sections)
+        self.reset()
+
+    def reset(self):
+        self._totals = OrderedDict((s, 0.) for s in self._sections)
+        self._start = time.time()
+        self.n_steps = 0
+
+    @contextmanager
+    def section(self, name):
+        start = time.time()
+        yield
+        self._totals[name] += time.time() - start
+
+    def step(self):
+        self.n_steps += 1
+
+    @property
+    def elapsed(self):
+        return time.time() - self._start
+
+    def ms_per_step(self):
+        n_steps = max(self.n_steps, 1)
+        return OrderedDict((k, 1e3 * v / n_steps) for k, v in self._totals.iteritems())
+
+
+class BackgroundTasks(object):
+    """Runs side tasks, e.g. rendering figures or writing checkpoints, on a pool of worker threads.
+
+    At most `max_pending` tasks of a given kind can be in flight; further tasks of that kind are dropped
+    (counted and logged) instead of blocking the caller. Exceptions raised by the tasks are re-raised in the calling
+    thread by the next call to `submit` or `join`.
+    """
+
+    def __init__(self, n_workers=2, max_pending=1):
+        self._pool = ThreadPool(n_workers)
+        self._max_pending = max_pending
+        self._pending = defaultdict(list)
+        self._lock = threading.Lock()
+        self.total_time = defaultdict(float)
+        self.n_done = defaultdict(int)
+        self.n_dropped = defaultdict(int)
+
+    def _collect(self, kind):
+        pending = []
+        for result in self._pending[kind]:
+            if result.ready():
+                result.get()
+            else:
+                pending.append(result)
+        self._pending[kind] = pending
+        return pending
+
+    def submit(self, kind, fun, *args, **kwargs):
+        """Schedules `fun(*args, **kwargs)` on the pool.
+
+        :return: multiprocessing.pool.AsyncResult or None if the task was dropped
+        """
+        pending = self._collect(kind)
+        if len(pending) >= self._max_pending:
+            self.n_dropped[kind] += 1
+            print 'Dropping {} task: {} tasks of this kind are still running'.format(kind, len(pending))
+            return None
+
+        def task():
+            start = time.time()
+            try:
+                return fun(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.total_time[kind] += time.time() - start
+                    self.n_done[kind] += 1
+
+        result = self._pool.apply_async(task)
+        pending.append(result)
+        return result
+
+    def ms_per_task(self):
+        with self._lock:
+            return {k: 1e3 * self.total_time[k] / self.n_done[k] for k in self.n_done}
+
+    def join(self):
+        self._pool.close()
+        self._pool.join()
+        for kind in self._pending.keys():
+            self._collect(kind)
+
+
+def _every(itr, period):
+    return period is not None and period > 0 and itr % period == 0
+
+
+def train(sess, train_step, global_step, next_feed, batch_size, max_iter,
+          summary_writer=None, summary_op=None, summary_every=1000,
+          log=None, log_every=10000,
+          save=None, checkpoint_every=5000, background_save=False,
+          make_figure=None, fig_every=5000,
+          report_every=100, on_report=None, n_workers=2,
+          profiler=None, profile_start=100, profile_steps=10, profile_dir=None):
+    """Runs the training loop and reports throughput together with a breakdown of the step time.
+
+    The step time is split into waiting for the input, computing the train step, logging (summaries and `log`)
+    and checkpointing. `make_figure` (and `save` with `background_save=True`) runs on a pool of background threads,
+    so its time reported for the loop is the time it takes to schedule the task; the time spent in the background is
+    reported separately.
+
+    :param sess: tf.Session
+    :param train_step: tf.Operation
+    :param global_step: tf.Variable
+    :param next_feed: callable, returns a feed dict with a training minibatch, e.g. `Prefetcher.get`
+    :param batch_size: int, number of images in a minibatch
+    :param max_iter: int, training stops when `global_step` reaches this value
+    :param summary_writer: tf.summary.FileWriter or None
+    :param summary_op: tf.Tensor or None, merged summaries evaluated every `summary_every` steps
+    :param summary_every: int
+    :param log: callable or None, called as `log(itr)` every `log_every` steps
+    :param log_every: int
+    :param save: callable or None, called as `save(itr)` every `checkpoint_every` steps
+    :param checkpoint_every: int
+    :param background_save: boolean, if True `save` runs in the background while training continues; only use it when
+        `save` does not read the variables, e.g. a `tf.train.Saver` would write a checkpoint mixing values from
+        different steps. :class: checkpoint.AsyncCheckpointer snapshots the variables in the loop and writes them
+        asynchronously, so it doesn't need it
+    :param make_figure: callable or None, called as `make_figure(itr)` in the background every `fig_every` steps
+    :param fig_every: int
+    :param report_every: int, period of throughput reports
+    :param on_report: callable or None, called as `on_report(itr)` before every throughput report, e.g. for cheap
+        checks that should run more often than `log`
+    :param n_workers: int, number of background threads
+    :param profiler: profiling.StepProfiler or None, traces `profile_steps` steps starting at `profile_start`
+    :param profile_start: int
+    :param profile_steps: int
+    :param profile_dir: string or None, if given the profile table and trace are written there
+    :return: int, the last training iteration
+    """
+
+    timer = StepTimer(['input', 'compute', 'logging', 'checkpoint'])
+    tasks = BackgroundTasks(n_workers)
+
+    train_itr = sess.run(global_step)
+    print 'Starting training at iter = {}'.format(train_itr)
+
+    if train_itr == 0 and log is not None:
+        log(0)
+
+    try:
+        while train_itr < max_iter:
+            with timer.section('input'):
+                feed_dict = next_feed()
+
+            profiling = profiler is not None and profile_start <= train_itr < profile_start + profile_steps
+            run = partial(profiler.run, sess) if profiling else sess.run
+            with timer.section('compute'):
+                train_itr, _ = run([global_step, train_step], feed_dict)
+            timer.step()
+
+            if profiling and train_itr == profile_start + profile_steps:
+                _write_profile(profiler, profile_dir, train_itr)
+
+            with timer.section('logging'):
+                if summary_op is not None and _every(train_itr, summary_every):
+                    summaries = sess.run(summary_op, feed_dict)
+                    summary_writer.add_summary(summaries, train_itr)
+
+                if log is not None and _every(train_itr, log_every):
+                    log(train_itr)
+
+            with timer.section('checkpoint'):
+                if save is not None and _every(train_itr, checkpoint_every):
+                    if background_save:
+                        tasks.submit('checkpoint', save, train_itr)
+                    else:
+                        save(train_itr)
+
+                if make_figure is not None and _every(train_itr, fig_every):
+                    tasks.submit('figure', make_figure, train_itr)
+
+            if _every(train_itr, report_every):
+                if on_report is not None:
+                    on_report(train_itr)
+                _report(train_itr, timer, tasks, batch_size, summary_writer)
+                timer.reset()
+    finally:
+        tasks.join()
+
+    return train_itr
+
+
+def _write_profile(profiler, profile_dir, itr):
+    table = profiler.table()
+    print table
+    if profile_dir is not None:
+        with open(osp.join(profile_dir, 'profile_{}.txt'.format(itr)), 'w') as f:
+            f.write(table)
+        profiler.write_trace(osp.join(profile_dir, 'trace_{}.json'.format(itr)))
+
+
+def _report(itr, timer, tasks, batch_size, summary_writer=None):
+    step_times = timer.ms_per_step()
+    compute_time = step_times['compute'] * timer.n_steps / 1e3
+    imgs_per_sec = batch_size * timer.n_steps / timer.elapsed
+    compute_imgs_per_sec = batch_size * timer.n_steps / max(compute_time, 1e-8)
+
+    breakdown = ', '.join(('{} = {:.1f}ms'.format(k, v) for k, v in step_times.iteritems()))
+    background = ', '.join(('{} = {:.0f}ms'.format(k, v) for k, v in sorted(tasks.ms_per_task().iteritems())))
+    dropped = ', '.join(('{} = {}'.format(k, v) for k, v in sorted(tasks.n_dropped.iteritems()) if v > 0))
+
+    log_string = 'Step {}, {:.1f} img/s ({:.1f} img/s compute only), step time: {}'.format(
+        itr, imgs_per_sec, compute_imgs_per_sec, breakdown)
+    if background:
+        log_string += ', background: ' + background
+    if dropped:
+        log_string += ', dropped: ' + dropped
+    print log_string
+    sys.stdout.flush()
+
+    if summary_writer is not None:
+        tags = ['throughput/imgs_per_sec', 'throughput/compute_imgs_per_sec']
+        values = [imgs_per_sec, compute_imgs_per_sec]
+        for k, v in step_times.iteritems():
+            tags.append('step_time_ms/' + k)
+            values.append(v)
+        log_values(summary_writer, itr, tags, values)
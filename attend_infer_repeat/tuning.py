@@ -0,0 +1,103 @@
+"""Tunes TensorFlow thread pools and the batch size for training throughput.
+
+Every combination of batch size and thread counts is timed in its own session. Sessions are created with
+`use_per_session_threads`, so that each of them gets thread pools of the requested size instead of sharing the global
+pools sized by the first session in the process.
+"""
+import json
+import multiprocessing
+import platform
+import time
+
+import tensorflow as tf
+
+from benchmark import time_fetches
+
+
+def default_threads():
+    """Powers of two up to the number of cores and the number of cores itself"""
+    n_cores = multiprocessing.cpu_count()
+    threads = [1]
+    while threads[-1] * 2 < n_cores:
+        threads.append(threads[-1] * 2)
+    if threads[-1] != n_cores:
+        threads.append(n_cores)
+    return threads
+
+
+def session_config(intra_op_threads, inter_op_threads, per_session=False):
+    config = tf.ConfigProto(intra_op_parallelism_threads=intra_op_threads,
+                            inter_op_parallelism_threads=inter_op_threads,
+                            use_per_session_threads=per_session)
+    config.gpu_options.allow_growth = True
+    return config
+
+
+def tune(build, batch_sizes, intra_op_threads, inter_op_threads, n_warmup=3, n_iter=20, verbose=True):
+    """Times a training step for every combination of batch size and thread counts
+
+    :param build: callable taking the batch size; builds the model in the default graph and returns a tuple of
+        (fetches, feed_dict or None)
+    :param batch_sizes: list of ints
+    :param intra_op_threads: list of ints
+    :param inter_op_threads: list of ints
+    :return: list of dicts with the settings, timings and throughput in images per second
+    """
+    results = []
+    for batch_size in batch_sizes:
+        with tf.Graph().as_default():
+            tf.set_random_seed(0)
+            fetches, feed_dict = build(batch_size)
+            init = tf.global_variables_initializer()
+
+            for intra in intra_op_threads:
+                for inter in inter_op_threads:
+                    with tf.Session(config=session_config(intra, inter, per_session=True)) as sess:
+                        sess.run(init)
+                        result = time_fetches(sess, fetches, feed_dict, n_warmup, n_iter)
+
+                    result.update(batch_size=batch_size, intra_op_threads=intra, inter_op_threads=inter,
+                                  imgs_per_sec=1e3 * batch_size / result['median_ms'])
+                    results.append(result)
+                    if verbose:
+                        print format_result(result)
+    return results
+
+
+def format_result(result):
+    return 'batch_size={:<5} intra={:<3} inter={:<3} {:>10.3f}ms  {:>9.1f} img/s'.format(
+        result['batch_size'], result['intra_op_threads'], result['inter_op_threads'], result['median_ms'],
+        result['imgs_per_sec'])
+
+
+def best_setting(results):
+    """Returns the settings with the highest throughput; ties go to fewer threads"""
+    best = max(results, key=lambda r: (r['imgs_per_sec'], -r['intra_op_threads'], -r['inter_op_threads']))
+    return {k: best[k] for k in ('batch_size', 'intra_op_threads', 'inter_op_threads', 'imgs_per_sec')}
+
+
+def save_tuning(path, results):
+    """Writes the best settings together with all timings to a JSON file"""
+    tuning = best_setting(results)
+    tuning.update(meta=dict(tf_version=tf.__version__, host=platform.node(), n_cores=multiprocessing.cpu_count(),
+                            time=time.strftime('%Y-%m-%d %H:%M:%S')),
+                  results=results)
+
+    with open(path, 'w') as f:
+        json.dump(tuning, f, indent=2, default=float)
+    return tuning
+
+
+def load_tuning(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def apply_tuning(args, tuning):
+    """Replaces the batch size and thread counts in parsed command-line arguments with tuned values"""
+    if tuning.get('meta', {}).get('host', platform.node()) != platform.node():
+        print 'Warning: the tuning config was created on "{}"'.format(tuning['meta']['host'])
+
+    for k in ('batch_size', 'intra_op_threads', 'inter_op_threads'):
+        print 'Tuned {} = {} (was {})'.format(k, tuning[k], getattr(args, k))
+        setattr(args, k, int(tuning[k]))
@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from attend_infer_repeat.benchmark import compare, load_results, run_sweep, save_results, sweep_params
+
+
+def result(name, median_ms, **params):
+    return dict(name=name, median_ms=median_ms, params=params)
+
+
+class SweepParamsTest(unittest.TestCase):
+
+    def test_product(self):
+        sweep = dict(a=[1, 2], b=[3, 4, 5])
+        params = list(sweep_params(sweep))
+        self.assertEqual(len(params), 6)
+
+    def test_overrides(self):
+        sweep = dict(a=[1, 2], b=[3, 4, 5])
+        params = list(sweep_params(sweep, dict(a=[7], c=[1, 2])))
+        self.assertEqual(len(params), 3)
+        self.assertTrue(all(p['a'] == 7 for p in params))
+        self.assertTrue(all('c' not in p for p in params))
+
+
+class CompareTest(unittest.TestCase):
+
+    def test_flags_slowdowns(self):
+        baseline = [result('a', 10., x=1), result('a', 10., x=2), result('b', 1.)]
+        current = [result('a', 10.5, x=1), result('a', 12., x=2), result('c', 1.)]
+
+        rows = compare(baseline, current, threshold=.1)
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[1]['params'], dict(x=2))
+        self.assertTrue(rows[1]['slower'])
+        self.assertFalse(rows[2]['slower'])
+
+    def test_reports_missing(self):
+        baseline = [result('a', 10., x=1), result('b', 1.)]
+        current = [result('a', 10., x=1)]
+
+        rows = compare(baseline, current)
+        self.assertEqual([(r['name'], r['missing']) for r in rows], [('b', True), ('a', False)])
+        self.assertIsNone(rows[0]['current'])
+
+
+class RunSweepTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_air_cell(self):
+        overrides = dict(batch_size=[2], img_size=[10], glimpse_size=[5])
+        results = run_sweep(['air_cell'], overrides, n_warmup=1, n_iter=2, verbose=False)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['params'], dict(batch_size=2, glimpse_size=5, img_size=10))
+        self.assertGreater(results[0]['median_ms'], 0.)
+
+        path = os.path.join(self.dir, 'results.json')
+        save_results(path, results)
+        loaded = load_results(path)
+        self.assertEqual(loaded[0]['params'], results[0]['params'])
+        self.assertEqual(compare(results, loaded)[0]['ratio'], 1.)
@@ -0,0 +1,48 @@
+import unittest
+
+import numpy as np
+from numpy.testing import assert_array_almost_equal, assert_array_equal
+
+from attend_infer_repeat.boxes import batched_nms, box_iou, nms, where_to_boxes
+
+
+class WhereToBoxesTest(unittest.TestCase):
+
+    def test_full_image(self):
+        boxes = where_to_boxes([1., 0., 1., 0.], (50, 40))
+        assert_array_almost_equal(boxes, [0., 0., 50., 40.])
+
+    def test_shifted(self):
+        # half the size, shifted to the bottom-right corner
+        boxes = where_to_boxes([[.5, .5, .5, .5]], (40, 40))
+        assert_array_almost_equal(boxes, [[20., 20., 20., 20.]])
+
+
+class BoxIouTest(unittest.TestCase):
+
+    def test_values(self):
+        a = np.asarray([[0., 0., 10., 10.]])
+        b = np.asarray([[0., 0., 10., 10.], [5., 0., 10., 10.], [20., 20., 1., 1.]])
+        iou = box_iou(a, b)
+        self.assertEqual(iou.shape, (1, 3))
+        assert_array_almost_equal(iou, [[1., 1. / 3, 0.]])
+
+    def test_batched(self):
+        a = np.random.rand(7, 3, 4)
+        b = np.random.rand(7, 5, 4)
+        self.assertEqual(box_iou(a, b).shape, (7, 3, 5))
+
+
+class NmsTest(unittest.TestCase):
+
+    boxes = np.asarray([[0., 0., 10., 10.], [1., 1., 10., 10.], [30., 30., 10., 10.], [0., 0., 9., 10.]])
+    scores = np.asarray([.9, .95, .5, .1])
+
+    def test_nms(self):
+        keep = nms(self.boxes, self.scores, .5)
+        assert_array_equal(keep, [1, 2])
+
+    def test_batched(self):
+        groups = np.asarray([0, 1, 0, 1])
+        keep = batched_nms(self.boxes, self.scores, groups, .5)
+        assert_array_equal(sorted(keep), [0, 1, 2])
@@ -0,0 +1,54 @@
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import tensorflow as tf
+from numpy.testing import assert_array_equal
+
+from attend_infer_repeat.checkpoint import AsyncCheckpointer, weights_only_variables
+
+
+class AsyncCheckpointerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        tf.reset_default_graph()
+
+        self.w = tf.get_variable('w', initializer=np.arange(6, dtype=np.float32).reshape((2, 3)))
+        self.opt = tf.train.RMSPropOptimizer(1e-3, momentum=.9, centered=True)
+        self.train_step = self.opt.minimize(tf.reduce_sum(self.w ** 2))
+
+        self.sess = tf.Session()
+        self.sess.run(tf.global_variables_initializer())
+
+    def tearDown(self):
+        self.sess.close()
+        tf.reset_default_graph()
+        shutil.rmtree(self.dir)
+
+    def test_weights_only_variables(self):
+        weights = weights_only_variables([self.opt])
+        self.assertEqual(weights, [self.w])
+
+    def test_save_restore(self):
+        name = '{}/model.ckpt'.format(self.dir)
+        weights_name = '{}/weights.ckpt'.format(self.dir)
+        checkpointer = AsyncCheckpointer(name, max_to_keep=2, weights_only_name=weights_name,
+                                         optimizers=[self.opt], block=True)
+
+        for step in xrange(3):
+            self.sess.run(self.train_step)
+            checkpointer.save(self.sess, step)
+        expected = self.sess.run(tf.global_variables())
+        checkpointer.close()
+
+        self.assertEqual(len(tf.train.get_checkpoint_state(self.dir).all_model_checkpoint_paths), 2)
+
+        self.sess.run(tf.global_variables_initializer())
+        tf.train.Saver().restore(self.sess, checkpointer.last_checkpoint)
+        for e, r in zip(expected, self.sess.run(tf.global_variables())):
+            assert_array_equal(e, r)
+
+        reader = tf.train.NewCheckpointReader('{}-2'.format(weights_name))
+        self.assertEqual(reader.get_variable_to_shape_map().keys(), ['w'])
@@ -0,0 +1,128 @@
+import cPickle as pickle
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from attend_infer_repeat.data.data import bucket_samples, bucketed_sampler, count_in, data_source, has_labels, \
+    load_data, load_index, object_counts, save_data, save_shared, shared_source
+
+
+def make_data(counts, max_objects=3):
+    n = len(counts)
+    nums = np.zeros((max_objects + 1, n, 1), dtype=np.float32)
+    for i, c in enumerate(counts):
+        nums[:c, i] = 1.
+    return dict(imgs=np.arange(n, dtype=np.float32)[:, np.newaxis], nums=nums)
+
+
+class BucketTest(unittest.TestCase):
+
+    axes = {'imgs': 0, 'nums': 1}
+
+    def test_object_counts(self):
+        data = make_data([0, 2, 1, 3])
+        assert_array_equal(object_counts(data, self.axes), [0, 2, 1, 3])
+
+    def test_bucket_samples(self):
+        counts = np.asarray([0, 2, 1, 2, 0])
+        buckets, step_limits = bucket_samples(counts, max_steps=3)
+        self.assertEqual(step_limits, [1, 2, 3])
+        assert_array_equal(buckets[0], [0, 4])
+        assert_array_equal(buckets[2], [1, 3])
+
+        buckets, step_limits = bucket_samples(counts, bucket_limits=[1, 2, 3])
+        self.assertEqual(step_limits, [2, 3])
+        assert_array_equal(buckets[0], [0, 2, 4])
+
+        self.assertRaises(ValueError, bucket_samples, counts, [1])
+
+    def test_sequential(self):
+        counts = [0, 2, 1, 2, 0, 0]
+        data = make_data(counts)
+        sample = bucketed_sampler(data, 2, self.axes, max_steps=3)
+
+        seen = []
+        for _ in xrange(4):
+            batch = sample()
+            batch_counts = object_counts(batch, self.axes)
+            self.assertEqual(len(set(batch_counts)), 1)
+            self.assertEqual(batch['step_limit'], min(batch_counts[0] + 1, 3))
+            self.assertEqual(batch['nums'].shape, (4, 2, 1))
+            seen.extend(batch['imgs'].ravel())
+
+        self.assertEqual(set(seen), set(range(len(counts))))
+
+    def test_shuffle(self):
+        data = make_data([0, 2, 1, 2, 0, 0])
+        sample = bucketed_sampler(data, 3, self.axes, shuffle=True)
+        for _ in xrange(10):
+            batch = sample()
+            self.assertEqual(len(set(object_counts(batch, self.axes))), 1)
+
+
+class IndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        counts = [0, 2, 1, 2]
+        data = make_data(counts, max_objects=2)
+        data['imgs'] = np.random.randint(256, size=(4, 5, 5)).astype(np.uint8)
+        data['labels'] = np.asarray([[0, 0], [3, 7], [7, 0], [1, 2]], dtype=np.uint8)
+        data['boxes'] = np.random.randint(10, size=(4, 2, 4)).astype(np.int16)
+        data['nums'] = data['nums'].astype(np.uint8)
+        save_data(data, os.path.join(self.dir, 'data.pickle'))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_index(self):
+        index = load_index('data.pickle', self.dir)
+        self.assertEqual(sorted(index.keys()), ['boxes', 'count', 'labels'])
+        assert_array_equal(index['count'], [0, 2, 1, 2])
+
+    def test_images_stored_once(self):
+        with open(os.path.join(self.dir, 'data.pickle')) as f:
+            self.assertNotIn('imgs', pickle.load(f))
+
+        imgs = np.load(os.path.join(self.dir, 'data.imgs.npy'))
+        assert_array_equal(load_data('data.pickle', self.dir)['imgs'], imgs.astype(np.float32) / 255.)
+
+    def test_filtered_load(self):
+        full = load_data('data.pickle', self.dir)
+        for predicates, expected in [(count_in(2), [1, 3]), (has_labels(0), []), (has_labels(7), [1, 2]),
+                                     ([count_in(1, 2), has_labels(1, 3)], [1, 3])]:
+            subset = load_data('data.pickle', self.dir, predicates)
+            for k in ('imgs', 'labels', 'boxes'):
+                assert_array_equal(subset[k], full[k][expected])
+            assert_array_equal(subset['nums'], full['nums'][:, expected])
+
+
+class SharedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        data = make_data([0, 2, 1])
+        data['imgs'] = np.random.randint(256, size=(3, 5, 5)).astype(np.uint8)
+        data['labels'] = np.asarray([[0, 0, 0], [3, 7, 0], [7, 0, 0]], dtype=np.uint8)
+        data['nums'] = data['nums'].astype(np.uint8)
+        save_data(data, os.path.join(self.dir, 'data.pickle'))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_source(self):
+        shared = os.path.join(self.dir, 'shared')
+        source = data_source('data.pickle', self.dir)
+        save_shared(load_data('data.pickle', self.dir), shared, source)
+
+        self.assertEqual(shared_source(shared), source)
+        self.assertEqual(sorted(load_data(shared, self.dir).keys()), ['imgs', 'labels', 'nums'])
+        self.assertIsNone(shared_source(self.dir))
+
+        path = os.path.join(self.dir, 'data.pickle')
+        os.utime(path, (source['mtime'] + 10, source['mtime'] + 10))
+        self.assertNotEqual(shared_source(shared), data_source('data.pickle', self.dir))
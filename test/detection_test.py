@@ -0,0 +1,84 @@
+import unittest
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from attend_infer_repeat.detection import average_precision, detection_metrics, detections_from_outputs, \
+    gt_counts, match_detections
+
+
+class GtCountsTest(unittest.TestCase):
+
+    def test_expanded(self):
+        nums = np.zeros((3, 4, 1))
+        nums[:1, 1] = 1
+        nums[:2, 2] = 1
+        assert_array_equal(gt_counts(nums), [0, 1, 2, 0])
+
+
+class DetectionsFromOutputsTest(unittest.TestCase):
+
+    def test_shapes(self):
+        where = np.random.rand(3, 5, 4)
+        presence = np.ones((3, 5, 1))
+        presence_prob = np.full((3, 5, 1), .5)
+
+        boxes, scores, valid = detections_from_outputs(where, presence, presence_prob, (50, 50))
+        self.assertEqual(boxes.shape, (5, 3, 4))
+        assert_array_equal(scores[0], [.5, .25, .125])
+        self.assertTrue(valid.all())
+
+
+class MatchDetectionsTest(unittest.TestCase):
+
+    def test_greedy(self):
+        gt = np.asarray([[[0., 0., 10., 10.], [20., 20., 10., 10.]]])
+        gt_valid = np.asarray([[True, True]])
+
+        # two detections of the first object and one of nothing
+        pred = np.asarray([[[0., 0., 10., 10.], [1., 1., 10., 10.], [40., 40., 5., 5.]]])
+        scores = np.asarray([[.5, .9, .7]])
+        valid = np.ones((1, 3), dtype=bool)
+
+        tp, iou = match_detections(pred, scores, valid, gt, gt_valid)
+        assert_array_equal(tp, [[False, True, False]])
+        self.assertGreater(iou[0, 1], .5)
+
+    def test_invalid_gt(self):
+        gt = np.asarray([[[0., 0., 10., 10.]]])
+        pred = gt.copy()
+        tp, _ = match_detections(pred, np.ones((1, 1)), np.ones((1, 1), dtype=bool), gt, np.zeros((1, 1), bool))
+        self.assertFalse(tp.any())
+
+
+class AveragePrecisionTest(unittest.TestCase):
+
+    def test_perfect(self):
+        self.assertEqual(average_precision(np.asarray([.9, .8]), np.asarray([True, True]), 2), 1.)
+
+    def test_half(self):
+        ap = average_precision(np.asarray([.9, .8]), np.asarray([False, True]), 1)
+        self.assertAlmostEqual(ap, .5)
+
+
+class DetectionMetricsTest(unittest.TestCase):
+
+    def test_metrics(self):
+        gt = np.zeros((2, 2, 4))
+        gt[0, 0] = [0., 0., 10., 10.]
+        gt[1, :] = [[0., 0., 10., 10.], [20., 20., 10., 10.]]
+        counts = np.asarray([1, 2])
+
+        pred = np.zeros((2, 3, 4))
+        pred[0, 0] = [0., 0., 10., 10.]
+        pred[1, 0] = [20., 20., 10., 10.]
+        pred[1, 1] = [40., 40., 10., 10.]
+        scores = np.asarray([[.9, .1, .1], [.9, .8, .1]])
+        valid = np.asarray([[True, False, False], [True, True, False]])
+
+        metrics = detection_metrics(pred, scores, valid, gt, counts)
+        self.assertAlmostEqual(metrics['precision'], 2. / 3)
+        self.assertAlmostEqual(metrics['recall'], 2. / 3)
+        self.assertAlmostEqual(metrics['mean_iou'], 1.)
+        self.assertEqual(metrics['count_accuracy'], 1.)
+        self.assertEqual(metrics['n_gt'], 3)
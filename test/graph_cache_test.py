@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+import unittest
+from os import path as osp
+
+import numpy as np
+import tensorflow as tf
+from attrdict import AttrDict
+from numpy.testing import assert_array_almost_equal
+
+from attend_infer_repeat.graph_cache import ImportedAIR, config_hash, export_graph, import_graph, source_hash
+from attend_infer_repeat.mnist_model import AIRonMNIST
+
+
+class GraphCacheTest(unittest.TestCase):
+    batch_size = 4
+    max_steps = 2
+    img_size = (10, 10)
+    config = dict(n_steps=2, n_hidden=16)
+
+    def setUp(self):
+        tf.reset_default_graph()
+        self.dir = tempfile.mkdtemp()
+        self.prefix = osp.join(self.dir, 'graph')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _build(self):
+        inputs = dict(imgs=tf.placeholder(tf.float32, (self.batch_size,) + self.img_size, name='imgs'),
+                      nums=tf.placeholder(tf.float32, (self.max_steps + 1, self.batch_size, 1), name='nums'))
+        hidden = [16]
+        air = AIRonMNIST(inputs['imgs'], inputs['nums'], glimpse_size=(5, 5), max_steps=self.max_steps,
+                         inpt_encoder_hidden=hidden, glimpse_encoder_hidden=hidden, glimpse_decoder_hidden=hidden,
+                         transform_estimator_hidden=hidden, steps_pred_hidden=hidden, baseline_hidden=hidden)
+
+        prior = AttrDict(loc=0., scale=1.)
+        train_step, global_step = air.train_step(1e-4, 0., prior, prior, prior, AttrDict(anneal=None, init=.5))
+        return air, inputs, train_step, global_step
+
+    def test_config_hash(self):
+        self.assertEqual(config_hash(self.config), config_hash(dict(self.config)))
+        self.assertNotEqual(config_hash(self.config), config_hash(dict(self.config, n_hidden=32)))
+
+    def test_source_hash(self):
+        package = osp.join(self.dir, 'package')
+        scripts = osp.join(package, 'scripts')
+        os.makedirs(scripts)
+        for path in (osp.join(package, 'model.py'), osp.join(scripts, 'train.py')):
+            with open(path, 'w') as f:
+                f.write('x = 1\n')
+
+        initial = source_hash(package)
+        self.assertEqual(source_hash(package), initial)
+
+        with open(osp.join(scripts, 'train.py'), 'w') as f:
+            f.write('x = 2\n')
+        self.assertNotEqual(source_hash(package), initial)
+
+    def test_missing(self):
+        self.assertIsNone(import_graph(self.prefix, self.config))
+
+    def test_roundtrip(self):
+        air, inputs, train_step, global_step = self._build()
+        export_graph(self.prefix, air, inputs, train_step, global_step, self.config)
+
+        tf.reset_default_graph()
+        self.assertIsNone(import_graph(self.prefix, dict(self.config, n_hidden=32)))
+
+        imported, inputs, train_step, global_step = import_graph(self.prefix, self.config)
+        self.assertIsInstance(imported, ImportedAIR)
+        self.assertEqual(imported.batch_size, air.batch_size)
+        self.assertEqual(imported.max_steps, air.max_steps)
+        self.assertEqual(imported.use_reinforce, air.use_reinforce)
+        self.assertEqual(imported.baseline is None, air.baseline is None)
+        self.assertIn('transition', [name for name, _ in imported.components])
+
+        feed_dict = {inputs['imgs']: np.random.rand(self.batch_size, *self.img_size),
+                     inputs['nums']: np.zeros((self.max_steps + 1, self.batch_size, 1))}
+        with tf.Session() as sess:
+            sess.run(tf.global_variables_initializer())
+            sess.run(train_step, feed_dict)
+            self.assertEqual(sess.run(global_step), 1)
+
+            canvas, loss, prob = sess.run([imported.canvas, imported.loss.value, imported.num_steps_distrib.prob()],
+                                          feed_dict)
+            self.assertEqual(canvas.shape, (self.max_steps, self.batch_size) + self.img_size)
+            self.assertTrue(np.isfinite(loss))
+            assert_array_almost_equal(prob.sum(-1), np.ones(self.batch_size))
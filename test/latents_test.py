@@ -0,0 +1,79 @@
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import tensorflow as tf
+from numpy.testing import assert_array_almost_equal
+
+from attend_infer_repeat.latents import LatentExporter, load_latents
+
+
+class LatentExporterTest(unittest.TestCase):
+    batch_size = 4
+    max_steps = 3
+    img_size = (5, 6)
+
+    def setUp(self):
+        tf.reset_default_graph()
+        self.dir = tempfile.mkdtemp()
+        self.imgs = tf.placeholder(tf.float32, (self.batch_size,) + self.img_size)
+        flat = tf.reshape(self.imgs, (self.batch_size, -1))
+        steps = tf.reshape(tf.range(self.max_steps, dtype=tf.float32), (self.max_steps, 1, 1))
+        self.outputs = dict(
+            where=steps + tf.tile(tf.reduce_sum(flat, 1, keep_dims=True), (1, 4)),
+            presence=steps + tf.reduce_max(flat, 1, keep_dims=True))
+        self.sess = tf.Session()
+
+    def tearDown(self):
+        self.sess.close()
+        shutil.rmtree(self.dir)
+
+    def expected(self, images):
+        steps = np.arange(self.max_steps, dtype=np.float32)[np.newaxis]
+        flat = images.reshape(len(images), -1)
+        where = steps[..., np.newaxis] + flat.sum(1)[:, np.newaxis, np.newaxis]
+        presence = steps + flat.max(1)[:, np.newaxis]
+        return dict(where=np.tile(where, (1, 1, 4)), presence=presence)
+
+    def test_export(self):
+        images = np.random.rand(10, *self.img_size).astype(np.float32)
+        exporter = LatentExporter(self.sess, self.imgs, self.outputs, self.dir, checkpoint_every=1)
+        exporter.export(images, verbose=False)
+
+        latents = load_latents(self.dir)
+        self.assertEqual(latents['where'].shape, (10, self.max_steps, 4))
+        self.assertEqual(latents['presence'].shape, (10, self.max_steps))
+        for k, v in self.expected(images).iteritems():
+            assert_array_almost_equal(latents[k], v, decimal=4)
+
+    def test_float16_and_uint8(self):
+        images = np.random.randint(256, size=(6,) + self.img_size).astype(np.uint8)
+        exporter = LatentExporter(self.sess, self.imgs, self.outputs, self.dir, dtype=np.float16)
+        exporter.export(images, verbose=False)
+
+        latents = load_latents(self.dir)
+        self.assertEqual(latents['presence'].dtype, np.float16)
+        expected = self.expected(images.astype(np.float32) / 255.)
+        assert_array_almost_equal(latents['presence'], expected['presence'], decimal=2)
+
+    def test_resume(self):
+        images = np.random.rand(10, *self.img_size).astype(np.float32)
+        exporter = LatentExporter(self.sess, self.imgs, self.outputs, self.dir, checkpoint_every=1)
+
+        # state of an export interrupted after the first batch
+        arrays = exporter._open_arrays(10, resume=False)
+        arrays['presence'][:4] = -1.
+        exporter._write_progress(10, 4, arrays)
+        self.assertRaises(ValueError, load_latents, self.dir)
+
+        exporter.export(images, verbose=False)
+        latents = load_latents(self.dir)
+        self.assertTrue((latents['presence'][:4] == -1.).all())
+        assert_array_almost_equal(latents['presence'][4:], self.expected(images)['presence'][4:], decimal=4)
+
+    def test_resume_mismatch(self):
+        images = np.random.rand(4, *self.img_size).astype(np.float32)
+        LatentExporter(self.sess, self.imgs, self.outputs, self.dir).export(images, verbose=False)
+        exporter = LatentExporter(self.sess, self.imgs, self.outputs, self.dir, dtype=np.float16)
+        self.assertRaises(ValueError, exporter.export, images, False)
@@ -0,0 +1,79 @@
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+from attend_infer_repeat.memory_planner import fit_linear, fit_memory, max_batch_size, plan, probe, static_memory
+
+
+COMPONENTS = [('encoder', ['encoder']), ('decoder', ['decoder'])]
+
+
+def build(batch_size):
+    x = tf.Variable(tf.random_uniform((batch_size, 64)), trainable=False)
+    with tf.variable_scope('encoder'):
+        w = tf.get_variable('w', (64, 128))
+        h = tf.nn.relu(tf.matmul(x, w))
+    with tf.variable_scope('decoder'):
+        v = tf.get_variable('v', (128, 64))
+        y = tf.matmul(h, v)
+
+    loss = tf.reduce_mean(tf.square(y - x))
+    train = tf.train.GradientDescentOptimizer(.1).minimize(loss)
+    return dict(train=train, inference=y), None, COMPONENTS, 1
+
+
+class MemoryPlannerTest(unittest.TestCase):
+
+    def test_static_memory(self):
+        with tf.Graph().as_default():
+            fetches = build(10)[0]
+            inference = static_memory(fetches['inference'], COMPONENTS)
+            train = static_memory(fetches['train'], COMPONENTS)
+
+        mb = 4. / 2 ** 20
+        self.assertAlmostEqual(inference['encoder'], 2 * 10 * 128 * mb)
+        self.assertAlmostEqual(inference['decoder'], 10 * 64 * mb)
+        self.assertAlmostEqual(inference['variables'], (10 * 64 + 64 * 128 + 128 * 64) * mb)
+        self.assertAlmostEqual(inference['total'], sum(v for k, v in inference.iteritems() if k != 'total'))
+        self.assertGreater(train['total'], inference['total'])
+
+    def test_static_memory_in_loops(self):
+        with tf.Graph().as_default():
+            x = tf.zeros((5, 100))
+            y = tf.while_loop(lambda i, x: i < 3, lambda i, x: (i + 1, x * 2.), (0, x))[1]
+            once = static_memory(y, [], loop_iterations=1)['other']
+            thrice = static_memory(y, [], loop_iterations=3)['other']
+        self.assertGreater(thrice, 2 * once)
+
+    def test_fit_and_plan(self):
+        a, b = fit_linear([8, 16, 32], [10. + 2 * 8, 10. + 2 * 16, 10. + 2 * 32])
+        self.assertAlmostEqual(a, 10.)
+        self.assertAlmostEqual(b, 2.)
+
+        self.assertEqual(max_batch_size((10., 2.), 100., margin=0.), 45)
+        self.assertEqual(max_batch_size((10., 2.), 100., margin=.1), 40)
+        self.assertEqual(max_batch_size((10., 2.), 100., margin=0., multiple=8), 40)
+        self.assertEqual(max_batch_size((10., 2.), 5.), 0)
+        self.assertRaises(ValueError, fit_linear, [8, 8], [1., 2.])
+
+    def test_probe(self):
+        results = probe(build, [16, 64, 256], verbose=False)
+        self.assertEqual(len(results), 6)
+
+        fit = fit_memory(results, 'train')
+        self.assertGreater(fit['static'][1], 0.)
+        self.assertGreater(fit['peak'][1], 0.)
+
+        recommended = plan(fit, budget_mb=64.)
+        self.assertEqual(recommended['source'], 'peak')
+        self.assertGreater(recommended['batch_size'], 256)
+        self.assertLessEqual(recommended['predicted_mb'], .9 * 64.)
+        self.assertIn('encoder', recommended['components'])
+
+    def test_static_only(self):
+        results = probe(build, [16, 64], run=False, verbose=False)
+        self.assertNotIn('peak_mb', results[0])
+        recommended = plan(fit_memory(results, 'inference'), budget_mb=1.)
+        self.assertEqual(recommended['source'], 'static')
+        self.assertIn('variables', recommended['components'])
@@ -0,0 +1,220 @@
+import unittest
+
+import numpy as np
+import tensorflow as tf
+from attrdict import AttrDict
+from numpy.testing import assert_array_almost_equal
+
+from attend_infer_repeat.mnist_model import AIRonMNIST
+from testing_tools import make_air
+
+
+def make_train_step(air, **kwargs):
+    num_steps_prior = AttrDict(anneal=None, init=.5)
+    prior = AttrDict(loc=0., scale=1.)
+    return air.train_step(1e-4, 0., prior, prior, prior, num_steps_prior, **kwargs)
+
+
+def log_mean_exp(x, axis):
+    m = x.max(axis, keepdims=True)
+    return np.log(np.exp(x - m).mean(axis)) + m.squeeze(axis)
+
+
+class VIMCOTest(unittest.TestCase):
+
+    def setUp(self):
+        tf.reset_default_graph()
+
+    def test_requires_many_samples(self):
+        air = make_air(4, n_samples=1)
+        self.assertRaises(ValueError, make_train_step, air, estimator='vimco')
+
+    def test_samples_are_tiled(self):
+        air = make_air(4, n_samples=3)
+        self.assertEqual(air.batch_size, 12)
+        self.assertEqual(air.obs.get_shape().as_list(), [12, 10, 10])
+        self.assertEqual(air.nums.get_shape().as_list(), [3, 12, 1])
+
+    def test_no_baseline(self):
+        air = make_air(4, n_samples=3)
+        make_train_step(air, estimator='vimco')
+        self.assertIsNone(air.baseline)
+        self.assertEqual(len(air.optimizers), 1)
+        self.assertFalse(any('Baseline' in v.name for v in tf.trainable_variables()))
+
+    def test_learning_signal(self):
+        k, batch_size = 3, 4
+        air = make_air(batch_size, n_samples=k)
+        make_train_step(air, estimator='vimco')
+
+        sess = tf.Session()
+        sess.run(tf.global_variables_initializer())
+        loss, bound, imp_weight = sess.run([air.loss.per_sample, air.vimco_bound_per_sample, air.importance_weight])
+
+        log_weights = -loss.reshape(k, batch_size)
+        assert_array_almost_equal(bound, log_mean_exp(log_weights, 0), decimal=4)
+
+        expected = np.zeros_like(log_weights)
+        for i in xrange(k):
+            loo = log_weights.copy()
+            loo[i] = np.delete(log_weights, i, 0).mean(0)
+            expected[i] = log_mean_exp(loo, 0) - bound
+        assert_array_almost_equal(imp_weight, expected.ravel(), decimal=3)
+
+    def test_score_function_gradient(self):
+        k, batch_size = 2, 3
+        air = make_air(batch_size, n_samples=k)
+        make_train_step(air, estimator='vimco')
+        step_vars = air.cell._steps_predictor.get_variables()
+
+        log_prob = air.num_steps_distrib.log_prob(air.num_step_per_sample)
+        per_sample_grads = [tf.gradients(log_prob[i], step_vars) for i in xrange(k * batch_size)]
+        grads = tf.gradients(air.reinforce_loss, step_vars)
+
+        sess = tf.Session()
+        sess.run(tf.global_variables_initializer())
+        imp_weight, per_sample_grads, grads = sess.run([air.importance_weight, per_sample_grads, grads])
+
+        # sum over the samples of an image, average over images
+        for j, grad in enumerate(grads):
+            expected = sum(w * g[j] for w, g in zip(imp_weight, per_sample_grads)) / batch_size
+            assert_array_almost_equal(grad, expected, decimal=4)
+
+
+    def test_bound_depends_on_sampled_steps(self):
+        k, batch_size = 2, 3
+        air = make_air(batch_size, n_samples=k)
+        make_train_step(air, estimator='vimco')
+        self.assertFalse(air.num_steps_prior.analytic)
+
+        sess = tf.Session()
+        sess.run(tf.global_variables_initializer())
+        obs = sess.run(air.obs)
+
+        kls = []
+        for n in (0., 1.):
+            feed_dict = {air.obs: obs, air.num_step_per_sample: np.full(k * batch_size, n, dtype=np.float32)}
+            kl, posterior = sess.run([air.kl_num_steps_per_sample, air.num_steps_distrib.prob()], feed_dict)
+            kls.append(kl)
+
+        # log q(n) - log p(n) for the geometric prior with p(1) / p(0) = .5
+        expected = np.log(posterior[:, 1]) - np.log(posterior[:, 0]) - np.log(.5)
+        assert_array_almost_equal(kls[1] - kls[0], expected, decimal=4)
+
+
+class RelaxedPresenceTest(unittest.TestCase):
+
+    def setUp(self):
+        tf.reset_default_graph()
+
+    def test_no_reinforce(self):
+        air = make_air(4, n_samples=1, relaxed_steps=True)
+        make_train_step(air, temperature_anneal=AttrDict(anneal='exp', final=.1, steps=100))
+        self.assertFalse(air.use_reinforce)
+        self.assertIsNone(air.baseline)
+        self.assertFalse(hasattr(air, 'reinforce_loss'))
+
+        sess = tf.Session()
+        sess.run(tf.global_variables_initializer())
+        temperature = sess.run(air.temperature)
+        sess.run(tf.train.get_global_step().assign(50))
+        sess.run(tf.get_collection(tf.GraphKeys.UPDATE_OPS))
+        self.assertLess(sess.run(air.temperature), temperature)
+
+    def test_pathwise_gradients(self):
+        air = make_air(4, n_samples=1, relaxed_steps=True)
+        make_train_step(air)
+        step_vars = air.cell._steps_predictor.get_variables()
+        grads = tf.gradients(air.opt_loss, step_vars)
+        self.assertTrue(step_vars)
+        self.assertTrue(all(g is not None for g in grads))
+
+    def test_straight_through(self):
+        air = make_air(4, n_samples=1, relaxed_steps=True, straight_through=True)
+        sess = tf.Session()
+        sess.run(tf.global_variables_initializer())
+        presence = sess.run(air.presence)
+        self.assertTrue(np.all((presence == 0.) | (presence == 1.)))
+
+
+class StepLimitTest(unittest.TestCase):
+
+    def setUp(self):
+        tf.reset_default_graph()
+
+    def test_padding(self):
+        max_steps = 3
+        step_limit = tf.placeholder(tf.int32, [])
+        air = make_air(4, n_samples=1, max_steps=max_steps, step_limit=step_limit)
+        self.assertEqual(air.presence.get_shape().as_list(), [max_steps, 4, 1])
+
+        sess = tf.Session()
+        sess.run(tf.global_variables_initializer())
+        canvas, presence, what_scale = sess.run([air.canvas, air.presence, air.what_scale], {step_limit: 1})
+        self.assertTrue((presence[1:] == 0.).all())
+        self.assertTrue((what_scale[1:] == 1.).all())
+        assert_array_almost_equal(canvas[0], canvas[-1])
+
+
+class MemoryOptionsTest(unittest.TestCase):
+
+    def setUp(self):
+        tf.reset_default_graph()
+
+    def test_recurrence_options(self):
+        air = make_air(4, n_samples=1, swap_memory=True, parallel_iterations=1)
+        # other while loops, e.g. the scan of the prior on the number of steps, keep their own settings
+        enters = [op for op in tf.get_default_graph().get_operations()
+                  if op.type == 'Enter' and 'rnn/while/' in op.name]
+        self.assertTrue(enters)
+        self.assertTrue(all(op.get_attr('parallel_iterations') == 1 for op in enters))
+
+        train_step, _ = make_train_step(air)
+        sess = tf.Session()
+        sess.run(tf.global_variables_initializer())
+        _, loss = sess.run([train_step, air.loss.value])
+        self.assertTrue(np.isfinite(loss))
+
+
+class UnrollTest(unittest.TestCase):
+
+    def _build(self, unroll, imgs):
+        tf.reset_default_graph()
+        obs = tf.constant(imgs)
+        nums = tf.zeros((3, imgs.shape[0], 1))
+        hidden = [16]
+        air = AIRonMNIST(obs, nums, glimpse_size=(5, 5), max_steps=2, inpt_encoder_hidden=hidden,
+                         glimpse_encoder_hidden=hidden, glimpse_decoder_hidden=hidden,
+                         transform_estimator_hidden=hidden, steps_pred_hidden=hidden, baseline_hidden=hidden,
+                         unroll=unroll)
+        # optimizer slots are compared as well
+        make_train_step(air)
+        return air
+
+    def test_same_variables_and_outputs(self):
+        imgs = np.random.rand(4, 10, 10).astype(np.float32)
+
+        air = self._build(False, imgs)
+        variables = {v.op.name: v.get_shape().as_list() for v in tf.global_variables()}
+        with tf.Session() as sess:
+            sess.run(tf.global_variables_initializer())
+            values = {v.op.name: sess.run(v) for v in tf.global_variables()}
+            shapes = [getattr(air, k).get_shape().as_list() for k in air.cell.output_names]
+            # the input of the transition is the same image encoding at every step, so the parameters of where and
+            # presence do not depend on samples and are compared for all steps; what depends on the sampled where
+            outputs = sess.run([air.where_loc, air.where_scale, air.presence_prob])
+
+        air = self._build(True, imgs)
+        self.assertEqual({v.op.name: v.get_shape().as_list() for v in tf.global_variables()}, variables)
+        self.assertEqual([getattr(air, k).get_shape().as_list() for k in air.cell.output_names], shapes)
+
+        with tf.Session() as sess:
+            for v in tf.global_variables():
+                v.load(values[v.op.name], sess)
+
+            unrolled = sess.run([air.where_loc, air.where_scale, air.presence_prob])
+            for x, y in zip(outputs, unrolled):
+                assert_array_almost_equal(x, y)
+
+    def test_step_limit(self):
+        self.assertRaises(ValueError, make_air, 4, n_samples=1, step_limit=1, unroll=True)
@@ -0,0 +1,83 @@
+import unittest
+
+import numpy as np
+import sonnet as snt
+import tensorflow as tf
+from numpy.testing import assert_array_almost_equal
+
+from attend_infer_repeat.modules import ConvEncoder, SpatialTransformer
+
+
+def n_params(module):
+    return sum(np.prod(v.get_shape().as_list()) for v in module.get_variables())
+
+
+class ConvEncoderTest(unittest.TestCase):
+
+    def setUp(self):
+        tf.reset_default_graph()
+
+    def test_shape(self):
+        for shape in [(7, 50, 50), (7, 20, 20, 1), (7, 256, 128)]:
+            encoder = ConvEncoder([32, 16])
+            output = encoder(tf.placeholder(tf.float32, shape))
+            self.assertEqual(output.get_shape().as_list(), [7, 16])
+
+    def test_params_grow_sublinearly(self):
+        sizes = [32, 64, 128, 256]
+        counts = []
+        for size in sizes:
+            encoder = ConvEncoder([32])
+            encoder(tf.placeholder(tf.float32, (1, size, size)))
+            counts.append(n_params(encoder))
+
+        # the area grows 64 times
+        self.assertLess(counts[-1], 4 * counts[0])
+
+
+class SeparableTransformerTest(unittest.TestCase):
+
+    batch_size = 4
+    img_size = (12, 15)
+    crop_size = (5, 6)
+
+    def setUp(self):
+        tf.reset_default_graph()
+        self.constraints = snt.AffineWarpConstraints.no_shear_2d()
+        scale = np.random.uniform(.2, 1., (self.batch_size, 2))
+        shift = np.random.uniform(-1., 1., (self.batch_size, 2))
+        params = np.stack((scale[:, 0], shift[:, 0], scale[:, 1], shift[:, 1]), -1).astype(np.float32)
+        self.params = tf.constant(params)
+
+    def compare(self, inverse, n_channels=None):
+        size = self.crop_size if inverse else self.img_size
+        shape = (self.batch_size,) + size + ((n_channels,) if n_channels else ())
+        inpt = tf.constant(np.random.rand(*shape).astype(np.float32))
+
+        outputs, grads = [], []
+        for separable in (False, True):
+            transformer = SpatialTransformer(self.img_size, self.crop_size, self.constraints, inverse, separable)
+            output = transformer(inpt, self.params)
+            weights = tf.constant(np.random.RandomState(0).rand(*output.get_shape().as_list()).astype(np.float32))
+            outputs.append(output)
+            grads.append(tf.gradients(tf.reduce_sum(weights * output), [inpt, self.params]))
+
+        with tf.Session() as sess:
+            outputs, grads = sess.run([outputs, grads])
+
+        self.assertEqual(outputs[0].shape, outputs[1].shape)
+        assert_array_almost_equal(outputs[1], outputs[0], decimal=5)
+        for expected, grad in zip(*grads):
+            assert_array_almost_equal(grad, expected, decimal=4)
+
+    def test_crop(self):
+        self.compare(inverse=False)
+
+    def test_paste(self):
+        self.compare(inverse=True)
+
+    def test_channels(self):
+        self.compare(inverse=False, n_channels=3)
+
+    def test_requires_no_shear(self):
+        self.assertRaises(ValueError, SpatialTransformer, self.img_size, self.crop_size, None, separable=True)
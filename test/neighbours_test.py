@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from numpy.testing import assert_array_almost_equal, assert_array_equal
+
+from attend_infer_repeat.neighbours import IVFIndex, kmeans, object_codes, squared_distances
+
+
+def brute_force(queries, codes, k):
+    distances = squared_distances(queries, codes)
+    idx = distances.argsort(1)[:, :k]
+    return distances[np.arange(len(queries))[:, np.newaxis], idx], idx
+
+
+class IVFIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        centres = 5. * rng.randn(16, 8)
+        self.codes = (centres[rng.randint(16, size=2000)] + rng.randn(2000, 8)).astype(np.float32)
+        self.image_ids = np.arange(2000) // 2
+        self.slots = np.arange(2000) % 2
+
+    def test_kmeans(self):
+        centroids = kmeans(self.codes, 16)
+        self.assertEqual(centroids.shape, (16, 8))
+        self.assertTrue(np.isfinite(centroids).all())
+
+    def test_exact_with_all_lists(self):
+        index = IVFIndex(n_lists=16, n_probe=16)
+        index.train(self.codes)
+        index.add(self.codes, self.image_ids, self.slots)
+        self.assertEqual(len(index), len(self.codes))
+
+        queries = self.codes[:10] + .1
+        distances, image_ids, slots = index.search(queries, k=5)
+        expected_distances, expected_idx = brute_force(queries, self.codes, 5)
+        assert_array_almost_equal(distances, expected_distances, decimal=3)
+        assert_array_equal(image_ids[:, 0], self.image_ids[expected_idx[:, 0]])
+        assert_array_equal(slots[:, 0], self.slots[expected_idx[:, 0]])
+
+    def test_incremental(self):
+        index = IVFIndex(n_lists=16, n_probe=4)
+        index.train(self.codes)
+        index.add(self.codes[:1000], self.image_ids[:1000], self.slots[:1000])
+        index.add(self.codes[1000:], self.image_ids[1000:], self.slots[1000:])
+        self.assertEqual(len(index), len(self.codes))
+
+        distances, image_ids, slots = index.search(self.codes[1500:1510], k=1)
+        assert_array_almost_equal(distances[:, 0], np.zeros(10), decimal=3)
+        assert_array_equal(image_ids[:, 0], self.image_ids[1500:1510])
+
+    def test_missing_neighbours(self):
+        index = IVFIndex(n_lists=4, n_probe=1)
+        index.train(self.codes[:100])
+        index.add(self.codes[:3], self.image_ids[:3], self.slots[:3])
+        distances, image_ids, _ = index.search(self.codes[:1], k=5)
+        self.assertTrue(np.isinf(distances[0, -1]))
+        self.assertEqual(image_ids[0, -1], -1)
+
+    def test_save_load(self):
+        index = IVFIndex(n_lists=16, n_probe=4)
+        index.train(self.codes)
+        index.add(self.codes, self.image_ids, self.slots)
+
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'index.npz')
+            index.save(path)
+            loaded = IVFIndex.load(path)
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertEqual(len(loaded), len(index))
+        for x, y in zip(index.search(self.codes[:5]), loaded.search(self.codes[:5])):
+            assert_array_equal(x, y)
+
+    def test_object_codes(self):
+        latents = dict(presence=np.asarray([[1., 0.], [1., 1.]]), what_loc=np.arange(8.).reshape(2, 2, 2))
+        codes, image_ids, slots = object_codes(latents)
+        assert_array_equal(image_ids, [0, 1, 1])
+        assert_array_equal(slots, [0, 0, 1])
+        assert_array_equal(codes, [[0., 1.], [4., 5.], [6., 7.]])
@@ -0,0 +1,59 @@
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+from attend_infer_repeat.numerics import NumericsMonitor
+
+
+class NumericsMonitorTest(unittest.TestCase):
+
+    def setUp(self):
+        tf.reset_default_graph()
+        self.presence_prob = tf.placeholder(tf.float32, [None])
+        self.where_scale = tf.placeholder(tf.float32, [None, 4])
+        self.tensors = dict(presence_prob=self.presence_prob, where_scale=self.where_scale)
+        self.sess = tf.Session()
+
+    def tearDown(self):
+        self.sess.close()
+
+    def feed(self, presence_prob, where_scale):
+        return {self.presence_prob: presence_prob, self.where_scale: where_scale}
+
+    def test_records_stats(self):
+        monitor = NumericsMonitor(self.tensors, check_fraction=1.)
+        self.sess.run(tf.global_variables_initializer())
+
+        scale = np.ones((2, 4), dtype=np.float32)
+        self.sess.run(monitor.update, self.feed([.25, .75], scale))
+        scale[0, 1] = np.nan
+        scale[1, 2] = -np.inf
+        self.sess.run(monitor.update, self.feed([.125, .5], 2 * scale))
+
+        n_checks, stats = monitor.read(self.sess)
+        self.assertEqual(n_checks, 2)
+        self.assertEqual(stats['presence_prob'], dict(min=.125, max=.75, nan=0., inf=0.))
+        self.assertEqual(stats['where_scale'], dict(min=1., max=2., nan=1., inf=1.))
+
+        _, _, alerts = monitor.check(self.sess)
+        self.assertEqual(alerts, ['where_scale: 1 NaNs', 'where_scale: 1 infs'])
+        self.assertEqual(monitor.read(self.sess)[0], 0)
+
+    def test_bounds(self):
+        monitor = NumericsMonitor(self.tensors, check_fraction=1.)
+        self.sess.run(tf.global_variables_initializer())
+        self.sess.run(monitor.update, self.feed([.5, 1.5], np.ones((1, 4))))
+
+        self.assertRaises(FloatingPointError, monitor.check, self.sess, raise_on_alert=True)
+        self.assertEqual(monitor.check(self.sess)[2], [])
+
+    def test_samples_steps(self):
+        monitor = NumericsMonitor(self.tensors, check_fraction=.25)
+        self.sess.run(tf.global_variables_initializer())
+
+        n_steps = 400
+        checked = [self.sess.run(monitor.update, self.feed([.5], np.ones((1, 4)))) for _ in xrange(n_steps)]
+        n_checks = monitor.read(self.sess)[0]
+        self.assertEqual(n_checks, sum(checked))
+        self.assertTrue(.15 * n_steps < n_checks < .35 * n_steps)
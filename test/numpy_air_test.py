@@ -0,0 +1,165 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import sonnet as snt
+import tensorflow as tf
+from numpy.testing import assert_array_almost_equal
+
+from attend_infer_repeat.modules import SpatialTransformer
+from attend_infer_repeat.numpy_air import NumpyAIR, compare_outputs, crop, dequantize_weights, export_weights, lstm, \
+    paste, quantize_weights
+from testing_tools import make_air, random_weights
+
+
+def random_where(batch_size):
+    scale = np.random.uniform(.2, 1., (batch_size, 2))
+    shift = np.random.uniform(-1., 1., (batch_size, 2))
+    return np.stack((scale[:, 0], shift[:, 0], scale[:, 1], shift[:, 1]), -1).astype(np.float32)
+
+
+class CropTest(unittest.TestCase):
+
+    img_size = (12, 15)
+    crop_size = (5, 6)
+    batch_size = 4
+
+    def setUp(self):
+        tf.reset_default_graph()
+        self.sess = tf.Session()
+
+    def tearDown(self):
+        self.sess.close()
+
+    def test_identity(self):
+        imgs = np.random.rand(self.batch_size, *self.img_size).astype(np.float32)
+        where = np.tile(np.asarray([[1., 0., 1., 0.]], dtype=np.float32), (self.batch_size, 1))
+        assert_array_almost_equal(crop(imgs, where, self.img_size), imgs)
+
+    def test_crop_matches_tf(self):
+        imgs = np.random.rand(self.batch_size, *self.img_size).astype(np.float32)
+        where = random_where(self.batch_size)
+
+        constraints = snt.AffineWarpConstraints.no_shear_2d()
+        transformer = SpatialTransformer(self.img_size, self.crop_size, constraints)
+        expected = self.sess.run(transformer(tf.constant(imgs), tf.constant(where)))[..., 0]
+        assert_array_almost_equal(crop(imgs, where, self.crop_size), expected, decimal=5)
+
+    def test_paste_matches_tf(self):
+        glimpses = np.random.rand(self.batch_size, *self.crop_size).astype(np.float32)
+        where = random_where(self.batch_size)
+
+        constraints = snt.AffineWarpConstraints.no_shear_2d()
+        transformer = SpatialTransformer(self.img_size, self.crop_size, constraints, inverse=True)
+        expected = self.sess.run(transformer(tf.constant(glimpses), tf.constant(where)))[..., 0]
+        assert_array_almost_equal(paste(glimpses, where, self.img_size), expected, decimal=5)
+
+
+class LSTMTest(unittest.TestCase):
+
+    def test_matches_tf(self):
+        tf.reset_default_graph()
+        batch_size, n_inpt, n_hidden = 3, 5, 7
+        x, h, c = (np.random.rand(batch_size, n).astype(np.float32) for n in (n_inpt, n_hidden, n_hidden))
+
+        transition = snt.LSTM(n_hidden)
+        output, state = transition(tf.constant(x), (tf.constant(h), tf.constant(c)))
+
+        with tf.Session() as sess:
+            sess.run(tf.global_variables_initializer())
+            output, (_, cell), w, b = sess.run([output, state] + list(transition.get_variables()))
+
+        expected_output, expected_cell = lstm(x, h, c, w, b)
+        assert_array_almost_equal(cell, expected_cell, decimal=5)
+        assert_array_almost_equal(output, expected_output, decimal=5)
+
+
+class QuantizationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.weights = random_weights()
+
+    def test_roundtrip(self):
+        for dtype, decimal in (('float16', 3), ('int8', 2)):
+            quantized = quantize_weights(self.weights, dtype)
+            self.assertEqual(quantized['input_encoder/0/w'].dtype, np.dtype(dtype))
+            self.assertEqual(quantized['input_encoder/0/b'].dtype, np.float32)
+
+            dequantized = dequantize_weights(quantized)
+            self.assertEqual(sorted(dequantized), sorted(self.weights))
+            for k, v in self.weights.iteritems():
+                assert_array_almost_equal(dequantized[k], v, decimal=decimal, err_msg=k)
+
+    def test_int8_scales(self):
+        quantized = quantize_weights(self.weights, 'int8')
+        w, q, scale = self.weights['transition/w_gates'], quantized['transition/w_gates'], \
+            quantized['transition/w_gates_scale']
+        self.assertEqual(np.abs(q).max(), 127)
+        self.assertLessEqual(np.abs(scale * q - w).max(), scale / 2 + 1e-7)
+
+    def test_compare_outputs(self):
+        imgs = np.random.RandomState(0).rand(8, 12, 12).astype(np.float32)
+        reference = NumpyAIR(self.weights)(imgs)
+
+        report = compare_outputs(reference, reference, imgs)
+        self.assertEqual(report['count_accuracy'], 1.)
+        self.assertEqual(report['canvas_error'], 0.)
+        self.assertAlmostEqual(report['box_iou'], 1., places=5)
+
+        quantized = NumpyAIR(quantize_weights(self.weights, 'int8'))(imgs)
+        report = compare_outputs(reference, quantized, imgs)
+        self.assertEqual(report['count_accuracy'], 1.)
+        self.assertGreater(report['box_iou'], .95)
+        self.assertLess(report['canvas_error'], 1e-4)
+
+    def test_unknown_quantization(self):
+        self.assertRaises(ValueError, quantize_weights, self.weights, 'int4')
+
+
+class ExportTest(unittest.TestCase):
+    """Compares :class: NumpyAIR to the TF model whose weights it loads
+
+    The TF model samples latent variables, while NumpyAIR uses their means. Scales of the posteriors are made
+    negligible and the probability of presence is saturated, so that the samples are equal to the means.
+    """
+
+    batch_size = 4
+    max_steps = 3
+    img_size = (12, 12)
+
+    def setUp(self):
+        tf.reset_default_graph()
+        self.dir = tempfile.mkdtemp()
+        self.air = make_air(self.batch_size, 1, self.max_steps, self.img_size, step_bias=20.,
+                            transform_var_bias=-30.)
+        self.sess = tf.Session()
+        self.sess.run(tf.global_variables_initializer())
+
+        variables = {v.op.name.split('/')[-1]: v for v in self.air.cell._what_distrib.get_variables()}
+        w, b = variables['w'], variables['b']
+        n_appearance = self.air.n_appearance
+        self.sess.run([w[:, n_appearance:].assign(tf.zeros_like(w[:, n_appearance:])),
+                       b[n_appearance:].assign(tf.fill((n_appearance,), -30.))])
+
+    def tearDown(self):
+        self.sess.close()
+        shutil.rmtree(self.dir)
+
+    def test_matches_tf(self):
+        path = os.path.join(self.dir, 'air.npz')
+        export_weights(self.air, self.sess, path)
+
+        air = self.air
+        imgs, tf_outputs = self.sess.run([air.obs, dict(where=air.where_loc, presence_prob=air.presence_prob,
+                                                        what=air.what_loc, presence=air.presence,
+                                                        canvas=air.canvas)])
+        self.assertTrue((tf_outputs['presence'] == 1.).all())
+
+        outputs = NumpyAIR(path)(imgs)
+        for k in 'where presence_prob what'.split():
+            assert_array_almost_equal(outputs[k], tf_outputs[k], decimal=4)
+
+        canvas = outputs['canvas'].reshape(tf_outputs['canvas'].shape)
+        assert_array_almost_equal(canvas, tf_outputs['canvas'], decimal=4)
@@ -0,0 +1,83 @@
+import unittest
+
+import tensorflow as tf
+
+from attend_infer_repeat.profiling import StepProfiler, op_component, peak_memory
+
+
+# the inner module is listed first, so that it takes precedence over the outer one it is nested in
+COMPONENTS = [('inner', ['inner']), ('outer', ['outer'])]
+
+
+class OpComponentTest(unittest.TestCase):
+
+    def test_precedence(self):
+        self.assertEqual(op_component('outer/inner/MatMul', COMPONENTS), 'inner')
+        self.assertEqual(op_component('gradients/outer/inner/MatMul_grad/MatMul', COMPONENTS), 'inner')
+        self.assertEqual(op_component('outer/MatMul', COMPONENTS), 'outer')
+        self.assertEqual(op_component('outer/inner_2/MatMul', COMPONENTS), 'outer')
+        self.assertEqual(op_component('loss', COMPONENTS), 'other')
+        self.assertEqual(op_component('outer/inner/MatMul', COMPONENTS[::-1]), 'outer')
+
+
+class StepProfilerTest(unittest.TestCase):
+
+    def setUp(self):
+        tf.reset_default_graph()
+        x = tf.Variable(tf.random_uniform((500, 500)), trainable=False)
+        with tf.variable_scope('outer'):
+            u = tf.get_variable('u', (1, 500))
+            v = tf.get_variable('v', (500, 1))
+            with tf.variable_scope('inner'):
+                w = tf.get_variable('w', (500, 500))
+                h = tf.matmul(x, w)
+            z = tf.matmul(u, v)
+
+        loss = tf.reduce_mean(tf.square(h)) + tf.reduce_sum(z)
+        self.train_step = tf.train.GradientDescentOptimizer(1e-6).minimize(loss)
+        self.sess = tf.Session()
+        self.sess.run(tf.global_variables_initializer())
+
+    def tearDown(self):
+        self.sess.close()
+
+    def test_aggregate(self):
+        profiler = StepProfiler(COMPONENTS)
+        for _ in xrange(2):
+            profiler.run(self.sess, self.train_step)
+        self.assertEqual(profiler.n_steps, 2)
+
+        rows = {r['component']: r for r in profiler.aggregate()}
+        self.assertIn('optimizer', rows)
+
+        inner, outer = rows['inner'], rows['outer']
+        self.assertGreater(inner['forward_ms'], 0.)
+        self.assertGreater(inner['backward_ms'], 0.)
+        self.assertAlmostEqual(inner['total_ms'], inner['forward_ms'] + inner['backward_ms'])
+        self.assertGreater(inner['total_ms'], outer['total_ms'])
+
+        # the inner matmul and its gradient allocate 500x500 matrices, the outer ones 1x1 and 500x1 ones
+        self.assertGreaterEqual(inner['mbytes'], 2 * 500 * 500 * 4. / 2 ** 20)
+        self.assertLess(outer['mbytes'], inner['mbytes'] / 10)
+        self.assertAlmostEqual(sum(r['share'] for r in rows.itervalues()), 1.)
+
+        self.assertIn('inner', profiler.table())
+
+
+class PeakMemoryTest(unittest.TestCase):
+
+    def test_peak(self):
+        tf.reset_default_graph()
+        x = tf.random_uniform((500, 500))
+        y = tf.reduce_sum(tf.matmul(tf.matmul(x, x), x))
+
+        run_options = tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE)
+        run_metadata = tf.RunMetadata()
+        with tf.Session() as sess:
+            sess.run(y, options=run_options, run_metadata=run_metadata)
+
+        # `x` and the first product are alive while the second one is computed
+        mb = 500 * 500 * 4. / 2 ** 20
+        peaks = peak_memory(run_metadata.step_stats)
+        self.assertGreaterEqual(peaks['cpu'], 3 * mb)
+        self.assertLess(peaks['cpu'], 4 * mb)
@@ -0,0 +1,47 @@
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import tensorflow as tf
+from attrdict import AttrDict
+from numpy.testing import assert_array_equal
+
+from attend_infer_repeat.sampling import PriorSampler, sample_to_disk
+from testing_tools import make_air
+
+
+class PriorSamplerTest(unittest.TestCase):
+    batch_size = 8
+
+    def setUp(self):
+        tf.reset_default_graph()
+        self.air = make_air(2, n_samples=1, max_steps=3)
+        prior = AttrDict(loc=0., scale=1.)
+        self.sampler = PriorSampler(self.air, self.batch_size, .5, prior, AttrDict(loc=.5, scale=.1), prior)
+        self.sess = tf.Session()
+        self.sess.run(tf.global_variables_initializer())
+
+    def tearDown(self):
+        self.sess.close()
+
+    def test_sample(self):
+        samples = self.sampler.sample(self.sess)
+        self.assertEqual(samples['imgs'].shape, (self.batch_size, 10, 10))
+        self.assertEqual(samples['what'].shape, (self.batch_size, 3, self.air.n_appearance))
+        self.assertEqual(samples['where'].shape, (self.batch_size, 3, 4))
+        assert_array_equal(samples['presence'].sum(1), samples['num_steps'])
+
+        empty = samples['num_steps'] == 0
+        self.assertTrue((samples['imgs'][empty] == 0.).all())
+
+    def test_sample_to_disk(self):
+        directory = tempfile.mkdtemp()
+        try:
+            arrays = sample_to_disk(self.sess, self.sampler, directory, 20, dtype=np.float16, verbose=False)
+            self.assertEqual(arrays['imgs'].shape, (20, 10, 10))
+            self.assertEqual(arrays['imgs'].dtype, np.uint8)
+            self.assertEqual(arrays['where'].dtype, np.float16)
+            self.assertTrue((arrays['num_steps'] <= 3).all())
+        finally:
+            shutil.rmtree(directory)
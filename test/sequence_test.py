@@ -0,0 +1,53 @@
+import unittest
+
+import numpy as np
+from numpy.testing import assert_array_almost_equal, assert_array_equal
+
+from attend_infer_repeat.numpy_air import NumpyAIR
+from attend_infer_repeat.sequence import SequenceAIR
+from testing_tools import random_weights
+
+
+class SequenceAIRTest(unittest.TestCase):
+
+    batch_size = 2
+
+    def setUp(self):
+        self.air = NumpyAIR(random_weights())
+        self.frames = np.random.RandomState(1).rand(4, self.batch_size, *self.air.img_size).astype(np.float32)
+
+    def test_step_limit(self):
+        state = self.air.initial_state(self.batch_size)
+        outputs, _, _, n_steps = self.air.run(self.frames[0], state, np.asarray([1, 0]), early_stop=True)
+        self.assertEqual(n_steps, 1)
+        assert_array_equal(outputs['presence'][..., 0], [[1, 0], [0, 0], [0, 0]])
+
+    def test_from_scratch_matches_numpy_air(self):
+        sequence = SequenceAIR(self.air, confirm_threshold=-1.)
+        for frame in self.frames:
+            outputs = sequence(frame)
+            expected = self.air(frame)
+            for k, v in expected.iteritems():
+                assert_array_almost_equal(outputs[k], v, err_msg=k)
+
+            self.assertEqual(outputs['confirmed'].sum(), 0)
+        self.assertEqual(sequence.average_steps(), self.air.max_steps)
+
+    def test_static_stream_confirms_objects(self):
+        sequence = SequenceAIR(self.air, confirm_threshold=np.inf)
+        first = sequence(self.frames[0])
+        second = sequence(self.frames[0])
+
+        self.assertEqual(sequence.stats['n_steps'], self.air.max_steps)
+        assert_array_equal(second['confirmed'], first['presence'])
+        for k in ('what', 'where', 'presence', 'canvas'):
+            assert_array_almost_equal(second[k], first[k], err_msg=k)
+
+    def test_new_streams_need_reset(self):
+        sequence = SequenceAIR(self.air)
+        sequence(self.frames[0])
+        self.assertRaises(ValueError, sequence, self.frames[0, :1])
+
+        sequence.reset()
+        sequence(self.frames[0, :1])
+        self.assertEqual(sequence.stats['n_frames'], 1)
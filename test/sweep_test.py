@@ -0,0 +1,30 @@
+import unittest
+
+from attend_infer_repeat.sweep import core_sets, format_table, make_command, parse_grid
+
+
+class SweepTest(unittest.TestCase):
+
+    def test_parse_grid(self):
+        configs = parse_grid(['step_bias=.5,1.', 'transform_var_bias=-2'])
+        self.assertEqual(configs, [dict(step_bias='.5', transform_var_bias='-2'),
+                                   dict(step_bias='1.', transform_var_bias='-2')])
+        self.assertEqual(parse_grid([]), [{}])
+        self.assertRaises(ValueError, parse_grid, ['step_bias'])
+
+    def test_core_sets(self):
+        self.assertEqual(core_sets(range(7), 3), [[0, 1, 2], [3, 4, 5]])
+        self.assertRaises(ValueError, core_sets, range(2), 3)
+
+    def test_command(self):
+        command = make_command(dict(step_bias='.5'), [2, 3], 'train', 'valid', 'results', 'run', ['--max_iter', '10'])
+        self.assertEqual(command[:3], ['taskset', '-c', '2,3'])
+        self.assertEqual(command[command.index('--intra_op_threads') + 1], '2')
+        self.assertEqual(command[command.index('--step_bias') + 1], '.5')
+        self.assertEqual(command[-2:], ['--max_iter', '10'])
+
+    def test_table(self):
+        rows = [dict(step_bias='.5', num_step_acc=.5), dict(step_bias='1.', num_step_acc=.9, loss=1.)]
+        lines = format_table(rows, ['step_bias']).split('\n')
+        self.assertEqual(len(lines), 3)
+        self.assertIn('0.9000', lines[1])
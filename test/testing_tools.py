@@ -1,5 +1,7 @@
 import os
 import unittest
+
+import numpy as np
 import tensorflow as tf
 
 
@@ -59,3 +61,48 @@ def test_path(path=None):
     if path is not None:
         p = os.path.join(p, path)
     return p
+
+
+def make_air(batch_size, n_samples, max_steps=2, img_size=(10, 10), **kwargs):
+    """Builds a small :class: AIRonMNIST on random images"""
+    # imported here, so that tests which do not need the model do not import it
+    from attend_infer_repeat.mnist_model import AIRonMNIST
+
+    obs = tf.random_uniform((batch_size,) + img_size)
+    nums = tf.zeros((max_steps + 1, batch_size, 1))
+    hidden = [16]
+    return AIRonMNIST(obs, nums, glimpse_size=(5, 5), max_steps=max_steps,
+                      inpt_encoder_hidden=hidden, glimpse_encoder_hidden=hidden, glimpse_decoder_hidden=hidden,
+                      transform_estimator_hidden=hidden, steps_pred_hidden=hidden, baseline_hidden=hidden,
+                      n_samples=n_samples, **kwargs)
+
+
+def random_weights(img_size=(12, 12), glimpse_size=(4, 4), max_steps=3, n_appearance=5, n_hidden=8, steps_bias=10.):
+    """Random weights in the format of :func: numpy_air.export_weights with single-layer MLPs; a large
+    `steps_bias` makes every step present"""
+    rng = np.random.RandomState(0)
+    n_pix = int(np.prod(img_size))
+    n_glimpse = int(np.prod(glimpse_size))
+    weights = {
+        'config/img_size': np.asarray(img_size),
+        'config/glimpse_size': np.asarray(glimpse_size),
+        'config/max_steps': np.int32(max_steps),
+        'config/n_appearance': np.int32(n_appearance),
+        'config/output_multiplier': np.float32(.25),
+        'config/explore_eps': np.float32(0.),
+        'config/steps_bias': np.float32(steps_bias),
+        'config/max_crop_size': np.float32(1.),
+        'config/forget_bias': np.float32(1.),
+        'transition/init_hidden': rng.randn(n_hidden).astype(np.float32),
+        'transition/init_cell': rng.randn(n_hidden).astype(np.float32),
+        'transition/w_gates': .1 * rng.randn(2 * n_hidden, 4 * n_hidden).astype(np.float32),
+        'transition/b_gates': np.zeros(4 * n_hidden, dtype=np.float32),
+    }
+
+    sizes = dict(input_encoder=(n_pix, n_hidden), glimpse_encoder=(n_glimpse, n_hidden),
+                 glimpse_decoder=(n_appearance, n_glimpse), transform_estimator=(n_hidden, 8),
+                 steps_predictor=(n_hidden, 1), what_distrib=(n_hidden, 2 * n_appearance))
+    for name, (n_in, n_out) in sizes.iteritems():
+        weights[name + '/0/w'] = .1 * rng.randn(n_in, n_out).astype(np.float32)
+        weights[name + '/0/b'] = np.zeros(n_out, dtype=np.float32)
+    return weights
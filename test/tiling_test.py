@@ -0,0 +1,105 @@
+import unittest
+
+import numpy as np
+import tensorflow as tf
+from numpy.testing import assert_array_almost_equal, assert_array_equal
+
+from attend_infer_repeat.tiling import TiledAIR, extract_tiles, merge_detections, tile_offsets
+
+
+class TileOffsetsTest(unittest.TestCase):
+
+    def test_covers_image(self):
+        img_size, tile_size = (130, 75), (50, 50)
+        offsets = tile_offsets(img_size, tile_size, 10)
+
+        covered = np.zeros(img_size, dtype=bool)
+        for y, x in offsets:
+            covered[y:y + tile_size[0], x:x + tile_size[1]] = True
+        self.assertTrue(covered.all())
+        self.assertTrue((offsets + tile_size <= img_size).all())
+
+    def test_small_image(self):
+        assert_array_equal(tile_offsets((50, 50), (50, 50), 10), [[0, 0]])
+
+    def test_invalid_overlap(self):
+        self.assertRaises(ValueError, tile_offsets, (100, 100), (50, 50), 50)
+
+
+class MergeDetectionsTest(unittest.TestCase):
+
+    def test_merge(self):
+        tile_size, img_size = (20, 20), (20, 30)
+        offsets = tile_offsets(img_size, tile_size, 10)
+        assert_array_equal(offsets, [[0, 0], [0, 10]])
+
+        # the same object, a 10x10 box at (5, 10) in the image, is found in both tiles
+        where = np.zeros((1, 2, 2, 4), dtype=np.float32)
+        where[0, 0, 0] = [.5, .5, .5, 0.]
+        where[0, 1, 0] = [.5, -.5, .5, 0.]
+        presence_prob = np.zeros((1, 2, 2, 1))
+        presence_prob[0, :, 0] = [[.9], [.8]]
+        what = np.random.rand(1, 2, 2, 3)
+
+        detections = merge_detections(where, presence_prob, what, offsets, tile_size, img_size,
+                                      border_margin=None)
+        self.assertEqual(len(detections), 1)
+        d = detections[0]
+        assert_array_almost_equal(d['boxes'], [[5., 10., 10., 10.]])
+        assert_array_equal(d['tile'], [0])
+        assert_array_equal(d['slot'], [0])
+
+
+class CentreModel(object):
+    """Stands in for AIR: finds a single object in the middle of every tile that is not empty"""
+
+    max_steps = 2
+
+    def __init__(self, tiles):
+        n_tiles = tiles.get_shape().as_list()[0]
+        present = tf.reduce_max(tiles, (1, 2))[:, tf.newaxis]
+        self.presence_prob = tf.stack((present, tf.zeros_like(present)))
+        self.where_loc = tf.tile(tf.constant([[[.5, 0., .5, 0.]]]), (self.max_steps, n_tiles, 1))
+        self.what_loc = tf.stack([tf.reduce_mean(tiles, (1, 2))[:, tf.newaxis]] * self.max_steps)
+
+
+class TiledAIRTest(unittest.TestCase):
+
+    def setUp(self):
+        tf.reset_default_graph()
+        self.sess = tf.Session()
+
+    def tearDown(self):
+        self.sess.close()
+
+    def test_detect(self):
+        imgs = np.zeros((2, 20, 20), dtype=np.float32)
+        imgs[0, 14, 3] = 1.
+        imgs[1, 5, 12] = 1.
+        imgs[1, 15, 15] = 1.
+
+        tiled = TiledAIR(tf.constant(imgs), (10, 10), 0, CentreModel)
+        self.assertEqual(tiled.n_tiles, 4)
+        detections = tiled.detect(self.sess)
+
+        assert_array_almost_equal(detections[0]['boxes'], [[12.5, 2.5, 5., 5.]])
+        assert_array_equal(detections[0]['tile'], [2])
+        assert_array_almost_equal(detections[0]['what'], [[.01]])
+
+        order = np.argsort(detections[1]['tile'])
+        assert_array_almost_equal(detections[1]['boxes'][order], [[2.5, 12.5, 5., 5.], [12.5, 12.5, 5., 5.]])
+        assert_array_equal(detections[1]['tile'][order], [1, 3])
+        assert_array_equal(detections[1]['slot'], [0, 0])
+
+    def test_small_image(self):
+        imgs = np.zeros((1, 6, 8), dtype=np.float32)
+        imgs[0, 2, 3] = 1.
+
+        tiles = self.sess.run(extract_tiles(tf.constant(imgs), (10, 10), [[0, 0]]))
+        self.assertEqual(tiles.shape, (1, 10, 10))
+        assert_array_equal(tiles[0, :6, :8], imgs[0])
+        self.assertEqual(tiles[0, 6:].sum() + tiles[0, :, 8:].sum(), 0.)
+
+        tiled = TiledAIR(tf.constant(imgs), (10, 10), 2, CentreModel)
+        detections = tiled.detect(self.sess)
+        assert_array_almost_equal(detections[0]['boxes'], [[2.5, 2.5, 5., 5.]])
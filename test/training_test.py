@@ -0,0 +1,84 @@
+import threading
+import unittest
+
+import tensorflow as tf
+
+from attend_infer_repeat.training import BackgroundTasks, Prefetcher, StepTimer, train
+
+
+class PrefetcherTest(unittest.TestCase):
+
+    def test_order(self):
+        counter = iter(xrange(100))
+        prefetcher = Prefetcher(lambda: next(counter), capacity=2)
+        batches = [prefetcher.get() for _ in xrange(10)]
+        prefetcher.close()
+        self.assertEqual(batches, range(10))
+
+    def test_raises(self):
+        def fail():
+            raise ValueError('no data')
+
+        prefetcher = Prefetcher(fail)
+        self.assertRaises(ValueError, prefetcher.get)
+        prefetcher.close()
+
+
+class BackgroundTasksTest(unittest.TestCase):
+
+    def test_drops_when_busy(self):
+        event = threading.Event()
+        tasks = BackgroundTasks(n_workers=2, max_pending=1)
+
+        first = tasks.submit('fig', event.wait)
+        second = tasks.submit('fig', event.wait)
+        other = tasks.submit('ckpt', lambda: 1)
+
+        self.assertIsNotNone(first)
+        self.assertIsNone(second)
+        self.assertIsNotNone(other)
+        self.assertEqual(tasks.n_dropped['fig'], 1)
+
+        event.set()
+        tasks.join()
+        self.assertEqual(tasks.n_done['fig'], 1)
+        self.assertEqual(tasks.n_done['ckpt'], 1)
+
+    def test_reraises(self):
+        def fail():
+            raise ValueError('failed')
+
+        tasks = BackgroundTasks()
+        tasks.submit('fail', fail)
+        self.assertRaises(ValueError, tasks.join)
+
+
+class StepTimerTest(unittest.TestCase):
+
+    def test_sections(self):
+        timer = StepTimer(['a', 'b'])
+        with timer.section('a'):
+            pass
+        timer.step()
+        times = timer.ms_per_step()
+        self.assertEqual(times.keys(), ['a', 'b'])
+        self.assertEqual(times['b'], 0.)
+        self.assertGreaterEqual(times['a'], 0.)
+
+
+class TrainTest(unittest.TestCase):
+
+    def test_callbacks(self):
+        tf.reset_default_graph()
+        global_step = tf.Variable(0, trainable=False)
+        train_step = tf.assign_add(global_step, 1)
+        saved, reported = [], []
+
+        with tf.Session() as sess:
+            sess.run(tf.global_variables_initializer())
+            itr = train(sess, train_step, global_step, dict, 1, 10, save=saved.append, checkpoint_every=5,
+                        report_every=2, on_report=reported.append)
+
+        self.assertEqual(itr, 10)
+        self.assertEqual(saved, [5, 10])
+        self.assertEqual(reported, [2, 4, 6, 8, 10])
@@ -0,0 +1,50 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import tensorflow as tf
+from attrdict import AttrDict
+
+from attend_infer_repeat.tuning import apply_tuning, best_setting, default_threads, load_tuning, save_tuning, tune
+
+
+class TuningTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_tune(self):
+        def build(batch_size):
+            x = tf.Variable(tf.random_uniform((batch_size, 16)))
+            return tf.matmul(x, x, transpose_b=True), None
+
+        results = tune(build, [2, 4], [1, 2], [1], n_warmup=1, n_iter=2, verbose=False)
+        self.assertEqual(len(results), 4)
+        self.assertEqual({(r['batch_size'], r['intra_op_threads']) for r in results}, {(2, 1), (2, 2), (4, 1), (4, 2)})
+
+        path = os.path.join(self.dir, 'tuning.json')
+        save_tuning(path, results)
+        tuning = load_tuning(path)
+        self.assertEqual(len(tuning['results']), 4)
+
+        args = AttrDict(batch_size=64, intra_op_threads=0, inter_op_threads=0)
+        apply_tuning(args, tuning)
+        self.assertEqual(args.batch_size, tuning['batch_size'])
+        self.assertEqual(args.intra_op_threads, tuning['intra_op_threads'])
+
+    def test_best_setting(self):
+        results = [dict(batch_size=32, intra_op_threads=4, inter_op_threads=1, imgs_per_sec=100.),
+                   dict(batch_size=64, intra_op_threads=2, inter_op_threads=1, imgs_per_sec=150.),
+                   dict(batch_size=64, intra_op_threads=4, inter_op_threads=1, imgs_per_sec=150.)]
+        best = best_setting(results)
+        self.assertEqual(best['batch_size'], 64)
+        self.assertEqual(best['intra_op_threads'], 2)
+
+    def test_default_threads(self):
+        threads = default_threads()
+        self.assertEqual(threads[0], 1)
+        self.assertEqual(threads, sorted(set(threads)))